@@ -0,0 +1,59 @@
+"""Barcode benchmark
+
+Measures symbols/s of the table driven encoders (`srp350.barcode`) with and without raster
+packing, and compares the Code128 symbol width of the code set search against Code128 B only.
+
+    python benchmarks/bench_barcode.py [--symbols 5000]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from srp350 import barcode
+
+SAMPLES = (
+    (barcode.BARCODE_EAN13, "59012341{0:04d}"),
+    (barcode.BARCODE_UPC_A, "0360002{0:04d}"),
+    (barcode.BARCODE_CODE39, "ITEM-{0}"),
+    (barcode.BARCODE_ITF, "1234{0:04d}"),
+    (barcode.BARCODE_CODE93, "Order {0}"),
+    (barcode.BARCODE_CODE128, "ORDER {0:010d}"),
+)
+
+WIDTHS = ("0123456789012345", "ORDER 20240117-0001234", "AB12345678cd", "ticket 7", "9780201379624")
+
+
+def measure(name, func, count):
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print("{0:<28} {1:>12.0f} symbols/s".format(name, count / elapsed))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=5000)
+    args = parser.parse_args()
+
+    for system, template in SAMPLES:
+        encoder = barcode._ENCODERS[system]
+        measure("encode {0}".format(encoder.__name__[7:]), lambda i: encoder(template.format(i)), args.symbols)
+    measure("encode + raster code128",
+            lambda i: barcode.raster(barcode.encode(barcode.BARCODE_CODE128, "ORDER {0:010d}".format(i)).modules, 2, 80),
+            args.symbols)
+    measure("cached code128", lambda i: barcode.encode(barcode.BARCODE_CODE128, "ORDER {0:010d}".format(i % 10)),
+            args.symbols * 10)
+
+    print()
+    print("{0:<28} {1:>8} {2:>8}".format("code128 modules", "B only", "search"))
+    for data in WIDTHS:
+        b_only = len(barcode._code128_modules(barcode._code128_values([("B", data)])))
+        print("{0:<28} {1:>8} {2:>8}".format(data, b_only, len(barcode.encode(barcode.BARCODE_CODE128, data).modules)))
+
+if __name__ == "__main__":
+    main()
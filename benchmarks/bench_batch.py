@@ -0,0 +1,58 @@
+"""Batch mode benchmark
+
+Sends many small kitchen tickets one by one (one os.write each) and in batch mode (one
+os.writev per batch) to a device file (default /dev/null) and reports tickets/s and the
+system calls saved.
+
+    python benchmarks/bench_batch.py [--tickets 5000] [--device /dev/null]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+
+
+def ticket(printer, number):
+    printer.select_character_size(printer.gen_character_size(2, 2))
+    printer.println("Table {0}".format(number % 40))
+    printer.select_character_size(0)
+    printer.println("1 x Burger medium, no onions")
+    printer.println("2 x Fries")
+    printer.cut_paper(srp350.CUT_MODE_FEED_AND_CUT, 40)
+
+
+def run(name, printer, tickets):
+    start = time.perf_counter()
+    for i in range(tickets):
+        ticket(printer, i)
+        printer.send(block=False)
+    printer.flush()
+    elapsed = time.perf_counter() - start
+    print("{0:<10} {1:>10.0f} tickets/s".format(name, tickets / elapsed))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=5000)
+    parser.add_argument("--device", default="/dev/null")
+    parser.add_argument("--max-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--linger", type=float, default=0.002)
+    args = parser.parse_args()
+
+    printer = srp350.SRP350(args.device)
+    run("single", printer, args.tickets)
+    printer.close()
+
+    printer = srp350.SRP350(args.device, batch_max_bytes=args.max_bytes, batch_max_linger=args.linger)
+    run("batched", printer, args.tickets)
+    print(printer.batcher.stats())
+    printer.close()
+
+
+if __name__ == "__main__":
+    main()
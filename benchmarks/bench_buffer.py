@@ -0,0 +1,76 @@
+"""Command buffer benchmark
+
+Compares the old list-of-ints command buffer against the bytearray buffer used by `SRP350`.
+Both build the same receipt (some text and a 512 dot wide raster image) and write it to a
+device file (/dev/null by default).
+
+    python benchmarks/bench_buffer.py [--device /dev/null] [--rounds 50] [--rows 800]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+
+
+def build_list(device, rows):
+    """The previous implementation: every command is a list of ints, send() copies it again"""
+    data = []
+    image = list(b"\xaa" * (64 * rows))
+    for i in range(40):
+        data.extend([0x1B, 0x45, i & 1])
+        data.extend(list("Line {0} of the receipt\n".format(i).encode("cp437")))
+    data.extend([0x1D, 0x76, 0x30, 0, 64, 0, rows % 256, rows // 256] + image)
+    data.extend([0x1D, 0x56, 66, 40])
+    os.write(device, bytearray(data))
+    return len(data)
+
+
+def build_bytearray(printer, rows):
+    image = b"\xaa" * (64 * rows)
+    for i in range(40):
+        printer.emphasize_mode(i & 1)
+        printer.print("Line {0} of the receipt\n".format(i))
+    printer.print_raster_bit_image(0, 64, 0, rows % 256, rows // 256, image)
+    printer.cut_paper(srp350.CUT_MODE_FEED_AND_CUT, 40)
+    size = len(printer.data)
+    printer.send()
+    return size
+
+
+def measure(name, func, rounds):
+    func()  # warm up
+    tracemalloc.start()
+    start = time.perf_counter()
+    total = 0
+    for _ in range(rounds):
+        total += func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{0:<10} {1:>12.0f} bytes/s {2:>10.1f} KiB peak {3:>8.2f} ms/job".format(
+        name, total / elapsed, peak / 1024, elapsed / rounds * 1000))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--device", default=os.devnull, help="Device file to write to")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=800, help="Height of the raster image")
+    args = parser.parse_args()
+
+    printer = srp350.SRP350(args.device)
+    device = os.open(args.device, os.O_RDWR)
+    measure("list", lambda: build_list(device, args.rows), args.rounds)
+    measure("bytearray", lambda: build_bytearray(printer, args.rows), args.rounds)
+    os.close(device)
+    printer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Column format encoder benchmark
+
+Measures images/s of converting the raster data of a 512 dot wide image into ESC * stripes:
+a per-bit Python loop (what the conversion looks like without `srp350.column`), the 8 x 8
+transpose tables and the NumPy transposition.
+
+    python benchmarks/bench_column.py [--images 50] [--height 800]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+from PIL import Image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import srp350
+from srp350 import column
+
+
+def naive(xL, xH, yL, yH, d):
+    width_bytes = xL + xH * 256
+    height = yL + yH * 256
+    stripes = []
+    for top in range(0, height, 24):
+        stripe = bytearray()
+        for x in range(width_bytes * 8):
+            for k in range(3):
+                value = 0
+                for i in range(8):
+                    y = top + k * 8 + i
+                    if y < height and d[y * width_bytes + x // 8] & (0x80 >> (x % 8)):
+                        value |= 0x80 >> i
+                stripe.append(value)
+        stripes.append(bytes(stripe))
+    return stripes
+
+
+def measure(name, func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{0:<20} {1:>10.1f} images/s".format(name, count / elapsed))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--images", type=int, default=50)
+    parser.add_argument("--height", type=int, default=800)
+    args = parser.parse_args()
+
+    image = Image.open(os.path.join(ROOT, "examples", "monalisa.jpg")).convert("RGB").resize((512, args.height))
+    data = srp350.SRP350(None).generate_image_data(image)
+
+    expected = column.bit_image_data(column.IMAGE_MODE_24DOT_DOUBLE, *data)
+    assert [d for _, _, d in expected] == naive(*data)
+    measure("python loop", lambda: naive(*data), max(1, args.images // 25))
+    np, column.np = column.np, None
+    measure("transpose tables", lambda: column.bit_image_data(column.IMAGE_MODE_24DOT_DOUBLE, *data), args.images)
+    column.np = np
+    if np is not None:
+        measure("numpy", lambda: column.bit_image_data(column.IMAGE_MODE_24DOT_DOUBLE, *data), args.images)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Document streaming benchmark
+
+Builds an end-of-day report (lines, tables and graphs rendered on demand) and compares
+serializing it with `Document.chunks` against building the whole buffer: peak Python memory
+(tracemalloc), time until the first bytes could be written and total time.
+
+    python benchmarks/bench_document.py [--sections 10] [--lines 200]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from srp350 import BARCODE_SYSTEM_B_CODE128
+from srp350.document import Document, Paragraph
+
+
+def report_lines(section, count):
+    for i in range(count):
+        yield Paragraph("{0:<30}{1:>12.2f}".format("item {0}-{1}".format(section, i), i * 1.5))
+
+
+def graph(section):
+    def draw():
+        im = Image.new("L", (512, 400), 255)
+        d = ImageDraw.Draw(im)
+        for x in range(0, 512, 16):
+            d.rectangle((x, 399 - (x * 7 + section) % 399, x + 12, 399), fill=0)
+        return im
+    return draw
+
+
+def report(sections, lines):
+    doc = Document()
+    doc.paragraph("END OF DAY", bold=True, align=1, width_mul=2, height_mul=2)
+    for section in range(sections):
+        doc.extend(report_lines(section, lines))
+        doc.image(graph(section))
+        doc.table(((k, k * 3, "x") for k in range(50)), [20, 10, 10], [">", ">", "<"])
+    doc.barcode(BARCODE_SYSTEM_B_CODE128, "EOD-20240117", height=60)
+    doc.cut()
+    return doc
+
+
+def measure(name, chunks):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    total = 0
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        total += len(chunk)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("{0:<10} {1:>10} bytes  peak {2:>9} bytes  first chunk {3:>7.1f} ms  total {4:>7.1f} ms".format(
+        name, total, peak, first * 1000, elapsed * 1000))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--sections", type=int, default=10)
+    parser.add_argument("--lines", type=int, default=200)
+    args = parser.parse_args()
+
+    measure("streamed", report(args.sections, args.lines).chunks())
+    measure("eager", (report(args.sections, args.lines).serialize() for _ in range(1)))
+
+if __name__ == "__main__":
+    main()
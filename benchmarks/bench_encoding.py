@@ -0,0 +1,49 @@
+"""Text encoding benchmark
+
+Compares the previous `list(text.encode("cp437"))` path with the translation table encoder
+of `srp350.encoding`, for plain ASCII and for text with accents and symbols.
+
+    python benchmarks/bench_encoding.py [--rounds 20000]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.encoding import get_encoder
+
+TEXTS = [
+    ("ascii", "2 x Coffee large with oat milk              5.00\n"),
+    ("latin", "1 x Crème brûlée à la maison, Größe L        4.50\n"),
+    ("symbols", "1 x “Special” menu – €12 incl. tip…         12.00\n"),
+]
+
+
+def measure(name, func, text, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(text)
+    elapsed = time.perf_counter() - start
+    print("{0:<28} {1:>12.0f} chars/s".format(name, len(text) * rounds / elapsed))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    encoder = get_encoder()
+    printer = srp350.SRP350(None)
+    for label, text in TEXTS:
+        measure(label + " list(encode)", lambda t: list(t.encode("cp437", errors="replace")), text, args.rounds)
+        measure(label + " encoder", encoder.encode, text, args.rounds)
+        measure(label + " SRP350.print", printer.print, text, args.rounds)
+        printer.detach()
+
+
+if __name__ == "__main__":
+    main()
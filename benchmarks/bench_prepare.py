@@ -0,0 +1,54 @@
+"""Parallel image preparation benchmark
+
+Rasterizes a batch of tall photos serially with `srp350.raster.rasterize` and with an
+`ImagePreparer` process pool (images and bands in parallel, results via shared memory).
+The speedup depends on the number of cores: on one core the pool only adds overhead.
+
+    python benchmarks/bench_prepare.py [--images 16] [--height 2000] [--workers N] [--dither 2]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from srp350 import raster
+from srp350.prepare import ImagePreparer
+
+
+def photo(i, height):
+    """A noisy RGB image, as product photos are (dithering noise is the expensive case)"""
+    return Image.effect_noise((640, height), 40 + i).convert("RGB")
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dither", type=int, default=raster.DITHER_BAYER_8X8)
+    args = parser.parse_args()
+
+    images = [photo(i, args.height) for i in range(args.images)]
+    print("{0} images of {1}x{2}, {3} cores".format(len(images), images[0].size[0], args.height, os.cpu_count()))
+
+    start = time.perf_counter()
+    serial = [raster.rasterize(image, dither_mode=args.dither) for image in images]
+    elapsed = time.perf_counter() - start
+    print("{0:<10} {1:>8.1f} images/s".format("serial", len(images) / elapsed))
+
+    with ImagePreparer(args.workers) as preparer:
+        # start the workers before measuring
+        preparer.map(images[:1], dither=args.dither)
+        start = time.perf_counter()
+        pooled = preparer.map(images, dither=args.dither)
+        elapsed = time.perf_counter() - start
+        print("{0:<10} {1:>8.1f} images/s  {2}".format("pool", len(images) / elapsed, preparer.stats()))
+    assert [list(r) for r in serial] == [list(r) for r in pooled]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""QR code benchmark
+
+Measures QR symbols/s of the pure Python encoder with raster packing, uncached (distinct
+payloads) and cached (repeated payloads), against rendering the module matrix with PIL and
+sending it through `generate_image_data`.
+
+    python benchmarks/bench_qr.py [--symbols 500] [--scale 4]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+from PIL import Image, ImageOps
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350 import qr
+
+
+def measure(name, func, count):
+    start = time.perf_counter()
+    for i in range(count):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print("{0:<24} {1:>12.0f} symbols/s".format(name, count / elapsed))
+
+
+def pil_image(data, scale):
+    """The previous way: draw the modules into a pil image and scale it"""
+    rows = qr.matrix(data, qr.QR_EC_M)
+    im = Image.new("L", (len(rows), len(rows)), 255)
+    im.putdata([255 - 255 * module for row in rows for module in row])
+    im = ImageOps.expand(im, qr.QUIET_ZONE, 255)
+    return im.resize((im.size[0] * scale, im.size[1] * scale), Image.NEAREST)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--scale", type=int, default=4)
+    args = parser.parse_args()
+
+    printer = srp350.SRP350(None)
+    url = "https://example.com/receipt/{0}"
+
+    measure("encode (matrix)", lambda i: qr.matrix(url.format(i), qr.QR_EC_M), args.symbols)
+    # the last matrices are cached now, the next two compare packing only
+    count = min(args.symbols, qr.CACHE_SIZE)
+    first = args.symbols - count
+    measure("pack with PIL + dither",
+            lambda i: printer.generate_image_data(pil_image(url.format(first + i), args.scale)), count)
+    measure("pack to raster", lambda i: qr.raster(url.format(first + i), args.scale), count)
+    qr.matrix.cache_clear()
+    qr.raster.cache_clear()
+    measure("encode + pack", lambda i: qr.raster(url.format(i), args.scale), args.symbols)
+    measure("cached", lambda i: qr.raster(url.format(i % 10), args.scale), args.symbols * 100)
+    measure("print_qr_code (cached)", lambda i: printer.print_qr_code(url.format(i % 10), args.scale),
+            args.symbols * 100)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Rasterization benchmark
+
+Compares the PIL conversion chain of `SRP350.generate_image_data` with the vectorized NumPy
+rasterizer (`srp350.raster`) for every dither mode.
+
+    python benchmarks/bench_raster.py [--image examples/monalisa.jpg] [--rounds 20]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image
+
+import srp350
+
+DITHER_MODES = [
+    ("threshold", srp350.DITHER_THRESHOLD),
+    ("bayer4x4", srp350.DITHER_BAYER_4X4),
+    ("bayer8x8", srp350.DITHER_BAYER_8X8),
+    ("floyd-steinberg", srp350.DITHER_FLOYD_STEINBERG),
+]
+
+
+def test_image(width, height):
+    """Gradient with a transparent border, similar to a logo"""
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGBA")
+    alpha = Image.new("L", (width, height), 0)
+    alpha.paste(255, (width // 8, height // 8, width - width // 8, height - height // 8))
+    image.putalpha(alpha)
+    return image
+
+
+def measure(name, func, rounds):
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = time.perf_counter() - start
+    print("{0:<24} {1:>8.2f} ms/image {2:>8.1f} images/s".format(name, elapsed / rounds * 1000, rounds / elapsed))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--image", help="Image to rasterize (default: generated test images)")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--device", default=os.devnull)
+    args = parser.parse_args()
+
+    printer = srp350.SRP350(args.device)
+    if args.image:
+        images = [(os.path.basename(args.image), Image.open(args.image))]
+    else:
+        images = [("{0}x{1}".format(w, h), test_image(w, h)) for w, h in ((128, 128), (384, 384), (512, 2048))]
+
+    for label, image in images:
+        image.load()
+        print(label)
+        measure("  pil", lambda: printer.generate_image_data(image), args.rounds)
+        for name, mode in DITHER_MODES:
+            measure("  numpy " + name, lambda: printer.generate_image_data(image, dither=mode), args.rounds)
+    printer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Decoder and renderer benchmark
+
+Builds a receipt with text, styles, an image and a barcode, then measures the decoder on a
+multi-megabyte capture (fed in 64 KiB chunks) and rendering of single receipts.
+
+    python benchmarks/bench_render.py [--receipts 200]
+"""
+
+import io
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.decoder import decode_stream
+from srp350.render import render
+
+EXAMPLE_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples", "monalisa.jpg")
+
+
+def receipt():
+    printer = srp350.SRP350(None)
+    printer.initialize_printer()
+    printer.select_justification(srp350.JUSTIFICATION_CENTER)
+    printer.print_image(Image.open(EXAMPLE_IMAGE).resize((256, 320)))
+    printer.select_character_size(printer.gen_character_size(2, 2))
+    printer.println("Coffee Shop")
+    printer.select_character_size(0)
+    printer.select_justification(srp350.JUSTIFICATION_LEFT)
+    for i in range(20):
+        printer.emphasize_mode(i % 2)
+        printer.println("{0:>2} x Coffee large with oat milk  {1:>8.2f}".format(i + 1, 2.5 * (i + 1)))
+    printer.emphasize_mode(0)
+    printer.set_barcode_height(80)
+    printer.select_hri_printing_position(srp350.HRI_POS_BELOW)
+    printer.print_barcode(0, srp350.BARCODE_SYSTEM_A_EAN13, "4388860567380")
+    printer.cut_paper(66, 40)
+    return bytes(printer.data)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--receipts", type=int, default=200)
+    args = parser.parse_args()
+
+    data = receipt()
+    capture = data * args.receipts
+    start = time.perf_counter()
+    count = sum(1 for _ in decode_stream(io.BytesIO(capture), chunk_size=64 * 1024))
+    elapsed = time.perf_counter() - start
+    print("decode {0:>10.1f} MB/s ({1} commands in {2:.1f} MB)".format(
+        len(capture) / elapsed / 1e6, count, len(capture) / 1e6))
+
+    render(data)
+    rounds = max(1, args.receipts // 10)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        render(data)
+    elapsed = time.perf_counter() - start
+    print("render {0:>10.0f} receipts/min".format(rounds / elapsed * 60))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Receipt template benchmark
+
+Builds the same receipt with the imperative command API and with a compiled `Template`
+and reports receipts/second for both.
+
+    python benchmarks/bench_template.py [--rounds 5000]
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.template import Template
+
+ITEMS = [("Coffee", 2.5), ("Bagel", 3.2), ("Orange juice", 4.0), ("Muffin", 2.8)]
+
+
+def header(p):
+    p.initialize_printer()
+    p.select_print_mode(p.gen_print_mode(0, 1, 1, 1, 0))
+    p.println("  CORNER CAFE")
+    p.select_print_mode(0)
+    p.println("Main Street 1, 12345 Town")
+    p.underline_mode(srp350.UNDERLINE_SINGLE_DOT)
+    p.println("                                ")
+    p.underline_mode(srp350.UNDERLINE_OFF)
+
+
+def footer(p):
+    p.underline_mode(srp350.UNDERLINE_SINGLE_DOT)
+    p.println("                                ")
+    p.underline_mode(srp350.UNDERLINE_OFF)
+    p.println("Thank you for your visit!")
+    p.cut_paper(srp350.CUT_MODE_FEED_AND_CUT, 40)
+
+
+def imperative(p, table, items):
+    header(p)
+    p.emphasize_mode(1)
+    p.print("Table ")
+    p.println(str(table))
+    p.emphasize_mode(0)
+    for name, price in items:
+        p.print("{0:<22}".format(name)[:22])
+        p.println("{0:>10.2f}".format(price))
+    p.emphasize_mode(1)
+    p.print("Total")
+    p.println("{0:>27.2f}".format(sum(price for _, price in items)))
+    p.emphasize_mode(0)
+    footer(p)
+    return p.detach()
+
+
+def compile_templates():
+    t = Template()
+    header(t)
+    t.emphasize_mode(1)
+    t.print("Table ")
+    t.field("table", int)
+    t.println("")
+    t.emphasize_mode(0)
+    t.field("items", bytes)
+    t.emphasize_mode(1)
+    t.print("Total")
+    t.field("total", float, fmt=".2f", width=27, align=">")
+    t.println("")
+    t.emphasize_mode(0)
+    footer(t)
+
+    line = Template()
+    line.field("name", str, width=22)
+    line.field("price", float, fmt=".2f", width=10, align=">")
+    line.println("")
+    return t.compile(), line.compile()
+
+
+def templated(receipt, line, table, items):
+    lines = b"".join(line.render(name=name, price=price) for name, price in items)
+    return receipt.render(table=table, items=lines, total=sum(price for _, price in items))
+
+
+def measure(name, func, rounds):
+    start = time.perf_counter()
+    for i in range(rounds):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print("{0:<12} {1:>10.0f} receipts/s".format(name, rounds / elapsed))
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args()
+
+    printer = srp350.SRP350(None)
+    receipt, line = compile_templates()
+    assert bytes(imperative(printer, 7, ITEMS)) == templated(receipt, line, 7, ITEMS)
+
+    measure("imperative", lambda i: imperative(printer, i, ITEMS), args.rounds)
+    measure("template", lambda i: templated(receipt, line, i, ITEMS), args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Benchmark suite with JSON results and a regression gate
+
+Runs realistic workloads through the `SRP350` API against a null device (/dev/null) or a
+pipe drained by a thread:
+* text: a text heavy receipt (header, 40 item lines, totals, cut)
+* styles: style toggles around every few characters, like examples/codepage.py
+* raster_128/256/512: `generate_image_data` + `print_raster_bands` of images of that width
+* raster_512_bayer: the same through the NumPy rasterizer with Bayer dithering
+* barcodes: a burst of 20 Code128 and EAN-13 barcodes
+
+For every workload it reports throughput (ops/s and MB/s), bytes emitted per op, allocations
+(tracemalloc peak and allocated blocks of one op) and the functions taking most time in a
+cProfile run. Results are written as JSON; with --baseline the run is compared against an
+earlier result file and the exit status is 1 if a workload got slower, emits more bytes or
+allocates more than --threshold allows. Throughput is the best of --repeat rounds; on shared
+or virtual machines timings still vary by 20% and more, use a matching threshold there.
+
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --baseline results.json --threshold 0.15
+"""
+
+import cProfile
+import json
+import os
+import platform
+import pstats
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+from PIL import Image
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+import srp350
+from srp350 import raster
+
+EXAMPLE_IMAGE = os.path.join(ROOT, "examples", "monalisa.jpg")
+
+# metric: (higher is better, compared by the gate)
+METRICS = {
+    "ops_per_second": True,
+    "bytes_per_op": False,
+    "peak_bytes": False,
+    "allocated_blocks": False,
+}
+
+
+def text_receipt(printer):
+    printer.initialize_printer()
+    printer.select_justification(srp350.JUSTIFICATION_CENTER)
+    printer.select_character_size(printer.gen_character_size(1, 1))
+    printer.println("SUPERMARKET")
+    printer.select_character_size(printer.gen_character_size(0, 0))
+    printer.println("Main Street 1, 12345 Town")
+    printer.select_justification(srp350.JUSTIFICATION_LEFT)
+    for i in range(40):
+        printer.println("{0:<30}{1:>12.2f}".format("Item number {0}".format(i), i * 1.25))
+    printer.emphasize_mode(1)
+    printer.println("{0:<30}{1:>12.2f}".format("TOTAL", 975.0))
+    printer.emphasize_mode(0)
+    printer.cut_paper(srp350.CUT_MODE_FEED_AND_CUT, 40)
+
+
+def style_receipt(printer):
+    printer.initialize_printer()
+    for i in range(16):
+        printer.emphasize_mode(1)
+        printer.print("{0:X} ".format(i))
+        printer.emphasize_mode(0)
+        for j in range(16):
+            code = (i << 4) | j
+            printer.underline_mode(j & 1)
+            printer._handle_payload(bytes((code if code >= 0x20 else 0x2E, 0x20)))
+        printer.underline_mode(0)
+        printer.line_feed()
+    printer.cut_paper(srp350.CUT_MODE_FEED_AND_CUT, 40)
+
+
+def raster_receipt(width, dither=None):
+    image = Image.open(EXAMPLE_IMAGE).convert("RGB")
+    image = image.resize((width, int(image.size[1] * width / image.size[0])))
+
+    def build(printer):
+        printer.initialize_printer()
+        printer.print_image(image, dither=dither)
+        printer.cut_paper(srp350.CUT_MODE_FEED_AND_CUT, 40)
+    return build
+
+
+def barcode_receipt(printer):
+    printer.initialize_printer()
+    printer.set_barcode_height(60)
+    for i in range(10):
+        printer.print_barcode(None, srp350.BARCODE_SYSTEM_B_CODE128, "ORDER-{0:08d}".format(i))
+        printer.print_barcode(0, srp350.BARCODE_SYSTEM_A_EAN13, "40063813{0:04d}".format(i))
+    printer.cut_paper(srp350.CUT_MODE_FEED_AND_CUT, 40)
+
+
+WORKLOADS = {
+    "text": text_receipt,
+    "styles": style_receipt,
+    "raster_128": raster_receipt(128),
+    "raster_256": raster_receipt(256),
+    "raster_512": raster_receipt(512),
+    "raster_512_bayer": raster_receipt(512, raster.DITHER_BAYER_8X8),
+    "barcodes": barcode_receipt,
+}
+
+
+class PipeDevice(object):
+    """A pipe whose read end is drained by a thread, stands in for a printer which is never busy"""
+
+    def __init__(self):
+        self.read_fd, self.path_fd = os.pipe()
+        self.path = "/dev/fd/{0}".format(self.path_fd)
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        # reads into one buffer, so the drain doesn't show up in the allocation numbers
+        buf = bytearray(65536)
+        with os.fdopen(self.read_fd, "rb", buffering=0, closefd=False) as f:
+            while f.readinto(buf):
+                pass
+
+    def close(self):
+        os.close(self.path_fd)
+        self._thread.join()
+        os.close(self.read_fd)
+
+
+def run_op(printer, build):
+    build(printer)
+    size = len(printer.data)
+    printer.send()
+    return size
+
+
+def measure(printer, build, min_time, repeat, profile_ops, top):
+    size = run_op(printer, build)  # warm up (caches, imports)
+
+    # the best of repeat rounds, slower rounds are noise (other processes, frequency scaling)
+    best = 0.0
+    for _ in range(repeat):
+        ops = 0
+        start = time.perf_counter()
+        while True:
+            run_op(printer, build)
+            ops += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, ops / elapsed)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    run_op(printer, build)
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    blocks = sum(max(0, stat.count_diff) for stat in after.compare_to(before, "lineno"))
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for _ in range(profile_ops):
+        run_op(printer, build)
+    profiler.disable()
+    stats = pstats.Stats(profiler)
+    functions = []
+    for (filename, line, name), (cc, nc, tottime, cumtime, callers) in stats.stats.items():
+        functions.append({
+            "function": "{0}:{1}({2})".format(os.path.relpath(filename, ROOT) if filename.startswith(ROOT) else filename,
+                                              line, name),
+            "calls": nc // profile_ops,
+            "tottime_ms": tottime * 1000 / profile_ops,
+            "cumtime_ms": cumtime * 1000 / profile_ops,
+        })
+    functions.sort(key=lambda f: f["tottime_ms"], reverse=True)
+
+    return {
+        "ops_per_second": best,
+        "bytes_per_op": size,
+        "megabytes_per_second": best * size / 1e6,
+        "peak_bytes": peak,
+        "allocated_blocks": blocks,
+        "profile": functions[:top],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Returns the regressions of results against baseline as list of messages"""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in old or not old[metric]:
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append("{0}: {1} {2:.6g} -> {3:.6g} ({4:+.1%})".format(
+                    name, metric, old[metric], result[metric], change))
+    return regressions
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--device", default="/dev/null", help='device file or "pipe"')
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help="comma separated workload names")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per round")
+    parser.add_argument("--repeat", type=int, default=3, help="timed rounds per workload, the best counts")
+    parser.add_argument("--profile-ops", type=int, default=20)
+    parser.add_argument("--top", type=int, default=10, help="functions per profile")
+    parser.add_argument("--output", help="JSON result file")
+    parser.add_argument("--baseline", help="JSON result file of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+
+    pipe = None
+    device = args.device
+    if device == "pipe":
+        pipe = PipeDevice()
+        device = pipe.path
+
+    results = {}
+    try:
+        printer = srp350.SRP350(device)
+        for name in args.workloads.split(","):
+            result = measure(printer, WORKLOADS[name], args.min_time, args.repeat, args.profile_ops, args.top)
+            results[name] = result
+            print("{0:<18} {1:>10.1f} ops/s {2:>8.2f} MB/s {3:>9} bytes/op {4:>10} peak {5:>7} blocks".format(
+                name, result["ops_per_second"], result["megabytes_per_second"], result["bytes_per_op"],
+                result["peak_bytes"], result["allocated_blocks"]))
+            for f in result["profile"][:3]:
+                print("    {0:>8.3f} ms {1:>6} calls  {2}".format(f["tottime_ms"], f["calls"], f["function"]))
+        printer.close()
+    finally:
+        if pipe is not None:
+            pipe.close()
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "device": args.device,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for message in regressions:
+            print("REGRESSION " + message)
+        if regressions:
+            sys.exit(1)
+        print("no regressions against {0} ({1})".format(args.baseline, baseline["meta"].get("revision")))
+
+if __name__ == "__main__":
+    main()
@@ -39,10 +39,10 @@ p.select_print_mode(p.gen_print_mode(0, 0, 0, 0, 0))
 p.print_raster_bit_image(srp350.BIT_IMAGE_MODE_NORMAL, *p.generate_image_data(Image.open("monalisa.jpg")))
 
 # barcode priting
-p.set_barcode_width(1)
+p.set_barcode_width(2)
 p.set_barcode_height(100)
 p.select_hri_printing_position(srp350.HRI_POS_BELOW)
-p.print_barcode(0, srp350.BARCODE_SYSTEM_A_EAN13, "4388860567386")
+p.print_barcode(0, srp350.BARCODE_SYSTEM_A_EAN13, "4388860567380")
 
 p.print_and_feed_lines(3)
 
@@ -10,6 +10,7 @@ setup(
     license='Unlicense/Public Domain',
     packages=['srp350'],
     install_requires=['pillow'],
+    extras_require={'numpy': ['numpy']},
 
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
@@ -6,11 +6,29 @@ import os
 import sys
 from PIL import Image, ImageOps
 
+from .transport import Transport, DEFAULT_CHUNK_SIZE, DEFAULT_MAX_PENDING
+from .batch import Batcher, DEFAULT_MAX_LINGER
+from . import raster
+from .cache import RasterCache, image_key
+from .logo import LogoRegistry
+from . import state
+from .state import PrinterState
+from .trace import Tracer, hexdump
+from . import status
+from .status import StatusMonitor, PrinterNotReady
+from .encoding import (get_encoder, CODEPAGE_PC437, CODEPAGE_KATAKANA, CODEPAGE_PC850, CODEPAGE_PC860,
+    CODEPAGE_PC863, CODEPAGE_PC865, CODEPAGE_WPC1252, CODEPAGE_PC866, CODEPAGE_PC852, CODEPAGE_PC858)
+from .raster import DITHER_THRESHOLD, DITHER_BAYER_4X4, DITHER_BAYER_8X8, DITHER_FLOYD_STEINBERG
+from . import qr
+from . import barcode
+from . import column
+from .column import (ColumnEncoder, IMAGE_MODE_8DOT_SINGLE, IMAGE_MODE_8DOT_DOUBLE, IMAGE_MODE_24DOT_SINGLE,
+    IMAGE_MODE_24DOT_DOUBLE)
+from . import estimate as _estimate
+from .estimate import DEFAULT_SPEED
+from .page import Page
+from .qr import QR_EC_L, QR_EC_M, QR_EC_Q, QR_EC_H
 
-IMAGE_MODE_8DOT_SINGLE = 0
-IMAGE_MODE_8DOT_DOUBLE = 1
-IMAGE_MODE_24DOT_SINGLE = 32
-IMAGE_MODE_24DOT_DOUBLE = 33
 
 UNDERLINE_OFF = 48
 UNDERLINE_SINGLE_DOT = 49
@@ -38,6 +56,10 @@ PRINT_DIRECTION_TOP_TO_BOTTOM = 51
 CLOCKWISE_ROTATION_MODE_OFF = 48
 CLOCKWISE_ROTATION_MODE_ON = 49
 
+JUSTIFICATION_LEFT = 48
+JUSTIFICATION_CENTER = 49
+JUSTIFICATION_RIGHT = 50
+
 BIT_IMAGE_MODE_NORMAL = 48
 BIT_IMAGE_MODE_DOUBLE_WIDTH = 49
 BIT_IMAGE_MODE_DOUBLE_HEIGHT = 50
@@ -77,49 +99,216 @@ DEBUG_MODE_VISUAL = 2
 
 class SRP350(object):
 
-    def __init__(self, port, debug_mode=DEBUG_MODE_OFF):
+    def __init__(self, port, debug_mode=DEBUG_MODE_OFF, chunk_size=DEFAULT_CHUNK_SIZE, timeout=None,
+            progress=None, raster_cache=None, optimize=False, encoding_errors="transliterate",
+            auto_codepage=False, tracer=None, batch_max_bytes=0, batch_max_linger=DEFAULT_MAX_LINGER,
+            preparer=None, device=None):
+        """port is the device file of the printer. With port=None no device is opened, the instance
+        only builds command buffers which can be taken with `detach` (e.g. for the `Spooler`)
+        chunk_size, timeout and progress are passed to the `Transport` which writes the buffer:
+        the buffer is written in chunks of chunk_size bytes, timeout is the maximum time in seconds
+        to wait for the printer to accept more data and progress(written, total) is called
+        after each chunk
+        raster_cache is an optional `RasterCache` used by `generate_image_data`
+        With optimize=True setting commands (emphasize_mode, underline_mode, ...) are only emitted
+        right before the next content command and only if they change the printer's state,
+        see `srp350.state`
+        encoding_errors selects how `print` handles characters the code page lacks ("strict",
+        "replace" or "transliterate", the default), with auto_codepage=True `print` switches to
+        another code page instead if one contains the character and the switch is shorter than the
+        fallback (with "strict" always), see `srp350.encoding`
+        tracer is an optional `Tracer` which records every command
+        With batch_max_bytes > 0 `send` queues the buffer as job of a `Batcher`, which writes
+        batches of up to batch_max_bytes with one os.writev, a job waits at most batch_max_linger
+        seconds for more jobs, see `srp350.batch`
+        preparer is an optional `ImagePreparer` which rasterizes images with a dither mode in
+        worker processes, see `srp350.prepare`
+        device is an already open (non-blocking) file descriptor of port, e.g. from a
+        `DeviceManager`, it's used instead of opening port and `close` leaves it open"""
         self.port = port
         self.debug_mode = debug_mode
-
-        self.device = os.open(self.port, os.O_RDWR)
-
-        self.data = []
-
-    def send(self):
-        """Sends the current buffer (self.data) and clears it"""
-        os.write(self.device, bytearray(self.data))
-        self.data = []
+        self.raster_cache = raster_cache
+        self.preparer = preparer
+        self.optimize = optimize
+        self.state = PrinterState()
+        self.encoding_errors = encoding_errors
+        self.auto_codepage = auto_codepage
+        self.tracer = tracer
+
+        self.device = None
+        self.transport = None
+        self.batcher = None
+        # a borrowed device stays open on close
+        self._owns_device = device is None
+        if port is not None or device is not None:
+            self.device = self._open() if device is None else device
+            self.transport = Transport(self.device, chunk_size=chunk_size, timeout=timeout, progress=progress)
+            if batch_max_bytes:
+                self.batcher = Batcher(self.transport, batch_max_bytes, batch_max_linger)
+
+        self.data = bytearray()
+
+        # identifies the image defined by `define_downloaded_bit_image` (see `LogoRegistry`)
+        self._downloaded_bit_image = None
+
+    def _open(self):
+        """Opens the device file, returns the file descriptor
+        The file is non-blocking: `Transport` waits with poll, so a write never blocks while
+        holding the lock real-time queries need."""
+        return os.open(self.port, os.O_RDWR | os.O_NONBLOCK)
+
+    def send(self, block=None):
+        """Sends the current buffer (self.data) and clears it
+        The buffer is written by a background thread after the buffers sent before it, block=True
+        waits for it, with block=False send returns immediately (use `flush` to wait for it).
+        In batch mode the `BatchJob` of the buffer is returned. There block defaults to False, so
+        consecutive sends end up in one batch; block=True waits for the batch of the buffer.
+        Otherwise block defaults to True."""
+        if self.transport is None:
+            raise IOError("printer has no device, use detach() to take the buffer")
+        if block is None:
+            block = self.batcher is None
+        data = self.detach()
+        if self.batcher is not None:
+            job = self.batcher.submit(data)
+            if block:
+                job.wait()
+            return job
+        # behind the buffers sent with block=False, not in the middle of them
+        n = self.transport.submit(data)
+        if block:
+            self.transport.wait(n)
+
+    def stream(self, chunks, max_pending=DEFAULT_MAX_PENDING):
+        """Writes the byte chunks of an iterable (e.g. `Document.chunks`) while the next ones are
+        produced: the current buffer and every chunk go to the background writer, which holds
+        at most max_pending chunks, so memory stays bounded however long the stream is
+        Returns the number of written bytes."""
+        if self.transport is None:
+            raise IOError("printer has no device, use detach() to take the buffer")
+        if self.batcher is not None:
+            # earlier batch jobs come first
+            self.batcher.flush()
+        total = 0
+        data = self.detach()
+        if data:
+            self.transport.submit(data)
+            total += len(data)
+        for chunk in chunks:
+            if not chunk:
+                continue
+            self.transport.wait_pending(max_pending - 1)
+            self.transport.submit(chunk)
+            total += len(chunk)
+        self.transport.flush()
+        return total
+
+    def detach(self):
+        """Returns the current buffer (self.data) and replaces it with an empty one"""
+        if self.state.pending:
+            self.data += self.state.flush()
+        data, self.data = self.data, bytearray()
+        return data
+
+    def estimate(self, speed=DEFAULT_SPEED, baudrate=None, cut_time=0.0):
+        """Returns the `srp350.estimate.Estimate` of the current buffer (the job `send` writes):
+        bytes per command category, raster dot lines, paper length and print duration at speed
+        mm/s and baudrate bit/s (settings the optimizer holds back aren't counted yet)"""
+        return _estimate.estimate(bytes(self.data), speed, baudrate, cut_time)
+
+    def flush(self, timeout=None):
+        """Waits until all buffers sent with block=False are written, returns False on timeout
+        Raises the first error of their writes (in batch mode of the batch jobs as well)."""
+        if self.transport is None:
+            return True
+        if self.batcher is not None and not self.batcher.flush(timeout):
+            return False
+        return self.transport.flush(timeout)
 
     def close(self):
         """Closes connection to the device"""
-        os.close(self.device)
-
-    def _handle_payload(self, payload):
-        """Handles the given payload"""
-        if self.debug_mode == DEBUG_MODE_HEXDUMP:
-            debug_str = ""
-            ll = 0
-            for d in payload:
-                if (d < 0 or d > 255):
-                    debug_str += "%02x!" % d
-                else:
-                    debug_str += "%02x " % d
-                ll += 3
-                if (ll >= 189):
-                    debug_str += "\n"
-                    ll = 0
-            print(debug_str)
-        self.data.extend(payload)
+        if self.device is None:
+            return
+        # write errors are raised, everything is closed anyway
+        try:
+            if self.batcher is not None:
+                self.batcher.close()
+        finally:
+            try:
+                self.transport.close()
+            finally:
+                if self._owns_device:
+                    os.close(self.device)
+
+    def _handle_payload(self, payload, *data):
+        """Handles the given payload
+        payload is the command itself, data are optional buffers which are appended after it
+        without joining them first. Buffers (bytes, bytearray, memoryview) are appended as they
+        are, other sequences of ints (e.g. lists) are converted with bytes() first.
+        Returns the payload (without data)"""
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = bytes(payload)
+        data = tuple(part if isinstance(part, (bytes, bytearray, memoryview)) else bytes(part) for part in data)
+        if self.state.pending:
+            # settings requested by the optimizer take effect before this command
+            pending = self.state.flush()
+            if pending:
+                if self.tracer is not None or self.debug_mode == DEBUG_MODE_HEXDUMP:
+                    self._trace("optimizer", pending, ())
+                self.data += pending
+        if self.tracer is not None or self.debug_mode == DEBUG_MODE_HEXDUMP:
+            self._trace(None, payload, data)
+        self.data += payload
+        for part in data:
+            self.data += part
         return payload
 
-    def print(self, text, encoding="cp437"):
+    def _trace(self, method, payload, data):
+        """Hands a command to the tracer and prints it in DEBUG_MODE_HEXDUMP
+        Without method, the name of the command method calling `_handle_payload` is used"""
+        if self.debug_mode == DEBUG_MODE_HEXDUMP:
+            print(hexdump(b"".join(bytes(part) for part in (payload,) + data)))
+        if self.tracer is not None:
+            if method is None:
+                frame = sys._getframe(2)
+                method = frame.f_code.co_name
+                if method == "_handle_state":
+                    method = frame.f_back.f_code.co_name
+            self.tracer.record(method, (payload,) + data)
+
+    def _handle_state(self, payload, **values):
+        """Handles the payload of a command which changes the settings given as values
+        With the optimizer enabled only the requested state is updated, see `srp350.state`"""
+        if self.optimize:
+            self.state.set(values)
+            return payload
+        self.state.apply(values)
+        return self._handle_payload(payload)
+
+    def print(self, text, encoding=None):
+        """Prints text
+        Without encoding, text is encoded for the selected code page and international character set
+        using the precomputed tables of `srp350.encoding`. With encoding (a python codec name) it's
+        encoded using that codec."""
         if self.debug_mode == DEBUG_MODE_VISUAL:
             if self._debug_underline: sys.stdout.write("\u001b[4m")
             if self._debug_emphasize_mode: sys.stdout.write("\u001b[1m")
             sys.stdout.write(text + "\u001b[0m")
-        return self._handle_payload(list(text.encode(encoding)))
-
-    def println(self, text, encoding="cp437"):
+        if encoding is not None:
+            return self._handle_payload(text.encode(encoding))
+        encoder = get_encoder(self.state.get("codepage") or 0, self.state.get("charset") or 0,
+                              self.encoding_errors)
+        if not self.auto_codepage:
+            return self._handle_payload(encoder.encode(text))
+        segments = encoder.segments(text)
+        for codepage, data in segments:
+            if codepage != encoder.codepage:
+                self.select_character_code_table(codepage)
+                encoder = get_encoder(codepage, encoder.charset, self.encoding_errors)
+            self._handle_payload(data)
+        return b"".join(data for _, data in segments)
+
+    def println(self, text, encoding=None):
         self.print(text + "\n", encoding=encoding)
 
     ## commands refering to https://www.jarltech.com/ger_new/new/support/cd/srp350-esc_commands.pdf
@@ -129,7 +318,7 @@ class SRP350(object):
         Horizontal Tab
         Moves the print position to the next horizontal tab position."""
         if self.debug_mode == DEBUG_MODE_VISUAL: sys.stdout.write("\t")
-        payload = [0x09]
+        payload = bytes((0x09,))
         return self._handle_payload(payload)
 
     def line_feed(self):
@@ -137,14 +326,14 @@ class SRP350(object):
         Print and line feed
         Prints the data in the print buffer and feeds one line based on the currentline spacing."""
         if self.debug_mode == DEBUG_MODE_VISUAL: sys.stdout.write("\n")
-        payload = [0x0A]
+        payload = bytes((0x0A,))
         return self._handle_payload(payload)
     
     def print_and_return_to_standard_mode(self): 
         """FF
         Print and return to standard mode in page mode
         Prints the data in the print buffer collectively and returns to standard mode."""
-        payload = [0x0C]
+        payload = bytes((0x0C,))
         return self._handle_payload(payload)
     
     def carriage_return(self):
@@ -153,14 +342,14 @@ class SRP350(object):
         When automatic line feed is enabled, this command functions the same as LF;when automatic line feed is
         disabled, this command is ignored."""
         if self.debug_mode == DEBUG_MODE_VISUAL: sys.stdout.write("\r")
-        payload = [0x0D]
+        payload = bytes((0x0D,))
         return self._handle_payload(payload)
     
     def cancel_print_data(self):
         """CAN
         Cancel print data in page mode.
         In page mode, deletes all the print data in the current printable area."""
-        payload = [0x18]
+        payload = bytes((0x18,))
         return self._handle_payload(payload)
     
     def real_time_status_transmission(self, n):
@@ -172,7 +361,7 @@ class SRP350(object):
         n = 2 : Transmit off-line status.
         n = 3 : Transmit error status.
         n = 4 : Transmit paper roll sensor status."""
-        payload = [0x10, 0x04, n]
+        payload = bytes((0x10, 0x04, n))
         return self._handle_payload(payload)
     
     def real_time_request(self, n):
@@ -181,14 +370,23 @@ class SRP350(object):
         Recover from an error and restart printing from the line where the error occurred
     
         1 <= n <= 2"""
-        payload = [0x10, 0x05, n]
+        payload = bytes((0x10, 0x05, n))
         return self._handle_payload(payload)
+
+    def query_status(self, n, timeout=1.0):
+        """Sends DLE EOT n out-of-band (bypassing self.data and queued buffers) and returns the
+        decoded reply as dict condition: bool, see `srp350.status`
+        Raises TimeoutError if the printer doesn't answer within timeout seconds."""
+        if self.transport is None:
+            raise IOError("printer has no device")
+        reply = self.transport.query(bytes((0x10, 0x04, n)), 1, timeout)
+        return status.decode(n, reply[0])
     
     def print_data_in_page_mode(self):
         """ESC FF
         Print data in page mode.
         In page mode, prints all buffered data in the printing area collectively."""
-        payload = [0x1B, 0x0C]
+        payload = bytes((0x1B, 0x0C))
         return self._handle_payload(payload)
     
     def set_right_side_character_spacing(self, n):
@@ -197,8 +395,8 @@ class SRP350(object):
         Sets the character spacing for the right side of the character to[n x horizontal or vertical motion units].
         
         0 <= n <= 255"""
-        payload = [0x1B, 0x20, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x20, n))
+        return self._handle_state(payload, right_spacing=n)
 
     def select_print_mode(self, n):
         """ESC ! n
@@ -217,15 +415,15 @@ class SRP350(object):
         |   5 | on/off | Double width mode     |
         |   6 | on/off | Undefined             |
         |   7 | on/off | Underline mode        |"""
-        payload = [0x1B, 0x21, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x21, n))
+        return self._handle_state(payload, **state.print_mode(n))
 
     def set_absolute_print_position(self, nL, nH):
         """ESC $ nL nH
         Set the distance from the beginning of the line to the position at whichsubsequent characters are to be printed.
         x   The distance from the beginning of the line to the print position is
             [(nL + nH x 256) x (vertical or horizontal motion unit)] inches."""
-        payload = [0x1B, 0x24, nL, nH]
+        payload = bytes((0x1B, 0x24, nL, nH))
         return self._handle_payload(payload)
     
     def select_cancel_user_defined_character_set(self, n):
@@ -233,7 +431,7 @@ class SRP350(object):
         Selects or cancels the user-defined character set.
         x  When the LSB of n is 0, the user-defined character set is canceled.
         x  When the LSB of n is 1, the user-defined character set is selected."""
-        payload = [0x1B, 0x25, n]
+        payload = bytes((0x1B, 0x25, n))
         return self._handle_payload(payload)
     
     def define_user_defined_characters(self, *args):
@@ -253,8 +451,8 @@ class SRP350(object):
         |  1 | 8 dot double density |      8 | 60 DPI         | 180 DPI       | nL + nH x 256       |
         | 32 | 24dot single density |     24 | 180 DPI        | 90 DPI        | (nL + nH x 256) x 3 |
         | 33 | 24dot double density |     24 | 180 DPI        | 180 DPI       | (nL + nH x 256) x 3 |"""
-        payload = [0x1B, 0x2A, m, nL, nH] + d
-        self._handle_payload(payload)
+        payload = bytes((0x1B, 0x2A, m, nL, nH))
+        self._handle_payload(payload, d)
 
     def underline_mode(self, n):
         """ESC - n
@@ -267,21 +465,21 @@ class SRP350(object):
         | '1' |  49 | 1 dot thick  |
         | '2' |  50 | 2 dots thick |"""
         self._debug_underline = n != UNDERLINE_OFF
-        payload = [0x1B, 0x2D, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x2D, n))
+        return self._handle_state(payload, underline=state.digit(n))
     
     def select_default_line_spacing(self):
         """ESC 2
         Selects 1/6-inch line (approximately 4.23mm) spacing."""
-        payload = [0x1B, 0x32]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x32))
+        return self._handle_state(payload, line_spacing=None)
     
     def set_line_spacing(self, n):
         """ESC 3 n
         Set line spacing.
         Sets the line  spacing to [n x vertical or horizontal motion unit] inches."""
-        payload = [0x1B, 0x33, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x33, n))
+        return self._handle_state(payload, line_spacing=n)
 
     def set_peripheral_device(self, n):
         """ESC = n
@@ -289,14 +487,14 @@ class SRP350(object):
         Selects device to which host computer sends data, using n as follows:
         x    n = 0 -> printer disabled
         x    n = 1 -> printer enabled"""
-        payload = [0x1B, 0x3D, n]
+        payload = bytes((0x1B, 0x3D, n))
         return self._handle_payload(payload)
 
     def cancel_user_defined_characters(self, n):
         """ESC ? n
         Cancel user-defined characters.
         32 < n < 126"""
-        payload = [0x1B, 0x3F, n]
+        payload = bytes((0x1B, 0x3F, n))
         return self._handle_payload(payload)
 
     def initialize_printer(self):
@@ -306,8 +504,13 @@ class SRP350(object):
         was turned on"""
         self._debug_emphasize_mode = False
         self._debug_underline = False
-        payload = [0x1B, 0x40]
-        return self._handle_payload(payload)
+        self._downloaded_bit_image = None
+        # settings requested before are reset anyway
+        self.state.pending = {}
+        payload = bytes((0x1B, 0x40))
+        self._handle_payload(payload)
+        self.state.reset()
+        return payload
     
     def set_horizontal_tab_position(self, *n):
         """ESC D n1...nk NUL
@@ -315,7 +518,7 @@ class SRP350(object):
         Sets horizontal tab position.
         * n specifies the column number for setting a horizontal tab position from thebeginning of the line.
         * k indicates the total number of horizontal tab positions to be set."""
-        payload = [0x1B, 0x44] + n + [0x00]
+        payload = bytes((0x1B, 0x44) + n + (0x00,))
         return self._handle_payload(payload)
 
     def emphasize_mode(self, n):
@@ -323,8 +526,8 @@ class SRP350(object):
         Turn emphasized mode on/off.
         Turns emphasized mode on or off.When the LSB is 0, emphasized mode is turned off."""
         self._debug_emphasize_mode = n == 1
-        payload = [0x1B, 0x45, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x45, n))
+        return self._handle_state(payload, emphasize=n & 1)
     
     def double_strike_mode(self, n):
         """ESC G n
@@ -333,41 +536,41 @@ class SRP350(object):
         *  When the LSB is 0, double-strike mode is turned off.
         *  When the LSB is 1, double-strike mode is turned on."""
         self._debug_emphasize_mode = n == 1
-        payload = [0x1B, 0x47, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x47, n))
+        return self._handle_state(payload, double_strike=n & 1)
 
     def print_and_feed_paper(self, n):
         """ESC J n
         Print and feed paper.
         Prints the data in the print buffer and feeds the paper [n x vertical or horizontal motion unit] inches, unit.
         0 <= n <= 255"""
-        payload = [0x1B, 0x4A, n]
+        payload = bytes((0x1B, 0x4A, n))
         return self._handle_payload(payload)
     
     def select_page_mode(self):
         """ESC L
         Select page mode
         Switches from standard mode to page mode"""
-        payload = [0x1B, 0x4C]
+        payload = bytes((0x1B, 0x4C))
         return self._handle_payload(payload)
 
     def select_character_font(self, n):
         """ESC M n
         Select character font"""
-        payload = [0x1B, 0x4D, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x4D, n))
+        return self._handle_state(payload, font=n & 1)
     
     def select_international_charset(self, n):
         """ESC R n
         Select an international character set"""
-        payload = [0x1B, 0x52, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x52, n))
+        return self._handle_state(payload, charset=n)
 
     def select_standard_mode(self):
         """ESC S
         Select standard mode
         Switches from page mode to standard mode"""
-        payload = [0x1B, 0x53]
+        payload = bytes((0x1B, 0x53))
         return self._handle_payload(payload)
     
     def select_print_direction(self, n):
@@ -382,19 +585,24 @@ class SRP350(object):
         | 1 |  49 | Bottom to top   | Lower left        |
         | 2 |  50 | Right to left   | Lower right       |
         | 3 |  51 | Top to bottom   | Upper right       |"""
-        payload = [0x1B, 0x54, n]
+        payload = bytes((0x1B, 0x54, n))
         return self._handle_payload(payload)
     
     def clockwise_rotation_mode(self, n):
         """ESC V n
         Turn 90° clockwise rotation mode on/off"""
-        payload = [0x1B, 0x56, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1B, 0x56, n))
+        return self._handle_state(payload, rotation=n & 1)
 
     def set_printing_area(self, xL, xH, yL, yH, dxL, dxH, dyL, dyH):
-        """ESC W xL xH yL yH dxL dxH dyL dyH"""
-        # TODO
-        raise NotImplementedError("This command is not implemented yet")
+        """ESC W xL xH yL yH dxL dxH dyL dyH
+        Set printing area in page mode
+        The area starts at (xL + xH x 256, yL + yH x 256) and is (dxL + dxH x 256) wide and
+        (dyL + dyH x 256) high, in horizontal / vertical motion units. Data already developed
+        in the page buffer stays, so several areas can be filled before printing the page.
+        See `srp350.page` for a layout engine."""
+        payload = bytes((0x1B, 0x57, xL, xH, yL, yH, dxL, dxH, dyL, dyH))
+        return self._handle_payload(payload)
     
     def set_relative_print_position(self, nL, nH):
         """ESC \ nL nH
@@ -402,11 +610,20 @@ class SRP350(object):
         Set the print starting position based on the current position by using the horizontal or
         vertical motion unit.
         * This command sets the distance from the current position to [(nL + nH x 256) x horizontal or vertical motion unit]"""
-        payload = [0x1B, 0x5C, nL, nH]
+        payload = bytes((0x1B, 0x5C, nL, nH))
         return self._handle_payload(payload)
 
     # (8-11)
-    # TODO ESC a n
+    def select_justification(self, n):
+        """ESC a n
+        Select justification
+        Aligns all the data in one line to the specified position.
+        n = 0, 48 : Left justification
+        n = 1, 49 : Centering
+        n = 2, 50 : Right justification"""
+        payload = bytes((0x1B, 0x61, n))
+        return self._handle_state(payload, justification=state.digit(n))
+
     # TODO ESC c 3 n
     # TODO ESC c 4 n
 
@@ -418,16 +635,32 @@ class SRP350(object):
         Print and feed n lines
         Prints the data in the print buffer and feeds n lines."""
         sys.stdout.write("\n" * n)
-        payload = [0x1B, 0x64, n]
+        payload = bytes((0x1B, 0x64, n))
         return self._handle_payload(payload)
 
     # (8-12)
     # TODO ESC p m t1 t2
-    # TODO ESC t n
+
+    def select_character_code_table(self, n):
+        """ESC t n
+        Select character code table (see CODEPAGE_*)
+        0: PC437, 1: Katakana, 2: PC850, 3: PC860, 4: PC863, 5: PC865,
+        16: WPC1252, 17: PC866, 18: PC852, 19: PC858"""
+        payload = bytes((0x1B, 0x74, n))
+        return self._handle_state(payload, codepage=n)
 
     # (8-13)
     # TODO ESC { n
-    # TODO FS p n m
+
+    def print_nv_bit_image(self, n, m):
+        """FS p n m
+        Print NV bit image
+        Prints NV bit image n using the mode specified by m (see BIT_IMAGE_MODE_*)
+        1 <= n <= 255"""
+        if self.debug_mode == DEBUG_MODE_VISUAL:
+            sys.stdout.write("\n NVIMAGENVIMAGENVIMAGENVIMAGENVIMAGE \n")
+        payload = bytes((0x1C, 0x70, n, m))
+        return self._handle_payload(payload)
 
     def define_nv_bit_image(self, n, d):
         """FS q n [xL xH yLyH d1 ...dk]1 ...[xL xH yL yH d1...dk]n
@@ -437,18 +670,26 @@ class SRP350(object):
         * xL, xH specifies (xL + xH x 256) x 8 dots in the horizontal direction for the NV bit image you are defining.
         * yL, yH specifies (yL + yH x 256) x 8 dots in the vertical direction for the NV bit image you are defining
         """
-        payload = [0x1C, 0x71, n] + d
-        return self._handle_payload(payload)
+        payload = bytes((0x1C, 0x71, n))
+        return self._handle_payload(payload, d)
 
     def select_character_size(self, n):
         """GS ! n
         Select character size.
         Selects the character height using bits 0 to 2 and selects the character width using bits 4 to 7"""
-        payload = [0x1D, 0x21, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1D, 0x21, n))
+        return self._handle_state(payload, size=n)
 
     # (8-14)
-    # TODO GS $ nL nH
+    def set_absolute_vertical_print_position(self, nL, nH):
+        """GS $ nL nH
+        Set absolute vertical print position in page mode
+        Sets the vertical position (the baseline of characters, the bottom of bit images and bar
+        codes) to [(nL + nH x 256) x vertical motion unit] from the start of the printing area.
+        Ignored in standard mode."""
+        payload = bytes((0x1D, 0x24, nL, nH))
+        return self._handle_payload(payload)
+
     def define_downloaded_bit_image(self, x, y, d):
         """GS * x y d1...d(x x y x 8)
         Define downloaded bit image
@@ -459,15 +700,16 @@ class SRP350(object):
         1 <= y <= 48
         x x y <= 1536
         0 <= d <= 255"""
-        payload = [0x1D, 0x2A, x, y] + d
-        self._handle_payload(payload)
+        self._downloaded_bit_image = None
+        payload = bytes((0x1D, 0x2A, x, y))
+        self._handle_payload(payload, d)
     
     # (8-15)
     def print_downloaded_bit_image(self, m):
         """GS / m
         Print downloaded bit image
         Prints a downloaded bit image using the mode specified by m"""
-        payload = [0x1D, 0x2F, m]
+        payload = bytes((0x1D, 0x2F, m))
         self._handle_payload(payload)
 
     # TODO GS :
@@ -475,19 +717,25 @@ class SRP350(object):
     def inverse_printing_mode(self, n):
         """GS R n (TYPO: it's GS B n)
         Turn white/black reverse printing mode on/off"""
-        payload = [0x1D, 0x42, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1D, 0x42, n))
+        return self._handle_state(payload, inverse=n & 1)
     
     def select_hri_printing_position(self, n):
         """GS H n
         Select printing position of HRI characters"""
-        payload = [0x1D, 0x48, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1D, 0x48, n))
+        return self._handle_state(payload, hri_position=state.digit(n))
 
     
     # (8-16)
     # TODO GS I n
-    # TODO GS L nL nH
+    def set_left_margin(self, nL, nH):
+        """GS L nL nH
+        Set left margin
+        Sets the left margin to [(nL + nH x 256) x horizontal motion unit] in standard mode."""
+        payload = bytes((0x1D, 0x4C, nL, nH))
+        return self._handle_payload(payload)
+
     # TODO GS P x y
 
     def cut_paper(self, m, n=None):
@@ -498,8 +746,7 @@ class SRP350(object):
     
         m == 66: Feeds paper (cutting position + [n x (vertical motion unit)]), and cuts the paper"""
         if self.debug_mode == DEBUG_MODE_VISUAL: sys.stdout.write("\nCUTCUTCUTCUTCUTCUTCUTCUTCUTCUTCUTCUTCUTCUT\n")
-        payload = [0x1D, 0x56, m]
-        if n is not None: payload.append(n)
+        payload = bytes((0x1D, 0x56, m) if n is None else (0x1D, 0x56, m, n))
         return self._handle_payload(payload)
 
     # (8-17)
@@ -513,39 +760,62 @@ class SRP350(object):
     def smoothing_mode(self, n):
         """GS b n
         Turns smoothing mode on/off"""
-        payload = [0x1D, 0x62, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1D, 0x62, n))
+        return self._handle_state(payload, smoothing=n & 1)
 
     def select_hri_font(self, n):
         """GS f n
         Select font for Human Readable Interpretation (HRI) characters."""
-        payload = [0x1D, 0x77, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1D, 0x66, n))
+        return self._handle_state(payload, hri_font=n & 1)
     
     def set_barcode_height(self, n):
         """GS h n
         Set barcode height
         Set the height of the bar code
         n specifies the number of dots in the vertical direction."""
-        payload = [0x1D, 0x68, n]
-        return self._handle_payload(payload)
+        payload = bytes((0x1D, 0x68, n))
+        return self._handle_state(payload, barcode_height=n)
 
-    # TODO: BARCODE SYSTEMS > 65 (page 8-20)
     def print_barcode(self, n, m, data):
         """1) GS k m dl...dk NUL 2) GS k m n dl...dk
         Print bar code
-        Selects a bar code system and prints the bar-code, m select a bar code system"""
+        Selects a bar code system and prints the bar-code, m select a bar code system
+        data is validated by `srp350.barcode` first (ValueError before anything is sent), check
+        digits are computed and Code128 is split into the code sets giving the shortest symbol.
+        For system B n is the data length, None computes it. Code128 data starting with "{" is
+        sent as given (code sets selected by the caller)."""
         if self.debug_mode == DEBUG_MODE_VISUAL: 
             sys.stdout.write("\nBARCODEBARCODEBARCODEBARCODEBARCODEBARCODE\n")
             sys.stdout.write("\n{0}\n".format(data))
-        d = data.encode("ASCII")
+        if m == BARCODE_SYSTEM_B_CODE128 and data[:1] in ("{", b"{"):
+            d = data.encode("ASCII") if isinstance(data, str) else bytes(data)
+            barcode.from_native(m, d)
+        else:
+            d = barcode.encode(m, data).native
         if (m <= BARCODE_SYSTEM_A_CODABAR):
-            payload = [0x1D, 0x6B, m] + list(d) + [0x00]
+            payload = bytes((0x1D, 0x6B, m)) + d + b"\x00"
             return self._handle_payload(payload)
         else:
-            payload = [0x1D, 0x6B, m, n] + list(d)
+            if n is None or n != len(d):
+                n = len(d)
+            payload = bytes((0x1D, 0x6B, m, n)) + d
             return self._handle_payload(payload)
 
+    def print_barcode_image(self, m, data, module_width=None, height=None, center=True):
+        """Prints a bar code as raster bit image (`srp350.barcode`), for systems or module widths
+        the firmware doesn't support
+        module_width and height default to the values of `set_barcode_width` /
+        `set_barcode_height`, HRI characters are not printed."""
+        if self.debug_mode == DEBUG_MODE_VISUAL:
+            sys.stdout.write("\nBARCODEBARCODEBARCODEBARCODEBARCODEBARCODE\n")
+            sys.stdout.write("\n{0}\n".format(data))
+        code = barcode.encode(m, data)
+        module_width = module_width or self.state.get("barcode_width") or state.DEFAULTS["barcode_width"]
+        height = height or self.state.get("barcode_height") or state.DEFAULTS["barcode_height"]
+        self.print_raster_bit_image(BIT_IMAGE_MODE_NORMAL,
+                                    *barcode.raster(code.modules, module_width, height, center))
+
     # (8-20)
     # TODO GS r n
 
@@ -557,41 +827,113 @@ class SRP350(object):
         """
         if self.debug_mode == DEBUG_MODE_VISUAL: 
             sys.stdout.write("\n IMAGEIMAGEIMAGEIMAGEIMAGEIMAGEIMAGEIMAGE \n")
-        payload = [0x1D, 0x76, 0x30, m, xL, xH, yL, yH] + d
-        self._handle_payload(payload)
+        payload = bytes((0x1D, 0x76, 0x30, m, xL, xH, yL, yH))
+        self._handle_payload(payload, d)
     
+    def print_raster_bands(self, m, xL, xH, yL, yH, d, max_rows=raster.DEFAULT_BAND_ROWS,
+                           min_blank=raster.MIN_BLANK_ROWS):
+        """Prints raster data (as `generate_image_data` returns it) in bands, see `raster.bands`
+        Blank rows are fed with ESC J instead of being sent, each band is cropped to its inked
+        bytes and placed with the left margin (GS L, reset to 0 afterwards). Images of any
+        height can be printed, every band has at most max_rows rows.
+        The bands are placed from the left edge, a centering or right justification is
+        suspended while they are printed."""
+        scale_x = 2 if m & 1 else 1
+        scale_y = 2 if m & 2 else 1
+        height = yL + yH * 256
+        justification = self.state.get("justification") or 0
+        if justification:
+            self.select_justification(0)
+        margin = 0
+        position = 0
+        for band in raster.bands(xL, xH, yL, yH, d, max_rows, min_blank):
+            self._feed_dots((band.top - position) * scale_y)
+            if band.left * 8 * scale_x != margin:
+                margin = band.left * 8 * scale_x
+                self.set_left_margin(margin % 256, margin // 256)
+            self.print_raster_bit_image(m, band.width % 256, band.width // 256,
+                                        band.rows % 256, band.rows // 256, band.data)
+            position = band.top + band.rows
+        if margin:
+            self.set_left_margin(0, 0)
+        self._feed_dots((height - position) * scale_y)
+        if justification:
+            self.select_justification(justification)
+
+    def _feed_dots(self, dots):
+        while dots > 0:
+            self.print_and_feed_paper(min(dots, 255))
+            dots -= 255
+
     def set_barcode_width(self, n):
         """GS w n
         Set bar code width
-        Set the horizontal size of the bar code, n specifies the bar code width as follows:"""
-        # TODO
-        payload = [0x1D, 0x77, n]
-        self._handle_payload(payload)
+        Set the horizontal size of the bar code, n specifies the bar code width as follows:
+        n = 2..6: module width in dots (default 3)"""
+        if not 2 <= n <= 6:
+            raise ValueError("bar code width must be 2..6, not {0}".format(n))
+        payload = bytes((0x1D, 0x77, n))
+        return self._handle_state(payload, barcode_width=n)
 
     # n generators
 
-    def generate_image_data(self, image, center=True):
+    def generate_image_data(self, image, center=True, dither=None):
         """generates data for `print_raster_bit_image`
         image must be a pil image object. The given image will be scaled to fit the printer
+        If dither (one of the DITHER_* constants) is given, the vectorized NumPy rasterizer
+        (`srp350.raster`) is used instead of the PIL conversion chain, in worker processes if the
+        printer has a preparer.
+        If the printer has a raster_cache, the result is looked up there first.
         """
+        if self.raster_cache is not None:
+            key = image_key(image, center, raster.PRINTER_WIDTH, dither)
+            return self.raster_cache.get_or_create(key, lambda: self._generate_image_data(image, center, dither))
+        return self._generate_image_data(image, center, dither)
+
+    def print_qr_code(self, data, scale=4, ec=QR_EC_M, center=True, native=False):
+        """Prints data (str or bytes) as QR code with modules of scale x scale dots
+        ec is one of the QR_EC_* error correction levels. The symbol is encoded by `srp350.qr`
+        and printed with `print_raster_bit_image`, with native=True the printer encodes it
+        (GS ( k, only on firmware with QR support; center has no effect, use
+        `select_justification`)."""
+        if self.debug_mode == DEBUG_MODE_VISUAL:
+            sys.stdout.write("\nQRCODEQRCODEQRCODEQRCODE\n{0}\n".format(data))
+        if native:
+            return self._handle_payload(qr.native_commands(data, scale, ec))
+        self.print_raster_bit_image(BIT_IMAGE_MODE_NORMAL, *qr.raster(data, scale, ec, center))
+
+    def print_image(self, image, m=BIT_IMAGE_MODE_NORMAL, center=True, dither=None):
+        """Prints a pil image object using `generate_image_data` and `print_raster_bands`"""
+        self.print_raster_bands(m, *self.generate_image_data(image, center=center, dither=dither))
+
+    def print_column_image(self, image, m=IMAGE_MODE_24DOT_DOUBLE, center=True, dither=None):
+        """Prints a pil image object with `select_bit_image_mode` (ESC *) in stripes of 24 dot
+        lines, see `srp350.column` (the line spacing is 24 dots meanwhile)"""
+        self.print_column_stripes(m, column.bit_image_data(m, *self.generate_image_data(image, center, dither)))
+
+    def print_column_stripes(self, m, stripes):
+        """Prints (nL, nH, d) stripes of `srp350.column` (e.g. from a `ColumnEncoder`, which
+        may still be generating them) with ESC * and LF"""
+        line_spacing = self.state.get("line_spacing")
+        self.set_line_spacing(column.STRIPE_HEIGHT)
+        for nL, nH, d in stripes:
+            self.select_bit_image_mode(m, nL, nH, d)
+            self.line_feed()
+        if line_spacing is None:
+            self.select_default_line_spacing()
+        else:
+            self.set_line_spacing(line_spacing)
 
+    def _generate_image_data(self, image, center, dither):
+        if dither is not None:
+            if self.preparer is not None:
+                return self.preparer.rasterize(image, center, dither)
+            return raster.rasterize(image, center=center, dither_mode=dither)
+
+        image = raster.fit_width(image)
         width, height = image.size
-        if (width > 512):
-            ratio = width / 512
-            width = 512
-            new_height = int(height / ratio)
-            height = new_height
-            image = image.resize((512, int(new_height)), Image.ANTIALIAS)
-
-        img_original = image.convert("RGBA")
-        im = Image.new("RGB", img_original.size, (255, 255, 255))
-        im.paste(img_original, mask=img_original.split()[3])
-        # Convert down to greyscale
-        im = im.convert("L")
-        # Invert: Only works on 'L' images
-        im = ImageOps.invert(im)
-        # Pure black and white
-        im = im.convert("1")
+
+        im = raster.bitmap(image)
 
         if center and width < 512:
             old_width, height = im.size
@@ -606,10 +948,11 @@ class SRP350(object):
 
             width = 512
 
-        xL = width // 8
+        # rows are padded to whole bytes
+        xL = -(-width // 8)
         yH = height // 256
         yL = height - (yH * 256)
-        d = list(im.tobytes())
+        d = im.tobytes()
         return [xL, 0, yL, yH, d]
 
     def gen_print_mode(self,
@@ -633,4 +976,4 @@ class SRP350(object):
         return (width << 4) | height
 
     def generate_nv_image_data(self, width, height, data):
-        return [width, 0, height, 0] + data
\ No newline at end of file
+        return bytes((width % 256, width // 256, height % 256, height // 256)) + bytes(data)
\ No newline at end of file
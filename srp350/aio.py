@@ -0,0 +1,110 @@
+"""asyncio printer client
+
+`AsyncSRP350` has the same command building API as `SRP350`, but the device is opened
+non-blocking and `send`, `flush` and `close` are coroutines which wait for the device
+using the event loop's writer callbacks instead of blocking a thread.
+
+    printer = AsyncSRP350("/dev/usb/lp0")
+    printer.println("Hello")
+    await printer.send()
+    await printer.close()
+"""
+
+import asyncio
+import os
+
+from . import SRP350, DEBUG_MODE_OFF
+from .transport import DEFAULT_CHUNK_SIZE
+
+
+class AsyncSRP350(SRP350):
+
+    def __init__(self, port, debug_mode=DEBUG_MODE_OFF, chunk_size=DEFAULT_CHUNK_SIZE, timeout=None,
+            progress=None, raster_cache=None, optimize=False, encoding_errors="transliterate",
+            auto_codepage=False, tracer=None, device=None):
+        """device is an already open non-blocking file descriptor (e.g. from a `DeviceManager`),
+        `close` leaves it open, see `SRP350`"""
+        super().__init__(port, debug_mode=debug_mode, chunk_size=chunk_size, timeout=timeout,
+                         progress=progress, raster_cache=raster_cache, optimize=optimize,
+                         encoding_errors=encoding_errors, auto_codepage=auto_codepage, tracer=tracer,
+                         device=device)
+        # serializes the writes of concurrent send() calls
+        self._write_lock = asyncio.Lock()
+        self._pending = 0
+
+    async def _writable(self):
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+
+        def callback():
+            if not ready.done():
+                ready.set_result(None)
+
+        loop.add_writer(self.device, callback)
+        try:
+            await asyncio.wait_for(ready, self.transport.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("device did not accept data within {0}s".format(self.transport.timeout))
+        finally:
+            loop.remove_writer(self.device)
+
+    async def _write(self, data):
+        view = memoryview(data).cast("B")
+        total = len(view)
+        written = 0
+        chunk_size = self.transport.chunk_size
+        progress = self.transport.progress
+        try:
+            while written < total:
+                try:
+                    # a real-time query (`query_status`) must not end up in the middle of a command
+                    with self.transport.lock:
+                        n = os.write(self.device, view[written:written + chunk_size])
+                except BlockingIOError:
+                    await self._writable()
+                    continue
+                written += n
+                if progress is not None:
+                    progress(written, total)
+        finally:
+            view.release()
+        return written
+
+    async def send(self):
+        """Sends the current buffer (self.data) and clears it
+        The buffer is detached before waiting, so the next receipt can be composed right away."""
+        if self.device is None:
+            raise IOError("printer has no device, use detach() to take the buffer")
+        data = self.detach()
+        self._pending += 1
+        try:
+            async with self._write_lock:
+                return await self._write(data)
+        finally:
+            self._pending -= 1
+
+    async def flush(self, timeout=None):
+        """Waits until all running send() calls are finished, returns False on timeout"""
+        async def wait():
+            while self._pending:
+                async with self._write_lock:
+                    pass
+        try:
+            await asyncio.wait_for(wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def close(self):
+        """Waits for pending writes and closes the connection to the device (a borrowed device
+        stays open)"""
+        if self.device is None:
+            return
+        try:
+            await self.flush()
+        finally:
+            try:
+                self.transport.close()
+            finally:
+                if self._owns_device:
+                    os.close(self.device)
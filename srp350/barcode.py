@@ -0,0 +1,510 @@
+"""Barcode encoders
+
+Table driven encoders for UPC-A, UPC-E, EAN-13, EAN-8, Code39, ITF, Codabar, Code93 and
+Code128. `encode` validates the data and computes check digits before anything is sent, and
+returns a `Barcode` with
+* native: the data for GS k (system B form, see `SRP350.print_barcode`)
+* modules: the symbol as bytes of 0/1 modules (1 = bar), without quiet zones
+* hri: the human readable text
+
+Code128 data is split into code sets A, B and C with a shortest path search, so digit runs
+are packed two per symbol character only where that makes the symbol shorter. The native form
+carries the chosen code sets ("{A", "{B", "{C" prefixes) as well, so the firmware prints the
+same short symbol.
+
+`raster` packs modules into data for `print_raster_bit_image`, for systems or widths the
+firmware lacks.
+
+    code = encode(BARCODE_CODE128, "ORDER 1234567890")
+    printer.print_raster_bit_image(48, *raster(code.modules, module_width=2, height=80))
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from .raster import PRINTER_WIDTH
+
+# GS k m, function B (system A 0..6 is mapped to these)
+BARCODE_UPC_A = 65
+BARCODE_UPC_E = 66
+BARCODE_EAN13 = 67
+BARCODE_EAN8 = 68
+BARCODE_CODE39 = 69
+BARCODE_ITF = 70
+BARCODE_CODABAR = 71
+BARCODE_CODE93 = 72
+BARCODE_CODE128 = 73
+
+WIDE = 3
+CACHE_SIZE = 1024
+
+Barcode = namedtuple("Barcode", "system native modules hri")
+
+# EAN / UPC
+
+_EAN_L = ("0001101", "0011001", "0010011", "0111101", "0100011",
+          "0110001", "0101111", "0111011", "0110111", "0001011")
+_EAN_R = tuple("".join("1" if c == "0" else "0" for c in code) for code in _EAN_L)
+_EAN_G = tuple(code[::-1] for code in _EAN_R)
+_EAN_CODES = {"L": _EAN_L, "G": _EAN_G, "R": _EAN_R}
+# parity of the left half of EAN-13 by the first digit
+_EAN13_PARITY = ("LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+                 "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL")
+# parity of UPC-E (number system 0) by the check digit, O = odd (L), E = even (G)
+_UPCE_PARITY = ("EEEOOO", "EEOEOO", "EEOOEO", "EEOOOE", "EOEEOO",
+                "EOOEEO", "EOOOEE", "EOEOEO", "EOEOOE", "EOOEOE")
+
+# Code39: 9 elements (bar first), 1 = wide
+
+_CODE39 = {
+    "0": "000110100", "1": "100100001", "2": "001100001", "3": "101100000", "4": "000110001",
+    "5": "100110000", "6": "001110000", "7": "000100101", "8": "100100100", "9": "001100100",
+    "A": "100001001", "B": "001001001", "C": "101001000", "D": "000011001", "E": "100011000",
+    "F": "001011000", "G": "000001101", "H": "100001100", "I": "001001100", "J": "000011100",
+    "K": "100000011", "L": "001000011", "M": "101000010", "N": "000010011", "O": "100010010",
+    "P": "001010010", "Q": "000000111", "R": "100000110", "S": "001000110", "T": "000010110",
+    "U": "110000001", "V": "011000001", "W": "111000000", "X": "010010001", "Y": "110010000",
+    "Z": "011010000", "-": "010000101", ".": "110000100", " ": "011000100", "*": "010010100",
+    "$": "010101000", "/": "010100010", "+": "010001010", "%": "000101010",
+}
+_CODE39_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ-. $/+%"
+
+# ITF: 5 elements per digit, 1 = wide
+
+_ITF = ("00110", "10001", "01001", "11000", "00101", "10100", "01100", "00011", "10010", "01010")
+
+# Codabar: 7 elements (bar first), 1 = wide
+
+_CODABAR = {
+    "0": "0000011", "1": "0000110", "2": "0001001", "3": "1100000", "4": "0010010",
+    "5": "1000010", "6": "0100001", "7": "0100100", "8": "0110000", "9": "1001000",
+    "-": "0001100", "$": "0011000", ":": "1000101", "/": "1010001", ".": "1010100",
+    "+": "0010101", "A": "0011010", "B": "0101001", "C": "0001011", "D": "0001110",
+}
+
+# Code93: 47 characters of 9 modules, the last four are the shift characters ($) (%) (/) (+)
+
+_CODE93 = (
+    "100010100", "101001000", "101000100", "101000010", "100101000", "100100100", "100100010",
+    "101010000", "100010010", "100001010", "110101000", "110100100", "110100010", "110010100",
+    "110010010", "110001010", "101101000", "101100100", "101100010", "100110100", "100011010",
+    "101011000", "101001100", "101000110", "100101100", "100010110", "110110100", "110110010",
+    "110101100", "110100110", "110010110", "110011010", "101101100", "101100110", "100110110",
+    "100111010", "100101110", "111010100", "111010010", "111001010", "101101110", "101110110",
+    "110101110", "100100110", "111011010", "111010110", "100110010",
+)
+_CODE93_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ-. $/+%"
+_CODE93_SHIFT = {"$": 43, "%": 44, "/": 45, "+": 46}
+_CODE93_START = "101011110"
+
+
+def _code93_full_ascii():
+    """Maps ASCII 0..127 to their Code93 values (one or two characters)"""
+    table = {}
+    for code in range(128):
+        c = chr(code)
+        if c in _CODE93_CHARS:
+            table[c] = (_CODE93_CHARS.index(c),)
+            continue
+        if code == 0:
+            shift, letter = "%", "U"
+        elif code < 27:
+            shift, letter = "$", chr(64 + code)
+        elif code < 32:
+            shift, letter = "%", chr(65 + code - 27)
+        elif code < 48 or code == 58:
+            shift, letter = "/", "Z" if code == 58 else chr(65 + code - 33)
+        elif code < 64:
+            shift, letter = "%", chr(70 + code - 59)
+        elif code == 64:
+            shift, letter = "%", "V"
+        elif code < 96:
+            shift, letter = "%", chr(75 + code - 91)
+        elif code == 96:
+            shift, letter = "%", "W"
+        elif code < 123:
+            shift, letter = "+", chr(65 + code - 97)
+        else:
+            shift, letter = "%", chr(80 + code - 123)
+        table[c] = (_CODE93_SHIFT[shift], _CODE93_CHARS.index(letter))
+    return table
+
+
+_CODE93_ASCII = _code93_full_ascii()
+
+# Code128: element widths of the symbol values 0..106 (106 = stop)
+
+_CODE128 = (
+    "212222", "222122", "222221", "121223", "121322", "131222", "122213", "122312", "132212", "221213",
+    "221312", "231212", "112232", "122132", "122231", "113222", "123122", "123221", "223211", "221132",
+    "221231", "213212", "223112", "312131", "311222", "321122", "321221", "312212", "322112", "322211",
+    "212123", "212321", "232121", "111323", "131123", "131321", "112313", "132113", "132311", "211313",
+    "231113", "231311", "112133", "112331", "132131", "113123", "113321", "133121", "313121", "211331",
+    "231131", "213113", "213311", "213131", "311123", "311321", "331121", "312113", "312311", "332111",
+    "314111", "221411", "431111", "111224", "111422", "121124", "121421", "141122", "141221", "112214",
+    "112412", "122114", "122411", "142112", "142211", "241211", "221114", "413111", "241112", "134111",
+    "111242", "121142", "121241", "114212", "124112", "124211", "411212", "421112", "421211", "212141",
+    "214121", "412121", "111143", "111341", "131141", "114113", "114311", "411113", "411311", "113141",
+    "114131", "311141", "411131", "211412", "211214", "211232", "2331112",
+)
+_CODE128_START = {"A": 103, "B": 104, "C": 105}
+_CODE128_SWITCH = {"A": 101, "B": 100, "C": 99}
+_CODE128_STOP = 106
+
+
+def _widths(widths):
+    """Element widths (bar first) to modules"""
+    return "".join(("1" if i % 2 == 0 else "0") * int(w) for i, w in enumerate(widths))
+
+
+def _wide_narrow(pattern, wide, first_bar=True):
+    """Wide/narrow flags to modules"""
+    out = []
+    bar = first_bar
+    for flag in pattern:
+        out.append(("1" if bar else "0") * (wide if flag == "1" else 1))
+        bar = not bar
+    return "".join(out)
+
+
+def _digits(data, lengths, name):
+    if not data.isdigit() or not data.isascii() or len(data) not in lengths:
+        raise ValueError("{0} needs {1} digits, got {2!r}".format(
+            name, " or ".join(str(n) for n in lengths), data))
+
+
+def _mod10(digits):
+    """UPC/EAN check digit of digits (without check digit)"""
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return str(-total % 10)
+
+
+def _checked(data, length, name):
+    """Returns data with check digit, data may have length digits or length + 1 (verified)"""
+    _digits(data, (length, length + 1), name)
+    check = _mod10(data[:length])
+    if len(data) == length + 1 and data[-1] != check:
+        raise ValueError("{0} check digit of {1!r} must be {2}".format(name, data, check))
+    return data[:length] + check
+
+
+def _ean(digits, parity):
+    left, right = digits[:len(digits) // 2], digits[len(digits) // 2:]
+    return ("101" + "".join(_EAN_CODES[p][int(d)] for d, p in zip(left, parity)) + "01010"
+            + "".join(_EAN_R[int(d)] for d in right) + "101")
+
+
+def _upce_expand(data):
+    """UPC-E number system + 6 digits to the 11 digits of the UPC-A"""
+    ns, d = data[0], data[1:7]
+    last = d[5]
+    if last in "012":
+        body = d[0:2] + last + "0000" + d[2:5]
+    elif last == "3":
+        body = d[0:3] + "00000" + d[3:5]
+    elif last == "4":
+        body = d[0:4] + "00000" + d[4]
+    else:
+        body = d[0:5] + "0000" + last
+    return ns + body
+
+
+def _upce_compress(upca):
+    """UPC-A (11 digits) to number system + 6 digits, None if it can't be compressed"""
+    ns, m, p = upca[0], upca[1:6], upca[6:11]
+    if ns not in "01":
+        return None
+    for candidate in (m[0:2] + p[2:5] + m[2], m[0:3] + p[3:5] + "3", m[0:4] + p[4] + "4", m[0:5] + p[4]):
+        if len(candidate) == 6 and _upce_expand(ns + candidate) == upca:
+            return ns + candidate
+    return None
+
+
+def encode_upc_a(data):
+    code = _checked(data, 11, "UPC-A")
+    return Barcode(BARCODE_UPC_A, code[:11].encode(), _ean(code, "LLLLLL"), code)
+
+
+def encode_upc_e(data):
+    """data: 6 digits (number system 0), 7 (number system + 6), 8 (with check digit) or a
+    compressible UPC-A of 11 or 12 digits"""
+    _digits(data, (6, 7, 8, 11, 12), "UPC-E")
+    if len(data) >= 11:
+        upca = _checked(data, 11, "UPC-A")
+        short = _upce_compress(upca[:11])
+        if short is None:
+            raise ValueError("UPC-A {0!r} can't be compressed to UPC-E".format(data))
+    else:
+        short = data if len(data) > 6 else "0" + data
+        if short[0] not in "01":
+            raise ValueError("UPC-E number system must be 0 or 1, got {0!r}".format(data))
+        upca = _checked(_upce_expand(short) + short[7:], 11, "UPC-E")
+    check = upca[11]
+    parity = _UPCE_PARITY[int(check)]
+    if short[0] == "1":
+        parity = parity.translate(str.maketrans("EO", "OE"))
+    modules = ("101" + "".join((_EAN_G if p == "E" else _EAN_L)[int(d)] for d, p in zip(short[1:7], parity))
+               + "010101")
+    return Barcode(BARCODE_UPC_E, upca[:11].encode(), modules, short[:7] + check)
+
+
+def encode_ean13(data):
+    code = _checked(data, 12, "EAN-13")
+    return Barcode(BARCODE_EAN13, code[:12].encode(), _ean(code[1:], _EAN13_PARITY[int(code[0])]), code)
+
+
+def encode_ean8(data):
+    code = _checked(data, 7, "EAN-8")
+    return Barcode(BARCODE_EAN8, code[:7].encode(), _ean(code, "LLLL"), code)
+
+
+def encode_code39(data, check=False, wide=WIDE):
+    """Code39 with start/stop characters, optional mod 43 check
+    data may already be wrapped in the * start/stop characters, they are stripped (* isn't
+    allowed anywhere else). The native data goes without them, the firmware adds them itself;
+    the modules and HRI text include them."""
+    data = data.upper()
+    if len(data) >= 2 and data[0] == data[-1] == "*":
+        data = data[1:-1]
+    for c in data:
+        if c not in _CODE39_CHARS:
+            raise ValueError("Code39 can't encode {0!r}".format(c))
+    if check:
+        data += _CODE39_CHARS[sum(_CODE39_CHARS.index(c) for c in data) % 43]
+    text = "*" + data + "*"
+    modules = "0".join(_wide_narrow(_CODE39[c], wide) for c in text)
+    return Barcode(BARCODE_CODE39, data.encode(), modules, text)
+
+
+def encode_itf(data, wide=WIDE):
+    """Interleaved 2 of 5, data needs an even number of digits"""
+    if not data.isdigit() or not data.isascii() or len(data) % 2 or not data:
+        raise ValueError("ITF needs an even number of digits, got {0!r}".format(data))
+    parts = ["1010"]
+    for i in range(0, len(data), 2):
+        bars, spaces = _ITF[int(data[i])], _ITF[int(data[i + 1])]
+        parts.append(_wide_narrow("".join(b + s for b, s in zip(bars, spaces)), wide))
+    parts.append(_wide_narrow("100", wide))
+    return Barcode(BARCODE_ITF, data.encode(), "".join(parts), data)
+
+
+def encode_codabar(data, wide=WIDE):
+    """Codabar, data starts and ends with one of A B C D (A is added if missing)"""
+    data = data.upper()
+    if not data or data[0] not in "ABCD":
+        data = "A" + data
+    if len(data) < 2 or data[-1] not in "ABCD":
+        data = data + "A"
+    for c in data[1:-1]:
+        if c not in _CODABAR or c in "ABCD":
+            raise ValueError("Codabar can't encode {0!r}".format(c))
+    modules = "0".join(_wide_narrow(_CODABAR[c], wide) for c in data)
+    return Barcode(BARCODE_CODABAR, data.encode(), modules, data)
+
+
+def encode_code93(data):
+    """Code93 (full ASCII) with the check characters C and K"""
+    values = []
+    for c in data:
+        if c not in _CODE93_ASCII:
+            raise ValueError("Code93 can't encode {0!r}".format(c))
+        values.extend(_CODE93_ASCII[c])
+    for weight_max in (20, 15):
+        values.append(sum(v * ((i % weight_max) + 1) for i, v in enumerate(reversed(values))) % 47)
+    modules = _CODE93_START + "".join(_CODE93[v] for v in values) + _CODE93_START + "1"
+    return Barcode(BARCODE_CODE93, data.encode("ascii"), modules, data)
+
+
+def _code128_sets(data):
+    """Returns the shortest list of (code set, text) runs for data"""
+    n = len(data)
+    inf = float("inf")
+    sets = "ABC"
+    # cost[i][s]: symbol characters for data[:i] ending in set s, back[i][s]: previous state
+    cost = [[inf] * 3 for _ in range(n + 1)]
+    back = [[None] * 3 for _ in range(n + 1)]
+    for s in range(3):
+        cost[0][s] = 0
+    for i in range(n + 1):
+        # switching code set costs one character (except at the start: the start character)
+        for s in range(3):
+            for t in range(3):
+                extra = 0 if i == 0 else 1
+                if cost[i][s] + extra < cost[i][t]:
+                    cost[i][t] = cost[i][s] + extra
+                    back[i][t] = (i, s)
+        if i == n:
+            break
+        code = ord(data[i])
+        for s in range(3):
+            if cost[i][s] == inf:
+                continue
+            if s == 2:
+                if i + 1 < n and data[i:i + 2].isdigit() and data[i:i + 2].isascii():
+                    step = (i + 2, s)
+                else:
+                    continue
+            elif (s == 0 and code < 96) or (s == 1 and 32 <= code < 128):
+                step = (i + 1, s)
+            else:
+                continue
+            if cost[i][s] + 1 < cost[step[0]][step[1]]:
+                cost[step[0]][step[1]] = cost[i][s] + 1
+                back[step[0]][step[1]] = (i, s)
+    end = min(range(3), key=lambda s: cost[n][s])
+    if cost[n][end] == inf:
+        raise ValueError("Code128 can't encode {0!r}".format(data))
+    runs = []
+    i, s = n, end
+    while (i, s) != (0, s) or back[i][s] is not None:
+        previous = back[i][s]
+        if previous is None:
+            break
+        j, t = previous
+        if j < i:
+            runs.append((sets[s], data[j:i]))
+        i, s = j, t
+    runs.reverse()
+    merged = []
+    for code_set, text in runs:
+        if merged and merged[-1][0] == code_set:
+            merged[-1] = (code_set, merged[-1][1] + text)
+        else:
+            merged.append((code_set, text))
+    return merged
+
+
+def _code128_values(runs):
+    values = []
+    for code_set, text in runs:
+        values.append(_CODE128_SWITCH[code_set] if values else _CODE128_START[code_set])
+        if code_set == "C":
+            values.extend(int(text[i:i + 2]) for i in range(0, len(text), 2))
+        elif code_set == "A":
+            values.extend(ord(c) + 64 if ord(c) < 32 else ord(c) - 32 for c in text)
+        else:
+            values.extend(ord(c) - 32 for c in text)
+    values.append((values[0] + sum(i * v for i, v in enumerate(values[1:], 1))) % 103)
+    return values
+
+
+def _code128_modules(values):
+    return "".join(_widths(_CODE128[v]) for v in values) + _widths(_CODE128[_CODE128_STOP])
+
+
+def encode_code128(data):
+    """Code128 with code sets chosen for the shortest symbol"""
+    if not data:
+        raise ValueError("Code128 needs data")
+    runs = _code128_sets(data)
+    native = []
+    for code_set, text in runs:
+        native.append(b"{" + code_set.encode())
+        if code_set == "C":
+            native.append(bytes(int(text[i:i + 2]) for i in range(0, len(text), 2)))
+        else:
+            native.append(text.encode("ascii").replace(b"{", b"{{"))
+    return Barcode(BARCODE_CODE128, b"".join(native), _code128_modules(_code128_values(runs)), data)
+
+
+def decode_code128_native(data):
+    """Returns the symbol values and the text of GS k Code128 data (with "{A"/"{B"/"{C"
+    selections)"""
+    values = []
+    text = []
+    code_set = None
+    i = 0
+    while i < len(data):
+        b = data[i]
+        if b == 0x7B and i + 1 < len(data):
+            selector = chr(data[i + 1])
+            i += 2
+            if selector in "ABC":
+                values.append(_CODE128_SWITCH[selector] if values else _CODE128_START[selector])
+                code_set = selector
+                continue
+            if selector != "{":
+                # FNC1..4 and shifts are not rendered
+                continue
+            b = 0x7B
+        else:
+            i += 1
+        if code_set == "C":
+            values.append(b)
+            text.append("{0:02d}".format(b))
+        elif code_set == "A":
+            values.append(b + 64 if b < 32 else b - 32)
+            text.append(chr(b))
+        else:
+            values.append(b - 32)
+            text.append(chr(b))
+    if not values:
+        return [], ""
+    values.append((values[0] + sum(i * v for i, v in enumerate(values[1:], 1))) % 103)
+    return values, "".join(text)
+
+
+_ENCODERS = {
+    BARCODE_UPC_A: encode_upc_a,
+    BARCODE_UPC_E: encode_upc_e,
+    BARCODE_EAN13: encode_ean13,
+    BARCODE_EAN8: encode_ean8,
+    BARCODE_CODE39: encode_code39,
+    BARCODE_ITF: encode_itf,
+    BARCODE_CODABAR: encode_codabar,
+    BARCODE_CODE93: encode_code93,
+    BARCODE_CODE128: encode_code128,
+}
+
+
+def system_b(system):
+    """Maps a system A number (0..6) to the system B one"""
+    return system + 65 if system < 65 else system
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def encode(system, data):
+    """Validates data for the system (BARCODE_* or SRP350 BARCODE_SYSTEM_* constant) and
+    returns its `Barcode`, modules as bytes of 0/1. Raises ValueError for invalid data."""
+    encoder = _ENCODERS.get(system_b(system))
+    if encoder is None:
+        raise ValueError("unknown barcode system {0}".format(system))
+    code = encoder(data)
+    return code._replace(modules=code.modules.encode("ascii").translate(_MODULES))
+
+
+_MODULES = bytes.maketrans(b"01", b"\x00\x01")
+_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def from_native(system, data):
+    """Returns the `Barcode` of GS k data as sent to the printer (for decoders/renderers)"""
+    system = system_b(system)
+    if system == BARCODE_CODE128:
+        values, text = decode_code128_native(bytes(data))
+        modules = _code128_modules(values).encode("ascii").translate(_MODULES) if values else b""
+        return Barcode(system, bytes(data), modules, text)
+    text = bytes(data).decode("ascii")
+    if system == BARCODE_CODE39:
+        text = text.strip("*")
+    return encode(system, text)
+
+
+def raster(modules, module_width=2, height=162, center=True, width=PRINTER_WIDTH, quiet_zone=10):
+    """Packs modules into (xL, xH, yL, yH, d) for `print_raster_bit_image`
+    Each module is module_width dots wide, quiet_zone modules of white are kept on both sides."""
+    dots = (len(modules) + 2 * quiet_zone) * module_width
+    if dots > width:
+        raise ValueError("barcode of {0} dots doesn't fit into {1} dots".format(dots, width))
+    line_bytes = width // 8 if center else -(-dots // 8)
+    left = (line_bytes * 8 - dots) // 2 if center else 0
+    bits = bytes(modules).translate(_DIGITS)
+    if module_width > 1:
+        bits = b"".join(_WIDE_BITS[module_width][b] for b in bits)
+    value = int(bits, 2) if bits else 0
+    shift = line_bytes * 8 - left - (quiet_zone + len(modules)) * module_width
+    line = (value << shift).to_bytes(line_bytes, "big")
+    return (line_bytes % 256, line_bytes // 256, height % 256, height // 256, line * height)
+
+
+_WIDE_BITS = {w: {ord("0"): b"0" * w, ord("1"): b"1" * w} for w in range(2, 7)}
@@ -0,0 +1,194 @@
+"""Batched writes of many small jobs
+
+`Batcher` collects complete jobs (e.g. kitchen tickets ending with a cut) and writes them with
+one `os.writev` per batch instead of one `os.write` per job. A batch is written as soon as it
+holds max_bytes or its oldest job waited max_linger seconds. Every job keeps its own
+`BatchJob` handle: when a write fails, the jobs written completely before the error are done,
+the others fail with the error. The first error is raised by the next `Batcher.flush` or
+`Batcher.close` as well, so it isn't lost when nobody waits for the jobs.
+
+    printer = SRP350("/dev/usb/lp0", batch_max_bytes=64 * 1024, batch_max_linger=0.002)
+    for ticket in tickets:
+        render(printer, ticket)
+        printer.send()
+    printer.flush()
+    print(printer.batcher.stats())
+"""
+
+import itertools
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 64 * 1024
+DEFAULT_MAX_LINGER = 0.002
+
+
+class BatchJob(object):
+
+    def __init__(self, job_id, data):
+        self.id = job_id
+        self.data = data
+        self.error = None
+        self.submitted = time.monotonic()
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return "<BatchJob {0} {1} bytes>".format(self.id, len(self.data))
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Waits until the job is written, raises the write error of a failed job
+        Returns False on timeout."""
+        if not self._done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    def _finish(self, error=None):
+        self.error = error
+        self.data = b""
+        self._done.set()
+
+
+class Batcher(object):
+
+    def __init__(self, transport, max_bytes=DEFAULT_MAX_BYTES, max_linger=DEFAULT_MAX_LINGER):
+        """transport is the `Transport` of the device
+        max_bytes is the size of a batch which is written at once, max_linger the time in
+        seconds a job waits for more jobs"""
+        self.transport = transport
+        self.max_bytes = max_bytes
+        self.max_linger = max_linger
+
+        self.jobs = 0
+        self.jobs_failed = 0
+        self.batches = 0
+        self.syscalls = 0
+        self.bytes_written = 0
+        # os.write calls the jobs would have needed when written one by one
+        self.unbatched_syscalls = 0
+
+        self._pending = []
+        self._pending_bytes = 0
+        self._flush = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._thread = None
+        self._error = None
+
+    def submit(self, data):
+        """Queues a complete job and returns its `BatchJob`"""
+        job = BatchJob(next(self._ids), data)
+        with self._cond:
+            if self._closed:
+                raise IOError("batcher is closed")
+            self._pending.append(job)
+            self._pending_bytes += len(data)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name="srp350-batch", daemon=True)
+                self._thread.start()
+            # the writer only waits for the first job and for a full batch
+            if len(self._pending) == 1 or self._pending_bytes >= self.max_bytes:
+                self._cond.notify_all()
+        return job
+
+    def flush(self, timeout=None):
+        """Writes the pending jobs without waiting for max_linger and waits for them
+        Returns False on timeout, raises the first write error since the last flush/close."""
+        with self._cond:
+            if not self._pending:
+                last = None
+            else:
+                last = self._pending[-1]
+                self._flush = True
+                self._cond.notify_all()
+        # jobs are written in order, the last one finishes last
+        if last is not None and not last._done.wait(timeout):
+            return False
+        self._raise_error()
+        return True
+
+    def close(self):
+        """Writes the pending jobs and stops the background thread
+        Raises the first write error since the last flush/close."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def _raise_error(self):
+        with self._cond:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def stats(self):
+        """Returns the counters as dict"""
+        return {
+            "jobs": self.jobs,
+            "jobs_failed": self.jobs_failed,
+            "batches": self.batches,
+            "jobs_per_batch": self.jobs / self.batches if self.batches else 0.0,
+            "bytes": self.bytes_written,
+            "syscalls": self.syscalls,
+            "syscalls_saved": self.unbatched_syscalls - self.syscalls,
+            "pending": len(self._pending),
+        }
+
+    def _next_batch(self):
+        """Waits for a full or lingered batch, returns its jobs ([] when closed)"""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            deadline = self._pending[0].submitted + self.max_linger if self._pending else 0
+            while self._pending_bytes < self.max_bytes and not self._flush and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            size = 0
+            count = 0
+            for job in self._pending:
+                if count and size + len(job.data) > self.max_bytes:
+                    break
+                size += len(job.data)
+                count += 1
+            batch = self._pending[:count]
+            del self._pending[:count]
+            self._pending_bytes -= size
+            if not self._pending:
+                self._flush = False
+            return batch
+
+    def _writer(self):
+        chunk_size = self.transport.chunk_size
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            sizes = [len(job.data) for job in batch]
+            try:
+                calls = self.transport.writev([job.data for job in batch], lambda i: batch[i]._finish())
+            except Exception as e:
+                # the failed call isn't counted
+                calls = 0
+                with self._cond:
+                    if self._error is None:
+                        self._error = e
+                for job in batch:
+                    if not job.done():
+                        self.jobs_failed += 1
+                        job._finish(e)
+            written = [size for job, size in zip(batch, sizes) if job.error is None]
+            self.jobs += len(batch)
+            self.batches += 1
+            self.syscalls += calls
+            self.bytes_written += sum(written)
+            self.unbatched_syscalls += sum(max(1, -(-size // chunk_size)) for size in written)
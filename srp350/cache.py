@@ -0,0 +1,137 @@
+"""Content-addressed cache for rasterized images
+
+Entries are keyed on a hash of the image pixels plus the rasterization parameters (center,
+target width, dither mode) and evicted least-recently-used once the cached image data exceeds
+max_bytes. With a path the entries are also stored on disk, so a restarted process can reuse them.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+_HEADER = struct.Struct("<4B")
+
+
+def image_key(image, *params):
+    """Returns the cache key for a pil image object and the given parameters"""
+    h = hashlib.sha256()
+    h.update("{0}|{1}|{2}|{3}".format(image.mode, image.size, image.info.get("transparency"), params).encode())
+    h.update(image.tobytes())
+    if image.mode == "P":
+        h.update(bytes(image.getpalette() or ()))
+    return h.hexdigest()
+
+
+class RasterCache(object):
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, path=None):
+        """max_bytes is the memory budget for cached image data
+        path is an optional directory for persisting entries"""
+        self.max_bytes = max_bytes
+        self.path = path
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries or (self.path is not None and os.path.exists(self._file(key)))
+
+    def stats(self):
+        """Returns the counters as dict"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.size,
+        }
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".raster")
+
+    def get(self, key):
+        """Returns the cached [xL, xH, yL, yH, d] for key or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry)
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._insert(key, entry)
+        return list(entry)
+
+    def put(self, key, value):
+        """Stores the rasterized image value ([xL, xH, yL, yH, d])"""
+        entry = tuple(value[:4]) + (bytes(value[4]),)
+        with self._lock:
+            self._insert(key, entry)
+        if self.path is not None:
+            self._store(key, entry)
+
+    def get_or_create(self, key, create):
+        """Returns the cached value for key, calls create() and caches its result on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = create()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Drops all entries from memory (persisted entries are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _insert(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[4])
+        if len(entry[4]) > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.size += len(entry[4])
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted[4])
+            self.evictions += 1
+
+    def _load(self, key):
+        if self.path is None:
+            return None
+        try:
+            with open(self._file(key), "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        if len(raw) < _HEADER.size:
+            return None
+        return _HEADER.unpack_from(raw) + (raw[_HEADER.size:],)
+
+    def _store(self, key, entry):
+        # write to a temporary file first, so concurrent readers never see partial entries
+        tmp = "{0}.{1}.tmp".format(self._file(key), os.getpid())
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(*entry[:4]))
+            f.write(entry[4])
+        os.replace(tmp, self._file(key))
@@ -0,0 +1,194 @@
+"""Column format bit images for ESC * and GS *
+
+`select_bit_image_mode` (ESC *) and `define_downloaded_bit_image` (GS *) take the image column
+by column, each column top to bottom with the MSB as the topmost dot, while
+`generate_image_data` and `srp350.raster` produce packed rows for GS v 0. This module
+transposes packed rows into columns: with NumPy the whole bitmap is transposed at once
+(unpack, swap axes, pack), without it every 8 x 8 block is transposed with precomputed
+tables, one lookup per row byte.
+
+Bitmaps are given in printer dots (180 DPI). ESC * single density modes print 90 DPI
+horizontally and the 8-dot modes 60 DPI vertically, so their columns and rows are sampled to
+keep the image size: every mode prints stripes of 24 dot lines.
+
+`ColumnEncoder` accepts the rows in pieces and yields every stripe as soon as its rows are
+complete, so graphics generated line by line can be printed while they are being generated:
+
+    encoder = ColumnEncoder(IMAGE_MODE_24DOT_DOUBLE, width_bytes=64)
+    for rows in plot_lines():
+        for nL, nH, d in encoder.feed(rows):
+            printer.select_bit_image_mode(IMAGE_MODE_24DOT_DOUBLE, nL, nH, d)
+            printer.line_feed()
+"""
+
+from .raster import np
+
+IMAGE_MODE_8DOT_SINGLE = 0
+IMAGE_MODE_8DOT_DOUBLE = 1
+IMAGE_MODE_24DOT_SINGLE = 32
+IMAGE_MODE_24DOT_DOUBLE = 33
+
+# mode: (dots per column, columns sampled every n dots, rows sampled every n dots)
+MODES = {
+    IMAGE_MODE_8DOT_SINGLE: (8, 2, 3),
+    IMAGE_MODE_8DOT_DOUBLE: (8, 1, 3),
+    IMAGE_MODE_24DOT_SINGLE: (24, 2, 1),
+    IMAGE_MODE_24DOT_DOUBLE: (24, 1, 1),
+}
+
+# dot lines of paper one stripe covers in every mode
+STRIPE_HEIGHT = 24
+
+
+def _tables():
+    """_TABLES[i][b] is the 8 x 8 block (as 64 bit int, column 0 in the top byte) of row byte b
+    in row i, a block is the OR of the entries of its 8 rows"""
+    tables = []
+    for i in range(8):
+        table = []
+        for b in range(256):
+            block = 0
+            for j in range(8):
+                if b & (0x80 >> j):
+                    block |= (0x80 >> i) << (8 * (7 - j))
+            table.append(block)
+        tables.append(table)
+    return tables
+
+
+_TABLES = _tables()
+
+
+def _even_bits(b):
+    """Returns the bits 7, 5, 3 and 1 (the even columns) of b as a 4 bit number"""
+    return (b >> 4 & 8) | (b >> 3 & 4) | (b >> 2 & 2) | (b >> 1 & 1)
+
+
+_EVEN_HIGH = bytes(_even_bits(b) << 4 for b in range(256))
+_EVEN_LOW = bytes(_even_bits(b) for b in range(256))
+
+
+def _transpose_blocks(rows, width_bytes):
+    """Transposes 8 packed rows (a list of bytes) into width_bytes * 8 column bytes"""
+    t0, t1, t2, t3, t4, t5, t6, t7 = _TABLES
+    r0, r1, r2, r3, r4, r5, r6, r7 = rows
+    out = bytearray()
+    for k in range(width_bytes):
+        block = (t0[r0[k]] | t1[r1[k]] | t2[r2[k]] | t3[r3[k]] |
+                 t4[r4[k]] | t5[r5[k]] | t6[r6[k]] | t7[r7[k]])
+        out += block.to_bytes(8, "big")
+    return out
+
+
+def transpose(width_bytes, height, data, dots=24):
+    """Returns packed rows (width_bytes per row, height rows) as stripes of dots rows (a
+    multiple of 8, the last stripe padded with blank rows): a list of bytes, each the columns
+    of one stripe with dots // 8 bytes per column"""
+    if dots % 8:
+        raise ValueError("stripes must be a multiple of 8 dots high, not {0}".format(dots))
+    stripes = -(-height // dots)
+    padding = bytes((stripes * dots - height) * width_bytes)
+    if np is not None:
+        bits = np.frombuffer(bytes(data[:width_bytes * height]) + padding, dtype=np.uint8)
+        bits = np.unpackbits(bits.reshape(stripes, dots, width_bytes), axis=2)
+        columns = np.packbits(bits.transpose(0, 2, 1), axis=2)
+        return [stripe.tobytes() for stripe in columns]
+    data = bytes(data[:width_bytes * height]) + padding
+    result = []
+    for top in range(0, stripes * dots, dots):
+        # the blocks of one stripe, dots // 8 of them per 8 columns, are interleaved
+        blocks = [_transpose_blocks([data[(y + i) * width_bytes:(y + i + 1) * width_bytes] for i in range(8)],
+                                    width_bytes) for y in range(top, top + dots, 8)]
+        depth = len(blocks)
+        stripe = bytearray(len(blocks[0]) * depth)
+        for n, block in enumerate(blocks):
+            stripe[n::depth] = block
+        result.append(bytes(stripe))
+    return result
+
+
+def _sample(width_bytes, height, data, step_x, step_y):
+    """Returns (width_bytes, height, data) with every step_x-th column and step_y-th row"""
+    if step_y > 1:
+        data = b"".join(data[y * width_bytes:(y + 1) * width_bytes] for y in range(0, height, step_y))
+        height = -(-height // step_y)
+    if step_x > 1:
+        if np is not None:
+            bits = np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8).reshape(height, width_bytes), axis=1)
+            bits = bits[:, ::step_x]
+            width_bytes = -(-bits.shape[1] // 8)
+            data = np.packbits(bits, axis=1).tobytes()
+        else:
+            # the even columns of a pair of bytes form one byte
+            data = bytes(data)
+            half = -(-width_bytes // 2)
+            rows = []
+            for y in range(height):
+                row = data[y * width_bytes:(y + 1) * width_bytes] + bytes(half * 2 - width_bytes)
+                value = (int.from_bytes(row[0::2].translate(_EVEN_HIGH), "big") |
+                         int.from_bytes(row[1::2].translate(_EVEN_LOW), "big"))
+                rows.append(value.to_bytes(half, "big"))
+            width_bytes = half
+            data = b"".join(rows)
+    return width_bytes, height, data
+
+
+def bit_image_data(mode, xL, xH, yL, yH, d):
+    """Converts raster data (as `generate_image_data` returns it) into the stripes of
+    `select_bit_image_mode` in mode, returns a list of (nL, nH, d), one per 24 dot lines"""
+    if mode not in MODES:
+        raise ValueError("unknown bit image mode {0}".format(mode))
+    dots, step_x, step_y = MODES[mode]
+    width_bytes, height, data = _sample(xL + xH * 256, yL + yH * 256, d, step_x, step_y)
+    columns = width_bytes * 8
+    return [(columns % 256, columns // 256, stripe) for stripe in transpose(width_bytes, height, data, dots)]
+
+
+def downloaded_data(xL, xH, yL, yH, d):
+    """Converts raster data into (x, y, d) for `define_downloaded_bit_image`: the whole image
+    is one stripe, x and y are in units of 8 dots"""
+    width_bytes = xL + xH * 256
+    height = yL + yH * 256
+    y = -(-height // 8)
+    return width_bytes, y, transpose(width_bytes, height, d, y * 8)[0]
+
+
+class ColumnEncoder(object):
+
+    def __init__(self, mode, width_bytes):
+        """Encodes packed rows of width_bytes bytes into stripes of mode (an IMAGE_MODE_*)"""
+        if mode not in MODES:
+            raise ValueError("unknown bit image mode {0}".format(mode))
+        self.mode = mode
+        self.width_bytes = width_bytes
+        self.dots, self.step_x, self.step_y = MODES[mode]
+        self.buffer = bytearray()
+        # rows fed so far, decides which rows the sampling keeps
+        self.rows = 0
+
+    def feed(self, data):
+        """Adds packed rows, yields (nL, nH, d) of every completed stripe"""
+        width_bytes = self.width_bytes
+        if len(data) % width_bytes:
+            raise ValueError("row data must be a multiple of {0} bytes".format(width_bytes))
+        for y in range(len(data) // width_bytes):
+            if (self.rows + y) % self.step_y == 0:
+                self.buffer += data[y * width_bytes:(y + 1) * width_bytes]
+        self.rows += len(data) // width_bytes
+        stripe_bytes = self.dots * width_bytes
+        complete = len(self.buffer) // stripe_bytes * stripe_bytes
+        if complete:
+            yield from self._encode(self.buffer[:complete])
+            del self.buffer[:complete]
+
+    def finish(self):
+        """Yields the last stripe, padded with blank rows (if rows are left)"""
+        if self.buffer:
+            yield from self._encode(self.buffer)
+            self.buffer = bytearray()
+
+    def _encode(self, data):
+        width_bytes, height, data = _sample(self.width_bytes, len(data) // self.width_bytes, data, self.step_x, 1)
+        columns = width_bytes * 8
+        for stripe in transpose(width_bytes, height, data, self.dots):
+            yield columns % 256, columns // 256, stripe
@@ -0,0 +1,72 @@
+"""Table of the ESC/POS commands emitted by `SRP350`
+
+COMMANDS maps the command prefix to (mnemonic, method name, number of fixed parameter bytes).
+Commands with variable length data (bit images, barcodes, tab positions, ...) list only
+their fixed parameters, the data length follows from them (see `srp350.decoder`).
+"""
+
+COMMANDS = {
+    b"\x09": ("HT", "horizontal_tab", 0),
+    b"\x0a": ("LF", "line_feed", 0),
+    b"\x0c": ("FF", "print_and_return_to_standard_mode", 0),
+    b"\x0d": ("CR", "carriage_return", 0),
+    b"\x18": ("CAN", "cancel_print_data", 0),
+    b"\x10\x04": ("DLE EOT", "real_time_status_transmission", 1),
+    b"\x10\x05": ("DLE ENQ", "real_time_request", 1),
+    b"\x1b\x0c": ("ESC FF", "print_data_in_page_mode", 0),
+    b"\x1b\x20": ("ESC SP", "set_right_side_character_spacing", 1),
+    b"\x1b\x21": ("ESC !", "select_print_mode", 1),
+    b"\x1b\x24": ("ESC $", "set_absolute_print_position", 2),
+    b"\x1b\x25": ("ESC %", "select_cancel_user_defined_character_set", 1),
+    b"\x1b\x2a": ("ESC *", "select_bit_image_mode", 3),
+    b"\x1b\x2d": ("ESC -", "underline_mode", 1),
+    b"\x1b\x32": ("ESC 2", "select_default_line_spacing", 0),
+    b"\x1b\x33": ("ESC 3", "set_line_spacing", 1),
+    b"\x1b\x3d": ("ESC =", "set_peripheral_device", 1),
+    b"\x1b\x3f": ("ESC ?", "cancel_user_defined_characters", 1),
+    b"\x1b\x40": ("ESC @", "initialize_printer", 0),
+    b"\x1b\x44": ("ESC D", "set_horizontal_tab_position", 0),
+    b"\x1b\x45": ("ESC E", "emphasize_mode", 1),
+    b"\x1b\x47": ("ESC G", "double_strike_mode", 1),
+    b"\x1b\x4a": ("ESC J", "print_and_feed_paper", 1),
+    b"\x1b\x4c": ("ESC L", "select_page_mode", 0),
+    b"\x1b\x4d": ("ESC M", "select_character_font", 1),
+    b"\x1b\x52": ("ESC R", "select_international_charset", 1),
+    b"\x1b\x53": ("ESC S", "select_standard_mode", 0),
+    b"\x1b\x54": ("ESC T", "select_print_direction", 1),
+    b"\x1b\x56": ("ESC V", "clockwise_rotation_mode", 1),
+    b"\x1b\x57": ("ESC W", "set_printing_area", 8),
+    b"\x1b\x5c": ("ESC \\", "set_relative_print_position", 2),
+    b"\x1b\x61": ("ESC a", "select_justification", 1),
+    b"\x1b\x64": ("ESC d", "print_and_feed_lines", 1),
+    b"\x1b\x74": ("ESC t", "select_character_code_table", 1),
+    b"\x1c\x70": ("FS p", "print_nv_bit_image", 2),
+    b"\x1c\x71": ("FS q", "define_nv_bit_image", 1),
+    b"\x1d\x21": ("GS !", "select_character_size", 1),
+    b"\x1d\x24": ("GS $", "set_absolute_vertical_print_position", 2),
+    b"\x1d\x2a": ("GS *", "define_downloaded_bit_image", 2),
+    b"\x1d\x2f": ("GS /", "print_downloaded_bit_image", 1),
+    b"\x1d\x42": ("GS B", "inverse_printing_mode", 1),
+    b"\x1d\x48": ("GS H", "select_hri_printing_position", 1),
+    b"\x1d\x4c": ("GS L", "set_left_margin", 2),
+    b"\x1d\x56": ("GS V", "cut_paper", 1),
+    b"\x1d\x62": ("GS b", "smoothing_mode", 1),
+    b"\x1d\x66": ("GS f", "select_hri_font", 1),
+    b"\x1d\x68": ("GS h", "set_barcode_height", 1),
+    b"\x1d\x6b": ("GS k", "print_barcode", 1),
+    b"\x1d\x76\x30": ("GS v 0", "print_raster_bit_image", 5),
+    b"\x1d\x77": ("GS w", "set_barcode_width", 1),
+}
+
+# command prefixes start with one of these bytes, everything else is printable data
+PREFIX_BYTES = frozenset(prefix[0] for prefix in COMMANDS)
+
+
+def lookup(data, offset=0):
+    """Returns (prefix, mnemonic, method name, number of fixed parameters) of the command at
+    offset or None if data there isn't a known command"""
+    for length in (3, 2, 1):
+        entry = COMMANDS.get(bytes(data[offset:offset + length]))
+        if entry is not None:
+            return (bytes(data[offset:offset + length]),) + entry
+    return None
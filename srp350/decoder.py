@@ -0,0 +1,170 @@
+"""ESC/POS byte stream decoder
+
+Parses the byte stream produced by `SRP350` into `Command` tuples:
+* offset: position of the command in the stream
+* mnemonic: e.g. "ESC E", "GS v 0", "TEXT" for printable data, "UNKNOWN" for unknown bytes
+* name: the `SRP350` method emitting the command (None for TEXT/UNKNOWN)
+* args: tuple of the fixed parameters
+* data: variable length data (text, image data, barcode data, ...) as bytes
+
+`Decoder.feed` accepts the stream in chunks of any size and yields all commands completed
+so far, so captures of any size can be parsed with bounded memory. Printable data is found
+with a single regular expression search per run and bit image data is skipped by length.
+
+    for command in decode(data):
+        print(command.mnemonic, command.args)
+"""
+
+import re
+from collections import namedtuple
+
+from .commands import COMMANDS, PREFIX_BYTES
+
+Command = namedtuple("Command", "offset mnemonic name args data")
+
+_CONTROL = re.compile(b"[" + b"".join(re.escape(bytes((b,))) for b in sorted(PREFIX_BYTES)) + b"]")
+
+
+class _Incomplete(Exception):
+    pass
+
+
+def _u16(lo, hi):
+    return lo + hi * 256
+
+
+class Decoder(object):
+
+    def __init__(self):
+        self.buffer = bytearray()
+        # stream offset of buffer[0]
+        self.offset = 0
+
+    def feed(self, chunk):
+        """Adds chunk to the stream, yields the completed commands"""
+        self.buffer += chunk
+        buf = self.buffer
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            try:
+                command, length = self._parse(buf, pos, end)
+            except _Incomplete:
+                break
+            yield command
+            pos += length
+        del buf[:pos]
+        self.offset += pos
+
+    def finish(self):
+        """Yields the remaining incomplete data as UNKNOWN command (if any)"""
+        if self.buffer:
+            yield Command(self.offset, "UNKNOWN", None, (), bytes(self.buffer))
+            self.offset += len(self.buffer)
+            self.buffer = bytearray()
+
+    def _need(self, end, pos, n):
+        if pos + n > end:
+            raise _Incomplete()
+
+    def _parse(self, buf, pos, end):
+        offset = self.offset + pos
+        first = buf[pos]
+        if first not in PREFIX_BYTES:
+            match = _CONTROL.search(buf, pos)
+            stop = match.start() if match else end
+            return Command(offset, "TEXT", None, (), bytes(buf[pos:stop])), stop - pos
+
+        entry = None
+        prefix = None
+        for length in (3, 2, 1):
+            if pos + length <= end:
+                entry = COMMANDS.get(bytes(buf[pos:pos + length]))
+                if entry is not None:
+                    prefix = length
+                    break
+        if entry is None:
+            if first in (0x1B, 0x1C, 0x1D, 0x10) and pos + 2 > end:
+                raise _Incomplete()
+            if first == 0x1D and buf[pos + 1] == 0x28:
+                # GS ( fn pL pH ... (2D symbols and other extended functions)
+                self._need(end, pos, 5)
+                n = _u16(buf[pos + 3], buf[pos + 4])
+                self._need(end, pos, 5 + n)
+                return Command(offset, "GS (" + chr(buf[pos + 2]), None, (buf[pos + 2],),
+                               bytes(buf[pos + 5:pos + 5 + n])), 5 + n
+            if first == 0x1D and buf[pos + 1] == 0x76:
+                self._need(end, pos, 3)
+            n = 2 if first in (0x1B, 0x1C, 0x1D, 0x10) else 1
+            return Command(offset, "UNKNOWN", None, (), bytes(buf[pos:pos + n])), n
+
+        mnemonic, name, nargs = entry
+        start = pos + prefix
+        self._need(end, start, nargs)
+        args = tuple(buf[start:start + nargs])
+        data_start = start + nargs
+        n = self._data_length(mnemonic, args, buf, data_start, end)
+        if mnemonic == "GS V" and args[0] in (65, 66):
+            # GS V m n: feed and cut modes carry n
+            self._need(end, data_start, 1)
+            args = args + (buf[data_start],)
+            data_start += 1
+        self._need(end, data_start, n)
+        data = bytes(buf[data_start:data_start + n]) if n else b""
+        return Command(offset, mnemonic, name, args, data), data_start + n - pos
+
+    def _data_length(self, mnemonic, args, buf, start, end):
+        """Returns the length of the variable data following the fixed parameters"""
+        if mnemonic == "GS v 0":
+            return _u16(args[1], args[2]) * _u16(args[3], args[4])
+        if mnemonic == "ESC *":
+            return _u16(args[1], args[2]) * (3 if args[0] in (32, 33) else 1)
+        if mnemonic == "GS *":
+            return args[0] * args[1] * 8
+        if mnemonic == "GS k":
+            if args[0] <= 6:
+                # data up to and including NUL
+                i = buf.find(b"\x00", start)
+                if i < 0:
+                    raise _Incomplete()
+                return i - start + 1
+            self._need(end, start, 1)
+            return 1 + buf[start]
+        if mnemonic == "ESC D":
+            i = buf.find(b"\x00", start)
+            if i < 0:
+                raise _Incomplete()
+            return i - start + 1
+        if mnemonic == "FS q":
+            pos = start
+            for _ in range(args[0]):
+                self._need(end, pos, 4)
+                pos += 4 + _u16(buf[pos], buf[pos + 1]) * _u16(buf[pos + 2], buf[pos + 3]) * 8
+            return pos - start
+        return 0
+
+
+def decode(data):
+    """Decodes a complete byte stream, returns a list of `Command`"""
+    decoder = Decoder()
+    commands = list(decoder.feed(data))
+    commands.extend(decoder.finish())
+    return commands
+
+
+def decode_stream(file, chunk_size=1024 * 1024):
+    """Decodes a binary file object chunk by chunk, yields `Command`"""
+    decoder = Decoder()
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        yield from decoder.feed(chunk)
+    yield from decoder.finish()
+
+
+def barcode_data(command):
+    """Returns the barcode data (without NUL / length byte) of a GS k command"""
+    if command.args[0] <= 6:
+        return command.data[:-1]
+    return command.data[1:]
@@ -0,0 +1,207 @@
+"""Shared device access for many threads and processes
+
+`DeviceManager` keeps the device file of every port open (one descriptor per port and
+process) and hands out short-lived `SRP350` handles for it. A handle holds the port for its
+whole job: other threads of the process wait for a thread lock and other processes (e.g.
+gunicorn workers, each with its own manager) for an `fcntl.flock` advisory lock on the
+device, so jobs never interleave and no job pays for opening the device.
+
+Before a descriptor is handed out it's checked against the device node: if the printer was
+unplugged or re-enumerated (the node at port is another one or gone), or the process was
+forked since it was opened, the descriptor is closed and the port opened again. A job failing
+because the device went away drops the descriptor as well, the next job reopens it.
+Descriptors unused for max_idle seconds are closed.
+
+    manager = DeviceManager()
+
+    def handle_request(order):
+        with manager.printer("/dev/usb/lp0") as printer:
+            printer.println(order.text)
+            printer.cut_paper(CUT_MODE_FEED_AND_CUT, 40)
+        # sent and unlocked here
+"""
+
+import errno
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from . import SRP350
+
+# seconds an unused descriptor stays open
+DEFAULT_MAX_IDLE = 300.0
+# seconds between attempts to get the lock of a port held by another process
+LOCK_POLL_INTERVAL = 0.01
+
+# errors of a device which went away (unplugged, re-enumerated, powered off)
+DEVICE_GONE = (errno.ENODEV, errno.ENXIO, errno.EIO, errno.ENOENT, errno.EBADF, errno.ESHUTDOWN)
+
+
+def _identity(st):
+    return st.st_dev, st.st_ino, st.st_rdev
+
+
+class _Port(object):
+
+    def __init__(self, port):
+        self.port = port
+        # held by the thread which has the port, the flock only excludes other processes
+        self.lock = threading.Lock()
+        self.fd = None
+        self.identity = None
+        self.pid = None
+        self.last_used = 0.0
+
+        self.opened = 0
+        self.jobs = 0
+        self.lock_wait = 0.0
+
+    def valid(self):
+        """Returns True if fd is still the open device node at port in this process"""
+        if self.fd is None or self.pid != os.getpid():
+            return False
+        try:
+            return _identity(os.fstat(self.fd)) == self.identity == _identity(os.stat(self.port))
+        except OSError:
+            return False
+
+    def open(self):
+        self.close()
+        fd = os.open(self.port, os.O_RDWR | os.O_NONBLOCK)
+        self.fd, self.identity, self.pid = fd, _identity(os.fstat(fd)), os.getpid()
+        self.opened += 1
+
+    def close(self):
+        fd, self.fd = self.fd, None
+        # closing the copy inherited from a parent process leaves the parent's lock alone
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class DeviceManager(object):
+
+    def __init__(self, max_idle=DEFAULT_MAX_IDLE, lock_timeout=None, **options):
+        """max_idle is the time in seconds after which unused descriptors are closed,
+        lock_timeout the maximum time in seconds to wait for a port (None = forever)
+        options are passed to every `SRP350` handle (chunk_size, timeout, optimize, ...)"""
+        self.max_idle = max_idle
+        self.lock_timeout = lock_timeout
+        self.options = options
+
+        self._ports = {}
+        self._lock = threading.Lock()
+
+    def _port(self, port):
+        with self._lock:
+            entry = self._ports.get(port)
+            if entry is None:
+                entry = self._ports[port] = _Port(port)
+            return entry
+
+    def acquire(self, port, timeout=None):
+        """Locks port for this thread and all other processes, returns its open descriptor
+        timeout defaults to lock_timeout, raises TimeoutError if the port stays locked."""
+        timeout = self.lock_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        entry = self._port(port)
+        start = time.monotonic()
+        if not entry.lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise TimeoutError("{0} is locked by another thread".format(port))
+        try:
+            while True:
+                if not entry.valid():
+                    entry.open()
+                try:
+                    fcntl.flock(entry.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError("{0} is locked by another process".format(port))
+                    time.sleep(LOCK_POLL_INTERVAL)
+                    continue
+                # the device may have been replaced while waiting for the lock
+                if entry.valid():
+                    break
+                fcntl.flock(entry.fd, fcntl.LOCK_UN)
+        except BaseException:
+            entry.lock.release()
+            raise
+        entry.lock_wait += time.monotonic() - start
+        entry.jobs += 1
+        return entry.fd
+
+    def release(self, port, broken=False):
+        """Unlocks port, with broken=True its descriptor is closed (the next job reopens it)"""
+        entry = self._port(port)
+        try:
+            if broken:
+                entry.close()
+            elif entry.fd is not None:
+                fcntl.flock(entry.fd, fcntl.LOCK_UN)
+                entry.last_used = time.monotonic()
+        finally:
+            entry.lock.release()
+        self._close_idle()
+
+    @contextmanager
+    def printer(self, port, timeout=None, **options):
+        """Returns a context manager with a `SRP350` handle on the pooled descriptor of port
+        The port is locked until the block ends, then the remaining buffer is sent and the port
+        released. options override the options of the manager for this handle."""
+        fd = self.acquire(port, timeout)
+        broken = False
+        printer = None
+        try:
+            printer = SRP350(port, device=fd, **dict(self.options, **options))
+            yield printer
+            if printer.data:
+                printer.send(block=True)
+            # waits for buffers sent with block=False
+            printer.close()
+        except BaseException as e:
+            broken = isinstance(e, OSError) and e.errno in DEVICE_GONE
+            if printer is not None:
+                try:
+                    printer.close()
+                except OSError:
+                    # whatever state the device is in, the next job starts with a new descriptor
+                    broken = True
+            raise
+        finally:
+            self.release(port, broken)
+
+    def _close_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            entries = list(self._ports.values())
+        for entry in entries:
+            if entry.fd is not None and now - entry.last_used > self.max_idle and entry.lock.acquire(False):
+                try:
+                    if entry.fd is not None and now - entry.last_used > self.max_idle:
+                        entry.close()
+                finally:
+                    entry.lock.release()
+
+    def stats(self):
+        """Returns per port: jobs, times opened, total seconds waited for the lock, open or not"""
+        with self._lock:
+            return {port: {"jobs": e.jobs, "opened": e.opened, "lock_wait": e.lock_wait, "open": e.fd is not None}
+                    for port, e in self._ports.items()}
+
+    def close(self):
+        """Closes all descriptors (waits for running jobs)"""
+        with self._lock:
+            entries = list(self._ports.values())
+        for entry in entries:
+            with entry.lock:
+                entry.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,256 @@
+"""Lazy receipt documents
+
+A `Document` is a list of elements (paragraphs, tables, images, barcodes, QR codes, feeds,
+cuts and raw bytes) which are turned into commands only while the document is serialized.
+`chunks` is a generator yielding the command bytes in chunks of about chunk_size bytes, and
+`SRP350.stream` writes them while the next ones are generated, so the printer starts with the
+first line while later sections are still being built. Nothing is kept after it's yielded.
+
+Sections can be lazy: `extend` takes any iterable of elements (e.g. a generator over a
+database cursor), table rows can be a generator, and images can be callables which render the
+image only when the serialization reaches them. Images are sent in bands (blank rows as feeds),
+so even the raster data of a tall graph doesn't end up in one chunk. Such a document can be
+serialized once.
+
+    def report_lines(cursor):
+        for row in cursor:
+            yield Paragraph("{0:<30}{1:>12.2f}".format(row.name, row.total))
+
+    doc = Document()
+    doc.paragraph("END OF DAY", bold=True, align=1, width_mul=2, height_mul=2)
+    doc.extend(report_lines(cursor))
+    doc.image(lambda: plot_sales(cursor.day))
+    doc.cut()
+    printer.stream(doc.chunks(printer))
+"""
+
+from . import SRP350, BIT_IMAGE_MODE_NORMAL, CUT_MODE_FEED_AND_CUT
+
+DEFAULT_CHUNK_SIZE = 16 * 1024
+# raster rows per GS v 0 command of images
+DEFAULT_BAND_HEIGHT = 128
+
+
+def _walk(items):
+    for item in items:
+        if isinstance(item, Element):
+            yield item
+        elif isinstance(item, (str, bytes, bytearray)):
+            raise TypeError("documents contain elements, not {0}".format(type(item).__name__))
+        else:
+            # section: an iterable of elements
+            yield from _walk(item)
+
+
+def _setting(printer, name, value, method):
+    """Sends a setting (name as in `srp350.state`) unless the printer has it already, so
+    consecutive elements with the same style don't repeat their setting commands"""
+    if printer.state.get(name) != value:
+        method(value)
+
+
+class Element(object):
+
+    def emit(self, printer):
+        """Writes the commands of the element to printer (its command methods), yields whenever
+        the buffer may be taken"""
+        raise NotImplementedError()
+
+
+class Paragraph(Element):
+
+    def __init__(self, text, bold=False, underline=0, align=0, width_mul=1, height_mul=1, font=0):
+        """align is 0 (left), 1 (center) or 2 (right), width_mul and height_mul 1..8"""
+        self.text = text
+        self.bold = bold
+        self.underline = underline
+        self.align = align
+        self.size = (width_mul - 1) << 4 | (height_mul - 1)
+        self.font = font
+
+    def emit(self, printer):
+        _setting(printer, "font", self.font, printer.select_character_font)
+        _setting(printer, "size", self.size, printer.select_character_size)
+        _setting(printer, "emphasize", int(self.bold), printer.emphasize_mode)
+        _setting(printer, "underline", self.underline, printer.underline_mode)
+        _setting(printer, "justification", self.align, printer.select_justification)
+        printer.println(self.text)
+        yield
+
+
+class Table(Element):
+
+    def __init__(self, rows, widths, align=None, separator=" "):
+        """rows is an iterable (may be a generator) of rows of cell values, widths the column
+        widths in characters, align the format alignment ("<", ">" or "^") of each column"""
+        self.rows = rows
+        self.widths = widths
+        self.align = align or ["<"] * len(widths)
+        self.separator = separator
+        self._formats = ["{{0:{0}{1}.{1}}}".format(a, w) for a, w in zip(self.align, widths)]
+
+    def format(self, row):
+        """Returns the line of a row"""
+        return self.separator.join(f.format(str(value)) for f, value in zip(self._formats, row)).rstrip()
+
+    def emit(self, printer):
+        _setting(printer, "justification", 0, printer.select_justification)
+        for row in self.rows:
+            printer.println(self.format(row))
+            yield
+
+
+class Picture(Element):
+
+    def __init__(self, image, center=True, dither=None, band_height=DEFAULT_BAND_HEIGHT):
+        """image is a pil image or a callable returning one (rendered when it's serialized)"""
+        self.image = image
+        self.center = center
+        self.dither = dither
+        self.band_height = band_height
+
+    def emit(self, printer):
+        image = self.image() if callable(self.image) else self.image
+        xL, xH, yL, yH, d = printer.generate_image_data(image, center=self.center, dither=self.dither)
+        del image
+        width = xL + xH * 256
+        height = yL + yH * 256
+        view = memoryview(d)
+        for top in range(0, height, self.band_height):
+            rows = min(self.band_height, height - top)
+            printer.print_raster_bands(BIT_IMAGE_MODE_NORMAL, xL, xH, rows % 256, rows // 256,
+                                       view[top * width:(top + rows) * width])
+            yield
+
+
+class Barcode(Element):
+
+    def __init__(self, system, data, height=None, module_width=None, hri_position=None):
+        self.system = system
+        self.data = data
+        self.height = height
+        self.module_width = module_width
+        self.hri_position = hri_position
+
+    def emit(self, printer):
+        if self.height is not None:
+            _setting(printer, "barcode_height", self.height, printer.set_barcode_height)
+        if self.module_width is not None:
+            _setting(printer, "barcode_width", self.module_width, printer.set_barcode_width)
+        if self.hri_position is not None:
+            _setting(printer, "hri_position", self.hri_position, printer.select_hri_printing_position)
+        justification = printer.state.get("justification")
+        _setting(printer, "justification", 1, printer.select_justification)
+        printer.print_barcode(None, self.system, self.data)
+        # centered for the barcode only, raw elements and later output keep their justification
+        _setting(printer, "justification", 0 if justification is None else justification,
+                 printer.select_justification)
+        yield
+
+
+class QRCode(Element):
+
+    def __init__(self, data, scale=4, **options):
+        """options are passed to `SRP350.print_qr_code`"""
+        self.data = data
+        self.scale = scale
+        self.options = options
+
+    def emit(self, printer):
+        printer.print_qr_code(self.data, self.scale, **self.options)
+        yield
+
+
+class Feed(Element):
+
+    def __init__(self, lines=1):
+        self.lines = lines
+
+    def emit(self, printer):
+        printer.print_and_feed_lines(self.lines)
+        yield
+
+
+class Cut(Element):
+
+    def __init__(self, feed=0):
+        """feed is the paper feed before the cut in vertical motion units"""
+        self.feed = feed
+
+    def emit(self, printer):
+        printer.cut_paper(CUT_MODE_FEED_AND_CUT, self.feed)
+        yield
+
+
+class Raw(Element):
+
+    def __init__(self, data):
+        """data are command bytes, e.g. a `CompiledTemplate` rendering"""
+        self.data = data
+
+    def emit(self, printer):
+        printer._handle_payload(self.data)
+        yield
+
+
+class Document(object):
+
+    def __init__(self, elements=()):
+        # elements and iterables of elements, flattened while serializing
+        self._parts = [elements]
+
+    def add(self, element):
+        """Appends an element, returns it"""
+        self._parts.append((element,))
+        return element
+
+    def extend(self, elements):
+        """Appends an iterable of elements, which is consumed only while serializing"""
+        self._parts.append(elements)
+
+    def paragraph(self, text, **options):
+        return self.add(Paragraph(text, **options))
+
+    def table(self, rows, widths, align=None, separator=" "):
+        return self.add(Table(rows, widths, align, separator))
+
+    def image(self, image, center=True, dither=None):
+        return self.add(Picture(image, center, dither))
+
+    def barcode(self, system, data, **options):
+        return self.add(Barcode(system, data, **options))
+
+    def qr_code(self, data, scale=4, **options):
+        return self.add(QRCode(data, scale, **options))
+
+    def feed(self, lines=1):
+        return self.add(Feed(lines))
+
+    def cut(self, feed=0):
+        return self.add(Cut(feed))
+
+    def raw(self, data):
+        return self.add(Raw(data))
+
+    def elements(self):
+        """Yields the elements, lazy sections are consumed on the way"""
+        return _walk(self._parts)
+
+    def chunks(self, printer=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yields the command bytes of the document in chunks of about chunk_size bytes
+        printer builds the commands (its settings, code page, optimizer and raster cache apply),
+        its buffer is taken for every chunk. Without printer a new `SRP350` without device is used."""
+        if printer is None:
+            printer = SRP350(None)
+        for element in self.elements():
+            for _ in element.emit(printer):
+                if len(printer.data) >= chunk_size:
+                    yield printer.detach()
+        data = printer.detach()
+        if data:
+            yield data
+
+    def serialize(self, printer=None):
+        """Returns the whole document as bytes (builds everything in memory, for small documents
+        and tests)"""
+        return b"".join(self.chunks(printer))
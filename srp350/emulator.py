@@ -0,0 +1,255 @@
+"""Virtual printer for load tests
+
+`Emulator` opens a pseudo terminal and consumes the ESC/POS stream written to its slave
+path like a printer: bytes are received at the simulated line speed into a receive buffer of
+buffer_size bytes and printed at the simulated print speed (mm/s at 180 DPI). When the receive
+buffer is full the emulator stops reading, so writers see the same backpressure as with a
+real device. DLE EOT n is answered when received, from the conditions set with
+`set_conditions`. While the conditions take the printer offline nothing is printed, but
+reading continues (without buffer limit) so status queries are still answered.
+
+    with Emulator(speed=150) as emulator:
+        printer = SRP350(emulator.path)
+        printer.println("Hello")
+        printer.send()
+        emulator.wait_idle()
+        print(emulator.stats())
+
+A FIFO can be used instead of the pty (fifo=path). Status queries can't be answered through
+a FIFO, they are counted only.
+
+    python -m srp350.emulator --speed 150 --baudrate 115200
+"""
+
+import array
+import errno
+import fcntl
+import os
+import select
+import termios
+import threading
+import time
+import tty
+from collections import deque
+
+from . import status
+from .decoder import Decoder
+from .estimate import PaperModel, DPI, MM_PER_DOT, DEFAULT_SPEED
+
+DEFAULT_BUFFER_SIZE = 4096
+READ_SIZE = 4096
+
+
+class Emulator(object):
+
+    def __init__(self, speed=DEFAULT_SPEED, baudrate=None, buffer_size=DEFAULT_BUFFER_SIZE, fifo=None):
+        """speed is the print speed in mm/s (None: unlimited)
+        baudrate is the simulated line speed in bit/s, 10 bits per byte (None: unlimited)
+        buffer_size is the receive buffer size in bytes
+        fifo is a path for a FIFO to use instead of a pty"""
+        self.speed = speed
+        self.baudrate = baudrate
+        self.buffer_size = buffer_size
+        self.conditions = dict.fromkeys(status.CONDITIONS, False)
+
+        self.fifo = fifo
+        if fifo is None:
+            self._master, self._slave = os.openpty()
+            tty.setraw(self._slave)
+            self.path = os.ttyname(self._slave)
+        else:
+            os.mkfifo(fifo)
+            self._master = os.open(fifo, os.O_RDWR)
+            self._slave = None
+            self.path = fifo
+
+        self.bytes_received = 0
+        self.commands = 0
+        self.status_queries = 0
+        self.dot_lines = 0
+        self.busy_time = 0.0
+        self.started = None
+
+        self._model = PaperModel()
+        self._queue = deque()
+        self._queued_bytes = 0
+        self._printing = False
+        self._reading = False
+        self._cond = threading.Condition()
+        self._running = False
+        self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self._running = True
+        self.started = time.monotonic()
+        self._threads = [
+            threading.Thread(target=self._receive, name="srp350-emulator-rx", daemon=True),
+            threading.Thread(target=self._print, name="srp350-emulator-print", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        """Stops the emulator, closes the pty / removes the FIFO"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+        if self.fifo is not None and os.path.exists(self.fifo):
+            os.unlink(self.fifo)
+
+    def set_conditions(self, **conditions):
+        """Sets printer conditions, e.g. set_conditions(paper_out=True), see `srp350.status`"""
+        for name in conditions:
+            if name not in self.conditions:
+                raise ValueError("Unknown condition {0}".format(name))
+        with self._cond:
+            self.conditions.update(conditions)
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Waits until everything received has been printed, returns False on timeout
+        Data still buffered by the writer isn't seen, flush it first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._printing or self._reading or self._unread():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(0.01 if remaining is None else min(remaining, 0.01))
+        return True
+
+    def _unread(self):
+        """Returns the number of bytes waiting in the pty / FIFO"""
+        count = array.array("i", [0])
+        fcntl.ioctl(self._master, termios.FIONREAD, count)
+        return count[0]
+
+    def stats(self):
+        """Returns the counters as dict"""
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return {
+            "bytes": self.bytes_received,
+            "commands": self.commands,
+            "status_queries": self.status_queries,
+            "dot_lines": self.dot_lines,
+            "paper_mm": self.dot_lines * MM_PER_DOT,
+            "busy_time": self.busy_time,
+            "elapsed": elapsed,
+            "bytes_per_second": self.bytes_received / elapsed if elapsed else 0.0,
+            "buffered": self._queued_bytes,
+        }
+
+    def _reply(self, value):
+        if self.fifo is None:
+            os.write(self._master, bytes((value,)))
+
+    def _receive(self):
+        decoder = Decoder()
+        poller = select.poll()
+        poller.register(self._master, select.POLLIN)
+        line_time = 10.0 / self.baudrate if self.baudrate else 0.0
+        next_read = time.monotonic()
+        while self._running:
+            if not poller.poll(100):
+                continue
+            self._reading = True
+            try:
+                chunk = os.read(self._master, READ_SIZE)
+            except OSError as e:
+                self._reading = False
+                if e.errno in (errno.EIO, errno.EAGAIN):
+                    time.sleep(0.01)
+                    continue
+                raise
+            self.bytes_received += len(chunk)
+            if line_time:
+                # the chunk arrives after its transmission time
+                next_read = max(next_read, time.monotonic()) + len(chunk) * line_time
+                delay = next_read - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            for command in decoder.feed(chunk):
+                self.commands += 1
+                if command.mnemonic == "DLE EOT":
+                    self.status_queries += 1
+                    with self._cond:
+                        value = status.encode(command.args[0], self.conditions) if command.args[0] in status.BITS else None
+                    if value is not None:
+                        self._reply(value)
+                    continue
+                if command.mnemonic == "DLE ENQ":
+                    continue
+                self._enqueue(command)
+            self._reading = False
+
+    def _enqueue(self, command):
+        size = len(command.data) + len(command.args) + 1
+        with self._cond:
+            # a full receive buffer stops reading, the pty fills and the writer blocks
+            while (self._running and self._queued_bytes and self._queued_bytes + size > self.buffer_size
+                   and not status.is_offline(self.conditions)):
+                self._cond.wait()
+            self._queue.append((command, size))
+            self._queued_bytes += size
+            self._cond.notify_all()
+
+    def _print(self):
+        dot_time = 1.0 / (self.speed * DPI / 25.4) if self.speed else 0.0
+        while True:
+            with self._cond:
+                while self._running and (not self._queue or status.is_offline(self.conditions)):
+                    self._cond.wait()
+                if not self._running:
+                    return
+                command, size = self._queue.popleft()
+                self._printing = True
+            dots = self._model.advance(command)
+            if dots and dot_time:
+                start = time.monotonic()
+                time.sleep(dots * dot_time)
+                self.busy_time += time.monotonic() - start
+            with self._cond:
+                self.dot_lines += dots
+                self._queued_bytes -= size
+                self._printing = False
+                self._cond.notify_all()
+
+
+def main():
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Virtual SRP350 printer")
+    parser.add_argument("--speed", type=float, default=DEFAULT_SPEED, help="print speed in mm/s, 0 for unlimited")
+    parser.add_argument("--baudrate", type=int, default=0, help="line speed in bit/s, 0 for unlimited")
+    parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE)
+    parser.add_argument("--fifo", help="use a FIFO at this path instead of a pty")
+    parser.add_argument("--interval", type=float, default=5.0, help="seconds between statistics")
+    args = parser.parse_args()
+
+    emulator = Emulator(args.speed or None, args.baudrate or None, args.buffer_size, args.fifo)
+    print(emulator.path, flush=True)
+    with emulator:
+        try:
+            while True:
+                time.sleep(args.interval)
+                print(emulator.stats(), flush=True)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""Text encoding with precomputed per-code-page translation tables
+
+For every combination of code page (ESC t) and international character set (ESC R) a
+translation table from unicode characters to printer bytes is built once. Text is then
+encoded in one pass with `str.translate` and `str.encode("latin-1")`, which both run in C.
+
+Characters the code page can't print are handled according to errors:
+* "strict": raise UnicodeEncodeError
+* "replace": print the replacement character
+* "transliterate": print a similar looking text (é -> e, € -> EUR, “ -> "), else the replacement
+The fallback for a character is computed once and cached in the table.
+
+`Encoder.segments` can additionally switch to another code page in the middle of the text,
+if the current one doesn't contain a character at all and the switch (ESC t there and back)
+is shorter than the fallback.
+"""
+
+import unicodedata
+from functools import lru_cache
+
+CODEPAGE_PC437 = 0
+CODEPAGE_KATAKANA = 1
+CODEPAGE_PC850 = 2
+CODEPAGE_PC860 = 3
+CODEPAGE_PC863 = 4
+CODEPAGE_PC865 = 5
+CODEPAGE_WPC1252 = 16
+CODEPAGE_PC866 = 17
+CODEPAGE_PC852 = 18
+CODEPAGE_PC858 = 19
+
+# python codec of every code page (ESC t n) which has one
+CODECS = {
+    CODEPAGE_PC437: "cp437",
+    CODEPAGE_PC850: "cp850",
+    CODEPAGE_PC860: "cp860",
+    CODEPAGE_PC863: "cp863",
+    CODEPAGE_PC865: "cp865",
+    CODEPAGE_WPC1252: "cp1252",
+    CODEPAGE_PC866: "cp866",
+    CODEPAGE_PC852: "cp852",
+    CODEPAGE_PC858: "cp858",
+}
+
+# characters replacing the ASCII codes 0x23 0x24 0x40 0x5B 0x5C 0x5D 0x5E 0x60 0x7B 0x7C 0x7D 0x7E
+# for the international character sets (ESC R n)
+_INTERNATIONAL_CODES = (0x23, 0x24, 0x40, 0x5B, 0x5C, 0x5D, 0x5E, 0x60, 0x7B, 0x7C, 0x7D, 0x7E)
+INTERNATIONAL_CHARSETS = {
+    0: "#$@[\\]^`{|}~",         # USA
+    1: "#$à°ç§^`éùè¨",          # France
+    2: "#$§ÄÖÜ^`äöüß",          # Germany
+    3: "£$@[\\]^`{|}~",         # UK
+    4: "#$@ÆØÅ^`æøå~",          # Denmark I
+    5: "#¤ÉÄÖÅÜéäöåü",          # Sweden
+    6: "#$@°\\é^ùàòèì",         # Italy
+    7: "₧$@¡Ñ¿^`¨ñ}~",          # Spain
+    8: "#¤ÉÆØÅÜéæøåü",          # Norway
+    10: "#$ÉÆØÅÜéæøåü",         # Denmark II
+}
+
+TRANSLITERATIONS = {
+    "€": "EUR", "₧": "Pts", "™": "TM", "©": "(C)", "®": "(R)",
+    "“": '"', "”": '"', "„": '"', "«": '"', "»": '"',
+    "‘": "'", "’": "'", "‚": "'", "′": "'", "″": '"',
+    "–": "-", "—": "-", "‐": "-", "−": "-", "…": "...", "•": "*", "·": ".",
+    "\u00a0": " ", "\u2009": " ", "\u202f": " ", "ß": "ss", "Æ": "AE", "æ": "ae", "Ø": "O", "ø": "o",
+    "Œ": "OE", "œ": "oe", "Ł": "L", "ł": "l", "Đ": "D", "đ": "d",
+}
+
+ERRORS = ("strict", "replace", "transliterate")
+
+# bytes of a code page switch (ESC t n)
+SWITCH_LENGTH = 3
+
+
+@lru_cache(maxsize=None)
+def native_table(codepage, charset=0):
+    """Returns {unicode ordinal: byte} of all characters the printer can print natively
+    Code pages without a known encoding (e.g. Katakana) are assumed to have ASCII in their
+    lower half, everything else gets the fallback of errors."""
+    codec = CODECS.get(codepage)
+    table = {}
+    if codec is None:
+        codec = "ascii"
+    for b in range(256):
+        try:
+            char = bytes((b,)).decode(codec)
+        except UnicodeDecodeError:
+            continue
+        table.setdefault(ord(char), b)
+    if charset:
+        chars = INTERNATIONAL_CHARSETS.get(charset)
+        if chars is None:
+            raise ValueError("unknown international character set {0}".format(charset))
+        for code, ascii_char, char in zip(_INTERNATIONAL_CODES, INTERNATIONAL_CHARSETS[0], chars):
+            if table.get(ord(ascii_char)) == code:
+                del table[ord(ascii_char)]
+            table[ord(char)] = code
+    return table
+
+
+class _Table(dict):
+    """Translation table (ordinal -> str of latin-1 characters standing for bytes) which
+    computes and caches fallbacks for unknown characters"""
+
+    def __init__(self, native, errors, replacement):
+        super().__init__((k, chr(v)) for k, v in native.items())
+        self.native = native
+        self.errors = errors
+        self.replacement = replacement
+
+    def __missing__(self, key):
+        char = chr(key)
+        if self.errors == "strict":
+            raise UnicodeEncodeError("srp350", char, 0, 1, "character not in code page")
+        result = None
+        if self.errors == "transliterate":
+            result = self._transliterate(char)
+        if result is None:
+            result = "".join(chr(self.native[ord(c)]) for c in self.replacement if ord(c) in self.native)
+        self[key] = result
+        return result
+
+    def _transliterate(self, char):
+        text = TRANSLITERATIONS.get(char)
+        if text is None:
+            text = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+        if not text or text == char or any(ord(c) not in self.native for c in text):
+            return None
+        return "".join(chr(self.native[ord(c)]) for c in text)
+
+
+@lru_cache(maxsize=None)
+def get_encoder(codepage=CODEPAGE_PC437, charset=0, errors="transliterate", replacement="?"):
+    """Returns the (shared) `Encoder` for the given settings"""
+    return Encoder(codepage, charset, errors, replacement)
+
+
+class Encoder(object):
+
+    def __init__(self, codepage=CODEPAGE_PC437, charset=0, errors="transliterate", replacement="?"):
+        if errors not in ERRORS:
+            raise ValueError("errors must be one of {0}".format(", ".join(ERRORS)))
+        self.codepage = codepage
+        self.charset = charset
+        self.errors = errors
+        self.replacement = replacement
+
+        self.native = native_table(codepage, charset)
+        self.table = _Table(self.native, errors, replacement)
+
+    def encode(self, text):
+        """Returns text encoded for the printer"""
+        return text.translate(self.table).encode("latin-1")
+
+    def can_encode(self, char):
+        """True if char can be printed without fallback"""
+        return ord(char) in self.native
+
+    def segments(self, text, codepages=None):
+        """Encodes text, switching to other code pages for characters the current one lacks
+        Returns a list of (codepage, bytes).
+        codepages is the list of code pages to consider (default: all with a known encoding).
+        A switch is only made where it's shorter than the fallback: the run of text the other
+        code page prints costs its bytes plus ESC t (and ESC t back unless the text ends with
+        the run), the current code page the bytes of its replacements and transliterations.
+        With errors="strict" there is no fallback, so every character another code page has
+        switches."""
+        native = self.native
+        if all(ord(c) in native for c in set(text)):
+            return [(self.codepage, self.encode(text))]
+
+        candidates = [cp for cp in (codepages or CODECS) if cp in CODECS]
+        encoder = self
+        result = []
+        start = 0
+        i = 0
+        while i < len(text):
+            if ord(text[i]) in encoder.native:
+                i += 1
+                continue
+            best = None
+            for cp in candidates:
+                table = native_table(cp, self.charset)
+                if ord(text[i]) not in table:
+                    continue
+                end = i + 1
+                while end < len(text) and ord(text[end]) in table:
+                    end += 1
+                cost = SWITCH_LENGTH * (2 if end < len(text) else 1) + end - i
+                if best is None or cost < best[0]:
+                    best = (cost, cp, end)
+            if best is None:
+                # no code page has it, use the fallback of the current one
+                i += 1
+                continue
+            cost, cp, end = best
+            fallback = encoder.fallback_length(text[i:end])
+            if fallback is not None and fallback <= cost:
+                i = end
+                continue
+            if i > start:
+                result.append((encoder.codepage, encoder.encode(text[start:i])))
+            encoder = get_encoder(cp, self.charset, self.errors, self.replacement)
+            start = i
+            i = end
+        result.append((encoder.codepage, encoder.encode(text[start:])))
+        return result
+
+    def fallback_length(self, text):
+        """Returns the length of text encoded with fallbacks, None if errors is "strict" and text
+        has characters the code page lacks"""
+        try:
+            return len(self.encode(text))
+        except UnicodeEncodeError:
+            return None
@@ -0,0 +1,223 @@
+"""Paper feed model
+
+`PaperModel` follows the decoded command stream (see `srp350.decoder`) and returns the number
+of dot lines (1/180 inch) each command advances the paper. It tracks only what influences the
+feed: font and character height, line spacing, barcode height and HRI, bit image sizes and
+page mode.
+
+    model = PaperModel()
+    dots = sum(model.advance(command) for command in decode(data))
+    mm = dots * MM_PER_DOT
+
+`estimate` builds on it and accounts a whole job: bytes by command category, dot lines of
+bit images, paper length and the expected duration at a print speed (and line speed), e.g.
+for shortest-job-first scheduling across printers:
+
+    job = estimate(printer.data)
+    print(job.categories["raster"], job.paper_mm, job.duration)
+"""
+
+from collections import namedtuple
+
+from . import qr
+from .decoder import decode, _u16
+
+DPI = 180
+MM_PER_DOT = 25.4 / DPI
+
+DEFAULT_LINE_SPACING = 30
+PAGE_HEIGHT = 1662
+FONT_HEIGHTS = (24, 17)
+HRI_HEIGHT = 30
+
+# print speed in mm/s
+DEFAULT_SPEED = 150
+
+CATEGORY_TEXT = "text"
+CATEGORY_RASTER = "raster"
+CATEGORY_BARCODE = "barcode"
+CATEGORY_CONTROL = "control"
+CATEGORIES = (CATEGORY_TEXT, CATEGORY_RASTER, CATEGORY_BARCODE, CATEGORY_CONTROL)
+
+# mnemonic: category, everything else is control (settings, positions, feeds, cuts, status)
+COMMAND_CATEGORIES = {
+    "TEXT": CATEGORY_TEXT,
+    "HT": CATEGORY_TEXT,
+    "GS v 0": CATEGORY_RASTER,
+    "ESC *": CATEGORY_RASTER,
+    "GS *": CATEGORY_RASTER,
+    "GS /": CATEGORY_RASTER,
+    "FS q": CATEGORY_RASTER,
+    "FS p": CATEGORY_RASTER,
+    "GS k": CATEGORY_BARCODE,
+    "GS (k": CATEGORY_BARCODE,
+}
+
+Estimate = namedtuple("Estimate", "bytes categories commands raster_dot_lines dot_lines paper_mm "
+                                  "print_time transfer_time duration")
+
+
+class PaperModel(object):
+
+    def __init__(self):
+        self.nv_heights = {}
+        self.downloaded_height = 0
+        self.reset()
+
+    def reset(self):
+        """ESC @"""
+        self.font = 0
+        self.hmul = 1
+        self.line_spacing = DEFAULT_LINE_SPACING
+        self.line_height = 0
+        self.barcode_height = 162
+        self.hri_position = 0
+        self.page = False
+        # bottom of the printing areas set in page mode (0: the default area)
+        self.page_height = 0
+        self.qr_size = 3
+        self.qr_ec = qr.QR_EC_L
+        self.qr_data = b""
+
+    def _line(self, height):
+        """Adds content of height dots to the current line"""
+        if height > self.line_height:
+            self.line_height = height
+
+    def _print_line(self):
+        """Prints the current line, returns the feed"""
+        feed = max(self.line_spacing, self.line_height)
+        self.line_height = 0
+        return feed
+
+    def advance(self, command):
+        """Returns the dot lines the paper advances for command"""
+        m = command.mnemonic
+        args = command.args
+        if self.page:
+            if m in ("FF", "ESC FF"):
+                self.page = m == "ESC FF"
+                return self.page_height or PAGE_HEIGHT
+            if m == "ESC W":
+                # several areas can share one page, the page ends below the lowest one
+                self.page_height = max(self.page_height, _u16(args[2], args[3]) + _u16(args[6], args[7]))
+            elif m == "ESC S":
+                self.page = False
+            elif m == "ESC @":
+                self.reset()
+            return 0
+
+        if m == "TEXT":
+            self._line(FONT_HEIGHTS[self.font] * self.hmul)
+        elif m == "LF":
+            return self._print_line()
+        elif m == "ESC J":
+            self.line_height = 0
+            return args[0]
+        elif m == "ESC d":
+            height = self.line_height
+            self.line_height = 0
+            return max(height, self.line_spacing * args[0])
+        elif m == "ESC 2":
+            self.line_spacing = DEFAULT_LINE_SPACING
+        elif m == "ESC 3":
+            self.line_spacing = args[0]
+        elif m == "ESC !":
+            self.font = args[0] & 1
+            self.hmul = 2 if args[0] & 0x10 else 1
+        elif m == "ESC M":
+            self.font = args[0] & 1
+        elif m == "GS !":
+            self.hmul = (args[0] & 0x07) + 1
+        elif m == "ESC @":
+            self.reset()
+        elif m == "ESC L":
+            self.page = True
+            self.page_height = 0
+        elif m == "GS v 0":
+            self.line_height = 0
+            return _u16(args[3], args[4]) * (2 if args[0] & 2 else 1)
+        elif m == "ESC *":
+            # 8-dot modes have 1/60 inch vertical density: 24 dot lines as well
+            self._line(24)
+        elif m == "GS *":
+            self.downloaded_height = args[1] * 8
+        elif m == "GS /":
+            self.line_height = 0
+            return self.downloaded_height * (2 if args[0] & 2 else 1)
+        elif m == "FS q":
+            self._define_nv(command.data, args[0])
+        elif m == "FS p":
+            self.line_height = 0
+            return self.nv_heights.get(args[0], 0) * (2 if args[1] & 2 else 1)
+        elif m == "GS h":
+            self.barcode_height = args[0]
+        elif m == "GS H":
+            self.hri_position = args[0] & 3
+        elif m == "GS k":
+            self.line_height = 0
+            return self.barcode_height + HRI_HEIGHT * (2 if self.hri_position == 3 else self.hri_position and 1)
+        elif m == "GS V" and len(args) > 1:
+            return args[1]
+        elif m == "GS (k" and len(command.data) > 2 and command.data[0] == 49:
+            return self._symbol(command.data)
+        return 0
+
+    def _symbol(self, data):
+        """GS ( k QR code functions"""
+        fn = data[1]
+        if fn == 67:
+            self.qr_size = data[2]
+        elif fn == 69:
+            self.qr_ec = data[2]
+        elif fn == 80:
+            self.qr_data = bytes(data[3:])
+        elif fn == 81 and self.qr_data:
+            self.line_height = 0
+            return len(qr.matrix(self.qr_data, self.qr_ec)) * self.qr_size
+        return 0
+
+    def _define_nv(self, data, count):
+        self.nv_heights = {}
+        pos = 0
+        for n in range(1, count + 1):
+            x = _u16(data[pos], data[pos + 1])
+            y = _u16(data[pos + 2], data[pos + 3])
+            self.nv_heights[n] = y * 8
+            pos += 4 + x * y * 8
+
+
+
+def estimate(data, speed=DEFAULT_SPEED, baudrate=None, cut_time=0.0):
+    """Returns the `Estimate` of a job (command bytes)
+    * bytes: total size, categories: bytes per category (CATEGORIES), commands: their count
+    * raster_dot_lines: dot lines of bit images, dot_lines / paper_mm: paper the job feeds
+    * print_time: seconds to print at speed mm/s (0 without), plus cut_time seconds per cut
+    * transfer_time: seconds to transfer at baudrate bit/s (10 bits per byte, 0 without)
+    * duration: the printer prints while it receives, so the longer of both"""
+    model = PaperModel()
+    categories = dict.fromkeys(CATEGORIES, 0)
+    count = 0
+    raster_dot_lines = 0
+    dot_lines = 0
+    cuts = 0
+    # a command's size is the distance to the next one
+    category = CATEGORY_CONTROL
+    offset = 0
+    for command in decode(data):
+        categories[category] += command.offset - offset
+        category = COMMAND_CATEGORIES.get(command.mnemonic, CATEGORY_CONTROL)
+        offset = command.offset
+        count += 1
+        dots = model.advance(command)
+        dot_lines += dots
+        if category == CATEGORY_RASTER:
+            # ESC * prints with the line, count its 24 dot band
+            raster_dot_lines += 24 if command.mnemonic == "ESC *" else dots
+        elif command.mnemonic == "GS V":
+            cuts += 1
+    categories[category] += len(data) - offset
+    print_time = (dot_lines * MM_PER_DOT / speed if speed else 0.0) + cuts * cut_time
+    transfer_time = len(data) * 10.0 / baudrate if baudrate else 0.0
+    return Estimate(len(data), categories, count, raster_dot_lines, dot_lines, dot_lines * MM_PER_DOT,
+                    print_time, transfer_time, max(print_time, transfer_time))
@@ -0,0 +1,171 @@
+"""Upload-once logos using NV bit images (FS q / FS p) and downloaded bit images (GS * / GS /)
+
+`LogoRegistry` converts pil images into the column format these commands expect, uploads them
+once per printer and afterwards only emits the few-byte print command.
+NV bit images survive power cycles, a manifest (optionally stored as JSON file) records which
+images are resident on which printer. Downloaded bit images are volatile and are only tracked
+until the next `initialize_printer`.
+"""
+
+import hashlib
+import json
+import os
+
+from PIL import Image
+
+from . import raster
+
+NV_MAX_HEIGHT = 288 * 8
+NV_MAX_IMAGES = 255
+
+DOWNLOADED_MAX_X = 255
+DOWNLOADED_MAX_Y = 48
+DOWNLOADED_MAX_XY = 1536
+
+
+def column_data(image, max_width=raster.PRINTER_WIDTH, max_height=None, dither=None):
+    """Converts a pil image object into column format bit image data
+    The image is scaled down to fit max_width/max_height and padded to a multiple of 8 dots.
+    Returns (x, y, d): width and height in units of 8 dots and the data, column by column,
+    each column top to bottom with the MSB as the topmost dot."""
+    width, height = image.size
+    scale = min(1.0, max_width / width, (max_height or height) / height)
+    if scale < 1.0:
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+    im = raster.bitmap(image, dither)
+    x = -(-im.size[0] // 8)
+    y = -(-im.size[1] // 8)
+    if (x * 8, y * 8) != im.size:
+        padded = Image.new("1", (x * 8, y * 8))
+        padded.paste(im, (0, 0))
+        im = padded
+    # after transposing, every row of the image is one column of the original
+    return x, y, im.transpose(Image.TRANSPOSE).tobytes()
+
+
+def downloaded_column_data(image, dither=None):
+    """Like `column_data`, but scaled to the limits of `define_downloaded_bit_image`"""
+    width, height = image.size
+    x = -(-min(raster.PRINTER_WIDTH, width) // 8)
+    while True:
+        y = max(1, -(-int(x * 8 * height / width) // 8))
+        if x == 1 or (y <= DOWNLOADED_MAX_Y and x * y <= DOWNLOADED_MAX_XY):
+            break
+        x -= 1
+    return column_data(image, max_width=x * 8, max_height=min(y, DOWNLOADED_MAX_Y) * 8, dither=dither)
+
+
+def _digest(image):
+    h = hashlib.sha256()
+    h.update("{0}|{1}".format(image.mode, image.size).encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+class LogoRegistry(object):
+
+    def __init__(self, printer, manifest=None, dither=None):
+        """printer is the `SRP350` the logos are uploaded to and printed on
+        manifest is an optional path of a JSON file which records the NV images resident on each printer"""
+        self.printer = printer
+        self.manifest = manifest
+        self.dither = dither
+
+        self._logos = {}
+        self._order = []
+        self._manifest = None
+
+    def _load_manifest(self, reload=False):
+        if self._manifest is None or reload:
+            self._manifest = {}
+            if self.manifest is not None and os.path.exists(self.manifest):
+                with open(self.manifest) as f:
+                    self._manifest = json.load(f)
+        return self._manifest
+
+    def _save_manifest(self, data):
+        self._manifest = data
+        if self.manifest is None:
+            return
+        tmp = self.manifest + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.manifest)
+
+    def add(self, name, image):
+        """Registers a pil image object as NV logo called name
+        Returns the NV image number, numbers are assigned in the order logos are added."""
+        digest = _digest(image)
+        if name in self._logos and self._logos[name][0] == digest:
+            return self.number(name)
+        if name not in self._order and len(self._order) >= NV_MAX_IMAGES:
+            raise ValueError("only {0} NV bit images can be defined".format(NV_MAX_IMAGES))
+        x, y, d = column_data(image, max_height=NV_MAX_HEIGHT, dither=self.dither)
+        self._logos[name] = (digest, self.printer.generate_nv_image_data(x, y, d))
+        if name not in self._order:
+            self._order.append(name)
+        return self.number(name)
+
+    def number(self, name):
+        """Returns the NV image number of the logo called name"""
+        return self._order.index(name) + 1
+
+    def resident(self):
+        """Returns the names of the logos which are currently stored in the printer's NV memory"""
+        entry = self._load_manifest().get(self.printer.port, [])
+        return [e["name"] for i, e in enumerate(entry)
+                if i < len(self._order) and e["name"] == self._order[i]
+                and e["hash"] == self._logos[self._order[i]][0]]
+
+    def is_uploaded(self):
+        """True if the printer holds exactly the registered logos"""
+        expected = [{"name": name, "hash": self._logos[name][0]} for name in self._order]
+        return self._load_manifest().get(self.printer.port) == expected
+
+    def upload(self, force=False, timeout=None):
+        """Defines all registered logos as NV bit images (FS q) unless the manifest says they are
+        already resident. FS q replaces all NV images at once, so all logos are sent together.
+        The upload is written to the device right away on its own, after the buffers sent
+        before; the printer buffer (printer.data, e.g. a receipt being built) is left alone.
+        Raises TimeoutError if those buffers aren't written within timeout seconds (default: the
+        timeout of the printer), nothing is uploaded then.
+        Returns True if the images were uploaded."""
+        if not force and self.is_uploaded():
+            return False
+        if not self._order:
+            return False
+        printer = self.printer
+        if printer.transport is None:
+            raise IOError("printer has no device, logos can't be uploaded")
+        # queued and batched buffers go first
+        timeout = printer.transport.timeout if timeout is None else timeout
+        if not printer.flush(timeout):
+            raise TimeoutError("buffers sent before the logo upload weren't written within {0}s".format(timeout))
+        payload = bytes((0x1C, 0x71, len(self._order)))
+        data = b"".join(self._logos[name][1] for name in self._order)
+        if printer.tracer is not None:
+            printer.tracer.record("define_nv_bit_image", (payload, data))
+        printer.transport.writev([payload, data])
+        manifest = self._load_manifest(reload=True)
+        manifest[self.printer.port] = [{"name": name, "hash": self._logos[name][0]} for name in self._order]
+        self._save_manifest(manifest)
+        return True
+
+    def print_logo(self, name, m=0):
+        """Prints the logo called name (FS p), uploading the logos first if necessary (see
+        `upload`, the printer buffer isn't sent)"""
+        if name not in self._logos:
+            raise KeyError("unknown logo {0!r}".format(name))
+        if not self.is_uploaded():
+            self.upload()
+        return self.printer.print_nv_bit_image(self.number(name), m)
+
+    def print_downloaded(self, image, m=0):
+        """Prints a pil image object as downloaded bit image (GS * / GS /)
+        The image is only transmitted if it isn't the currently downloaded one."""
+        digest = _digest(image)
+        if self.printer._downloaded_bit_image != digest:
+            x, y, d = downloaded_column_data(image, dither=self.dither)
+            self.printer.define_downloaded_bit_image(x, y, d)
+            self.printer._downloaded_bit_image = digest
+        return self.printer.print_downloaded_bit_image(m)
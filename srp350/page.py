@@ -0,0 +1,294 @@
+"""Page mode layout engine
+
+A `Page` places text blocks, images and barcodes at absolute positions (in dots, 180 DPI) of a
+2D area and checks that every block fits the page, that no blocks overlap and that text fits
+its block. `emit` writes the page with page mode commands to a printer buffer: ESC L, one
+ESC W for the page, ESC $ / GS $ positions, ESC T areas for rotated text, and FF, so the
+printer develops the page in its buffer and prints it in one pass instead of feeding line by
+line. Commands which wouldn't change anything (positions the printer is already at, settings
+already sent by an earlier block) are left out.
+
+    page = Page(height=240)
+    page.text(0, 0, "Table 12", width=256, width_mul=2, height_mul=2, bold=True)
+    page.text(256, 0, "2 guests\\n12:41", width=256, align=ALIGN_RIGHT)
+    page.text(0, 60, "1 x Soup\\n2 x Bread", width=400)
+    page.text(488, 60, "KITCHEN", width=24, height=180, direction=DIRECTION_BOTTOM_TO_TOP)
+    page.barcode(0, 160, BARCODE_SYSTEM_B_CODE128, "T12-0041", height=60)
+    page.emit(printer)
+    printer.send()
+"""
+
+from .barcode import encode as encode_barcode
+from .estimate import PAGE_HEIGHT, FONT_HEIGHTS
+from .raster import PRINTER_WIDTH, fit_width
+from .state import DEFAULTS
+
+FONT_WIDTHS = (12, 9)
+
+ALIGN_LEFT = 0
+ALIGN_CENTER = 1
+ALIGN_RIGHT = 2
+
+# ESC T n
+DIRECTION_LEFT_TO_RIGHT = 0
+DIRECTION_BOTTOM_TO_TOP = 1
+DIRECTION_RIGHT_TO_LEFT = 2
+DIRECTION_TOP_TO_BOTTOM = 3
+
+# dots between lines of text blocks
+LINE_GAP = 6
+
+
+def _u16(n):
+    return n % 256, n // 256
+
+
+def wrap(text, columns):
+    """Splits text into lines of at most columns characters, at spaces where possible"""
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split(" "):
+            candidate = word if not line else line + " " + word
+            if len(candidate) <= columns:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            while len(word) > columns:
+                lines.append(word[:columns])
+                word = word[columns:]
+            line = word
+        lines.append(line)
+    return lines
+
+
+class Block(object):
+    """A placed element, x, y, width and height are in dots of the page (paper orientation)"""
+
+    def __init__(self, kind, x, y, width, height, direction=DIRECTION_LEFT_TO_RIGHT, **options):
+        self.kind = kind
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.direction = direction
+        self.options = options
+
+    def __repr__(self):
+        return "<Block {0} {1}x{2} at {3},{4}>".format(self.kind, self.width, self.height, self.x, self.y)
+
+    def overlaps(self, other):
+        return (self.x < other.x + other.width and other.x < self.x + self.width and
+                self.y < other.y + other.height and other.y < self.y + self.height)
+
+
+class Page(object):
+
+    def __init__(self, width=PRINTER_WIDTH, height=None):
+        """width and height of the printing area in dots, without height the page ends below
+        the lowest block (the printer feeds the whole area, so a tight page saves paper)"""
+        if not 0 < width <= PRINTER_WIDTH:
+            raise ValueError("page width must be 1..{0}, not {1}".format(PRINTER_WIDTH, width))
+        if height is not None and not 0 < height <= PAGE_HEIGHT:
+            raise ValueError("page height must be 1..{0}, not {1}".format(PAGE_HEIGHT, height))
+        self.width = width
+        self._height = height
+        self.blocks = []
+
+    @property
+    def height(self):
+        if self._height is not None:
+            return self._height
+        return max([block.y + block.height for block in self.blocks] or [1])
+
+    def _add(self, block):
+        if block.x < 0 or block.y < 0 or block.x + block.width > self.width:
+            raise ValueError("{0!r} is outside the page width of {1} dots".format(block, self.width))
+        limit = self._height if self._height is not None else PAGE_HEIGHT
+        if block.y + block.height > limit:
+            raise ValueError("{0!r} is outside the page height of {1} dots".format(block, limit))
+        for other in self.blocks:
+            if block.overlaps(other):
+                raise ValueError("{0!r} overlaps {1!r}".format(block, other))
+        self.blocks.append(block)
+        return block
+
+    def text(self, x, y, text, width=None, height=None, font=0, width_mul=1, height_mul=1, bold=False,
+             align=ALIGN_LEFT, direction=DIRECTION_LEFT_TO_RIGHT, line_spacing=None):
+        """Adds a text block, text is wrapped to the block width (the block height for rotated
+        directions, which need width and height)
+        Returns the `Block`, raises ValueError if the text doesn't fit."""
+        if direction not in (0, 1, 2, 3):
+            raise ValueError("direction must be 0..3, not {0}".format(direction))
+        if not (1 <= width_mul <= 8 and 1 <= height_mul <= 8):
+            raise ValueError("character size multipliers must be 1..8")
+        if width is None:
+            if direction in (DIRECTION_BOTTOM_TO_TOP, DIRECTION_TOP_TO_BOTTOM):
+                raise ValueError("rotated text blocks need a width")
+            width = self.width - x
+        rotated = direction in (DIRECTION_BOTTOM_TO_TOP, DIRECTION_TOP_TO_BOTTOM)
+        if rotated and height is None:
+            raise ValueError("rotated text blocks need a height")
+        char_width = FONT_WIDTHS[font & 1] * width_mul
+        char_height = FONT_HEIGHTS[font & 1] * height_mul
+        spacing = char_height + LINE_GAP if line_spacing is None else line_spacing
+        if not char_height <= spacing <= 255:
+            raise ValueError("line spacing must be {0}..255, not {1}".format(char_height, spacing))
+        run, across = (height, width) if rotated else (width, height)
+        columns = run // char_width
+        if columns < 1:
+            raise ValueError("text block of {0} dots is narrower than a character".format(run))
+        lines = wrap(text, columns)
+        needed = (len(lines) - 1) * spacing + char_height
+        if across is None:
+            across = needed
+        elif needed > across:
+            raise ValueError("{0} lines of text need {1} dots, the block has {2}".format(len(lines), needed, across))
+        if rotated:
+            width = across
+        else:
+            height = across
+        return self._add(Block("text", x, y, width, height, direction, lines=lines, font=font & 1,
+                               size=(width_mul - 1) << 4 | (height_mul - 1), bold=bool(bold), align=align,
+                               char_width=char_width, char_height=char_height, spacing=spacing, run=run))
+
+    def image(self, x, y, image, dither=None):
+        """Adds a pil image (scaled down to the space right of x), returns the `Block`"""
+        image = fit_width(image, self.width - x)
+        width, height = image.size
+        return self._add(Block("image", x, y, width, height, image=image, dither=dither))
+
+    def barcode(self, x, y, system, data, module_width=2, height=80):
+        """Adds a barcode (GS k, without HRI characters), returns the `Block`
+        Raises ValueError for invalid data (see `srp350.barcode`)."""
+        if not 2 <= module_width <= 6:
+            raise ValueError("module width must be 2..6, not {0}".format(module_width))
+        if not 1 <= height <= 255:
+            raise ValueError("barcode height must be 1..255, not {0}".format(height))
+        code = encode_barcode(system, data)
+        return self._add(Block("barcode", x, y, len(code.modules) * module_width, height,
+                               system=system, data=data, module_width=module_width))
+
+    def emit(self, printer, end=True):
+        """Writes the page with page mode commands to the printer buffer (printer.data), send
+        it with `SRP350.send` as one burst
+        With end=False the printer stays in page mode (ESC FF instead of FF)."""
+        height = self.height
+        printer.select_page_mode()
+        # direction 0 blocks share one area of the whole page, rotated text gets an area each
+        shared = [b for b in self.blocks if b.direction == DIRECTION_LEFT_TO_RIGHT]
+        rotated = sorted((b for b in self.blocks if b.direction != DIRECTION_LEFT_TO_RIGHT),
+                         key=lambda b: b.direction)
+        writer = _Writer(printer)
+        if shared and (self.width, height) != (PRINTER_WIDTH, PAGE_HEIGHT):
+            writer.area(0, 0, self.width, height)
+        for block in shared:
+            writer.block(block, block.x, block.y)
+        for block in rotated:
+            writer.area(block.x, block.y, block.width, block.height)
+            writer.direction(block.direction)
+            writer.block(block, 0, 0)
+        # ESC T and the character and barcode settings outlive the page
+        writer.direction(DIRECTION_LEFT_TO_RIGHT)
+        writer.restore()
+        if end:
+            printer.print_and_return_to_standard_mode()
+        else:
+            printer.print_data_in_page_mode()
+        return printer
+
+
+class _Writer(object):
+    """Emits blocks, tracking the print position and settings to skip redundant commands"""
+
+    def __init__(self, printer):
+        self.printer = printer
+        # None: unknown, the next block sets it
+        self.x = 0
+        self.y = None
+        self._direction = DIRECTION_LEFT_TO_RIGHT
+        self.settings = {}
+        # name: (value before the page, method) of every setting changed
+        self.changed = {}
+
+    def area(self, x, y, width, height):
+        self.printer.set_printing_area(*(_u16(x) + _u16(y) + _u16(width) + _u16(height)))
+        self.x, self.y = 0, None
+
+    def direction(self, direction):
+        if direction != self._direction:
+            self.printer.select_print_direction(direction)
+            self._direction = direction
+            self.x, self.y = 0, None
+
+    def move(self, x, y):
+        """Moves to x and the baseline y (relative to the area)"""
+        if y != self.y:
+            self.printer.set_absolute_vertical_print_position(*_u16(y))
+            self.y = y
+        if x != self.x:
+            self.printer.set_absolute_print_position(*_u16(x))
+            self.x = x
+
+    def setting(self, name, value, method):
+        """Sends a setting (name as in `srp350.state`) unless the printer has it already"""
+        current = self.settings[name] if name in self.settings else self.printer.state.get(name)
+        if current != value:
+            if name not in self.changed:
+                self.changed[name] = (self.printer.state.get(name), method)
+            method(value)
+            self.settings[name] = value
+
+    def restore(self):
+        """Sets the changed settings back to their values before the page, unknown ones to their
+        defaults after ESC @"""
+        for name, (value, method) in self.changed.items():
+            if self.settings[name] == value:
+                continue
+            if value is None and name == "line_spacing":
+                self.printer.select_default_line_spacing()
+            else:
+                method(DEFAULTS[name] if value is None else value)
+        self.settings = {}
+        self.changed = {}
+
+    def block(self, block, x, y):
+        getattr(self, "_" + block.kind)(block, x, y, **block.options)
+
+    def _text(self, block, x, y, lines, font, size, bold, align, char_width, char_height, spacing, run):
+        printer = self.printer
+        self.setting("font", font, printer.select_character_font)
+        self.setting("size", size, printer.select_character_size)
+        self.setting("emphasize", int(bold), printer.emphasize_mode)
+        if len(lines) > 1:
+            self.setting("line_spacing", spacing, printer.set_line_spacing)
+        baseline = y + char_height
+        for i, line in enumerate(lines):
+            offset = 0
+            if align == ALIGN_CENTER:
+                offset = (run - len(line) * char_width) // 2
+            elif align == ALIGN_RIGHT:
+                offset = run - len(line) * char_width
+            self.move(x + offset, baseline)
+            printer.print(line)
+            self.x += len(line) * char_width
+            if i + 1 < len(lines):
+                # LF returns to the start of the area, one line spacing further
+                printer.line_feed()
+                baseline += spacing
+                self.x, self.y = 0, baseline
+
+    def _image(self, block, x, y, image, dither):
+        self.move(x, y + block.height)
+        self.printer.print_raster_bit_image(0, *self.printer.generate_image_data(image, center=False, dither=dither))
+        self.x, self.y = None, None
+
+    def _barcode(self, block, x, y, system, data, module_width):
+        printer = self.printer
+        self.setting("hri_position", 0, printer.select_hri_printing_position)
+        self.setting("barcode_width", module_width, printer.set_barcode_width)
+        self.setting("barcode_height", block.height, printer.set_barcode_height)
+        self.move(x, y + block.height)
+        printer.print_barcode(None, system, data)
+        self.x, self.y = None, None
@@ -0,0 +1,176 @@
+"""Parallel image preparation
+
+`ImagePreparer` rasterizes images (the same work as `srp350.raster.rasterize`) in a
+`concurrent.futures.ProcessPoolExecutor`, so a batch of receipts with product images or
+signatures uses every core instead of one. Tall images are split into horizontal bands which
+are dithered and packed in parallel and written straight into one output buffer.
+
+Pixels and results go through `multiprocessing.shared_memory`: the parent copies the pixels
+of an image into a shared block once, workers read their rows from it and write their packed
+rows into a shared output block, only names and offsets are pickled.
+
+Threshold and Bayer dithering work per pixel, so banded results are identical to
+`rasterize`. Floyd-Steinberg diffuses the error downwards across rows, so such images are
+processed whole by one worker (still in parallel with other images) unless split_diffusion
+is set, which trades small seams at band borders for speed.
+
+    preparer = ImagePreparer()
+    futures = [preparer.submit(image, dither=DITHER_BAYER_8X8) for image in images]
+    for future in futures:
+        printer.print_raster_bit_image(BIT_IMAGE_MODE_NORMAL, *future.result())
+    preparer.close()
+"""
+
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+from .raster import PRINTER_WIDTH, DITHER_FLOYD_STEINBERG, fit_width, ink, dither, rasterize, np
+
+# rows per band, a multiple of 8 keeps the Bayer matrices aligned
+DEFAULT_BAND_HEIGHT = 256
+# images with fewer rows are not split
+MIN_SPLIT_HEIGHT = 2 * DEFAULT_BAND_HEIGHT
+# smaller images are rasterized in the calling thread, shipping them costs more than it saves
+MIN_POOL_PIXELS = 64 * 1024
+
+_MODES = ("1", "L", "RGB", "RGBA")
+
+
+def _prepare_band(pixels, mode, width, height, top, bottom, output, line_bytes, left, dither_mode):
+    """Worker: dithers and packs rows top..bottom of the shared pixels into the shared output"""
+    source = shared_memory.SharedMemory(name=pixels)
+    target = shared_memory.SharedMemory(name=output)
+    try:
+        row_bytes = len(Image.new(mode, (width, 1)).tobytes())
+        band = Image.frombytes(mode, (width, bottom - top), bytes(source.buf[top * row_bytes:bottom * row_bytes]))
+        bits = dither(ink(band), dither_mode)
+        packed = np.packbits(bits, axis=1)
+        rows = np.ndarray((bottom - top, line_bytes), dtype=np.uint8,
+                          buffer=target.buf, offset=top * line_bytes)
+        if left % 8 == 0:
+            rows[:, left // 8:left // 8 + packed.shape[1]] = packed
+        else:
+            rows[:] = np.packbits(np.pad(bits, ((0, 0), (left, line_bytes * 8 - width - left))), axis=1)
+        del rows
+    finally:
+        source.close()
+        target.close()
+    return bottom - top
+
+
+class ImagePreparer(object):
+
+    def __init__(self, workers=None, band_height=DEFAULT_BAND_HEIGHT, min_split_height=MIN_SPLIT_HEIGHT,
+                 split_diffusion=False, min_pool_pixels=MIN_POOL_PIXELS):
+        """workers is the number of processes (default: number of CPUs)
+        Images of at least min_split_height rows are split into bands of band_height rows
+        (a multiple of 8), Floyd-Steinberg images only with split_diffusion=True.
+        Images with less than min_pool_pixels pixels are rasterized right away in the calling
+        thread."""
+        if np is None:
+            raise ImportError("numpy is required for the image preparer")
+        if band_height % 8:
+            raise ValueError("band height must be a multiple of 8, not {0}".format(band_height))
+        self.workers = workers
+        self.band_height = band_height
+        self.min_split_height = min_split_height
+        self.split_diffusion = split_diffusion
+        self.min_pool_pixels = min_pool_pixels
+
+        self.images = 0
+        self.bands = 0
+        self.inline = 0
+
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers)
+            return self._executor
+
+    def submit(self, image, center=True, dither=DITHER_FLOYD_STEINBERG, width=PRINTER_WIDTH):
+        """Queues a pil image, returns a Future of [xL, xH, yL, yH, d] as `rasterize` returns it"""
+        image = fit_width(image, width)
+        if image.mode not in _MODES or "transparency" in image.info:
+            image = image.convert("RGBA")
+        w, h = image.size
+        if w * h < self.min_pool_pixels:
+            result = Future()
+            result.set_result(rasterize(image, center, dither, width))
+            self.inline += 1
+            return result
+        line_bytes = -(-max(w, width if center else 0) // 8)
+        left = (width - w) // 2 if center and w < width else 0
+
+        pixels = image.tobytes()
+        source = shared_memory.SharedMemory(create=True, size=max(1, len(pixels)))
+        source.buf[:len(pixels)] = pixels
+        del pixels
+        target = shared_memory.SharedMemory(create=True, size=max(1, line_bytes * h))
+        target.buf[:line_bytes * h] = bytes(line_bytes * h)
+
+        if h >= self.min_split_height and (dither != DITHER_FLOYD_STEINBERG or self.split_diffusion):
+            bands = [(top, min(h, top + self.band_height)) for top in range(0, h, self.band_height)]
+        else:
+            bands = [(0, h)]
+        pool = self._pool()
+        futures = [pool.submit(_prepare_band, source.name, image.mode, w, h, top, bottom,
+                               target.name, line_bytes, left, dither) for top, bottom in bands]
+        self.images += 1
+        self.bands += len(bands)
+
+        result = Future()
+        state = {"remaining": len(futures), "error": None}
+        lock = threading.Lock()
+
+        def done(future):
+            with lock:
+                if future.exception() is not None and state["error"] is None:
+                    state["error"] = future.exception()
+                state["remaining"] -= 1
+                if state["remaining"]:
+                    return
+            try:
+                if state["error"] is None:
+                    d = bytes(target.buf[:line_bytes * h])
+                    result.set_result([line_bytes % 256, line_bytes // 256, h % 256, h // 256, d])
+                else:
+                    result.set_exception(state["error"])
+            finally:
+                for block in (source, target):
+                    block.close()
+                    block.unlink()
+
+        for future in futures:
+            future.add_done_callback(done)
+        return result
+
+    def map(self, images, center=True, dither=DITHER_FLOYD_STEINBERG, width=PRINTER_WIDTH):
+        """Rasterizes all images in parallel, returns their results in order"""
+        futures = [self.submit(image, center, dither, width) for image in images]
+        return [future.result() for future in futures]
+
+    def rasterize(self, image, center=True, dither=DITHER_FLOYD_STEINBERG, width=PRINTER_WIDTH):
+        """Rasterizes one image (its bands in parallel), returns [xL, xH, yL, yH, d]"""
+        return self.submit(image, center, dither, width).result()
+
+    def stats(self):
+        return {"images": self.images, "bands": self.bands, "inline": self.inline}
+
+    def close(self):
+        """Shuts the worker processes down"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,442 @@
+"""QR code symbols
+
+Pure Python QR code encoder (model 2, versions 1 to 40, numeric, alphanumeric and byte mode)
+and packing of the module matrix straight into raster bytes for `print_raster_bit_image`.
+Every module becomes scale x scale dots, rows are expanded with a per-scale lookup table
+instead of going through PIL and dithering. Encoded symbols are cached, so repeated payloads
+(URLs, table numbers) cost a dictionary lookup.
+
+Printers with QR support in the firmware get the payload with GS ( k instead, see
+`native_commands`.
+
+    printer.print_qr_code("https://example.com", scale=6, ec=QR_EC_M)
+"""
+
+import re
+from functools import lru_cache
+
+from .raster import PRINTER_WIDTH
+
+# error correction levels, the values are the n of GS ( k <fn 69>
+QR_EC_L = 48
+QR_EC_M = 49
+QR_EC_Q = 50
+QR_EC_H = 51
+
+QUIET_ZONE = 4
+CACHE_SIZE = 256
+
+_EC_INDEX = {QR_EC_L: 0, QR_EC_M: 1, QR_EC_Q: 2, QR_EC_H: 3}
+# format information bits of the levels
+_EC_FORMAT = {QR_EC_L: 1, QR_EC_M: 0, QR_EC_Q: 3, QR_EC_H: 2}
+
+# [level][version], index 0 unused
+_ECC_CODEWORDS_PER_BLOCK = (
+    (-1, 7, 10, 15, 20, 26, 18, 20, 24, 30, 18, 20, 24, 26, 30, 22, 24, 28, 30, 28, 28, 28, 28, 30, 30, 26, 28,
+     30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26, 30, 22, 22, 24, 24, 28, 28, 26, 26, 26, 26, 28, 28, 28, 28, 28,
+     28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28, 28),
+    (-1, 13, 22, 18, 26, 18, 24, 18, 22, 20, 24, 28, 26, 24, 20, 30, 24, 28, 28, 26, 30, 28, 30, 30, 30, 30, 28,
+     30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+    (-1, 17, 28, 22, 16, 22, 28, 26, 26, 24, 28, 24, 28, 22, 24, 24, 30, 28, 28, 26, 28, 30, 24, 30, 30, 30, 30,
+     30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30),
+)
+_NUM_BLOCKS = (
+    (-1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 4, 4, 4, 4, 4, 6, 6, 6, 6, 7, 8, 8, 9, 9, 10, 12, 12, 12, 13, 14, 15, 16, 17,
+     18, 19, 19, 20, 21, 22, 24, 25),
+    (-1, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5, 5, 8, 9, 9, 10, 10, 11, 13, 14, 16, 17, 17, 18, 20, 21, 23, 25, 26, 28, 29,
+     31, 33, 35, 37, 38, 40, 43, 45, 47, 49),
+    (-1, 1, 1, 2, 2, 4, 4, 6, 6, 8, 8, 8, 10, 12, 16, 12, 17, 16, 18, 21, 20, 23, 23, 25, 27, 29, 34, 34, 35, 38,
+     40, 43, 45, 48, 51, 53, 56, 59, 62, 65, 68),
+    (-1, 1, 1, 2, 4, 4, 4, 5, 6, 8, 8, 11, 11, 16, 16, 18, 16, 19, 21, 25, 25, 25, 34, 30, 32, 35, 37, 40, 42, 45,
+     48, 51, 54, 57, 60, 63, 66, 70, 74, 77, 81),
+)
+
+MODE_NUMERIC = 1
+MODE_ALPHANUMERIC = 2
+MODE_BYTE = 4
+
+_ALPHANUMERIC = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+_ALPHANUMERIC_INDEX = {c: i for i, c in enumerate(_ALPHANUMERIC)}
+# character count bits for versions 1-9, 10-26, 27-40
+_COUNT_BITS = {MODE_NUMERIC: (10, 12, 14), MODE_ALPHANUMERIC: (9, 11, 13), MODE_BYTE: (8, 16, 16)}
+
+# GF(256) with the QR polynomial x^8 + x^4 + x^3 + x^2 + 1
+_EXP = [0] * 512
+_LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    _EXP[_i] = _value
+    _LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= 0x11D
+for _i in range(255, 512):
+    _EXP[_i] = _EXP[_i - 255]
+del _i, _value
+
+
+class _Bits(object):
+    """Bit buffer, kept as one int"""
+
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def append(self, value, bits):
+        self.value = (self.value << bits) | value
+        self.length += bits
+
+
+def _raw_modules(version):
+    """Number of data and error correction modules of a version"""
+    result = (16 * version + 128) * version + 64
+    if version >= 2:
+        align = version // 7 + 2
+        result -= (25 * align - 10) * align - 55
+        if version >= 7:
+            result -= 36
+    return result
+
+
+def _data_codewords(version, ec):
+    i = _EC_INDEX[ec]
+    return _raw_modules(version) // 8 - _ECC_CODEWORDS_PER_BLOCK[i][version] * _NUM_BLOCKS[i][version]
+
+
+def _segment(data):
+    """Returns (mode, character count, bits) of data (str or bytes)"""
+    if isinstance(data, str):
+        if data.isdigit() and data.isascii():
+            bits = _Bits()
+            for i in range(0, len(data), 3):
+                group = data[i:i + 3]
+                bits.append(int(group), len(group) * 3 + 1)
+            return MODE_NUMERIC, len(data), bits
+        if all(c in _ALPHANUMERIC_INDEX for c in data):
+            bits = _Bits()
+            for i in range(0, len(data) - 1, 2):
+                bits.append(_ALPHANUMERIC_INDEX[data[i]] * 45 + _ALPHANUMERIC_INDEX[data[i + 1]], 11)
+            if len(data) % 2:
+                bits.append(_ALPHANUMERIC_INDEX[data[-1]], 6)
+            return MODE_ALPHANUMERIC, len(data), bits
+        data = data.encode("utf-8")
+    bits = _Bits()
+    bits.value = int.from_bytes(data, "big")
+    bits.length = len(data) * 8
+    return MODE_BYTE, len(data), bits
+
+
+def _reed_solomon(data, degree):
+    """Returns the degree error correction codewords of data"""
+    divisor = _divisor(degree)
+    result = [0] * degree
+    for b in data:
+        factor = b ^ result.pop(0)
+        result.append(0)
+        if factor:
+            log = _LOG[factor]
+            for i, coef in enumerate(divisor):
+                result[i] ^= _EXP[_LOG[coef] + log]
+    return result
+
+
+@lru_cache(maxsize=None)
+def _divisor(degree):
+    """Generator polynomial coefficients (without the leading 1) of the given degree"""
+    result = [0] * (degree - 1) + [1]
+    root = 1
+    for _ in range(degree):
+        for j in range(degree):
+            result[j] = _EXP[_LOG[result[j]] + _LOG[root]] if result[j] else 0
+            if j + 1 < degree:
+                result[j] ^= result[j + 1]
+        root = _EXP[_LOG[root] + 1]
+    return tuple(result)
+
+
+def _codewords(data, version, ec):
+    """Splits data into blocks, adds error correction and interleaves them"""
+    i = _EC_INDEX[ec]
+    blocks_count = _NUM_BLOCKS[i][version]
+    ecc_len = _ECC_CODEWORDS_PER_BLOCK[i][version]
+    raw = _raw_modules(version) // 8
+    short_blocks = blocks_count - raw % blocks_count
+    short_len = raw // blocks_count
+    blocks = []
+    k = 0
+    for b in range(blocks_count):
+        n = short_len - ecc_len + (0 if b < short_blocks else 1)
+        block = data[k:k + n]
+        k += n
+        ecc = _reed_solomon(block, ecc_len)
+        if b < short_blocks:
+            block = block + [0]
+        blocks.append(block + ecc)
+    result = []
+    for j in range(len(blocks[0])):
+        for b, block in enumerate(blocks):
+            # the padding of short blocks is skipped
+            if j != short_len - ecc_len or b >= short_blocks:
+                result.append(block[j])
+    return result
+
+
+def _alignment_positions(version, size):
+    if version == 1:
+        return []
+    count = version // 7 + 2
+    step = (version * 8 + count * 3 + 5) // (count * 4 - 4) * 2
+    return [6] + sorted(size - 7 - i * step for i in range(count - 1))
+
+
+class _Matrix(object):
+
+    def __init__(self, version):
+        self.version = version
+        self.size = size = version * 4 + 17
+        self.modules = [bytearray(size) for _ in range(size)]
+        self.function = [bytearray(size) for _ in range(size)]
+        # rows as ints with the bits of the data modules set, see draw_codewords
+        self.data = None
+
+    def set(self, x, y, dark):
+        self.modules[y][x] = 1 if dark else 0
+        self.function[y][x] = 1
+
+    def draw_function_patterns(self):
+        size = self.size
+        for i in range(size):
+            self.set(6, i, i % 2 == 0)
+            self.set(i, 6, i % 2 == 0)
+        for cx, cy in ((3, 3), (size - 4, 3), (3, size - 4)):
+            for dy in range(-4, 5):
+                for dx in range(-4, 5):
+                    x, y = cx + dx, cy + dy
+                    if 0 <= x < size and 0 <= y < size:
+                        self.set(x, y, max(abs(dx), abs(dy)) not in (2, 4))
+        positions = _alignment_positions(self.version, size)
+        last = len(positions) - 1
+        for i, cx in enumerate(positions):
+            for j, cy in enumerate(positions):
+                if (i, j) in ((0, 0), (0, last), (last, 0)):
+                    continue
+                for dy in range(-2, 3):
+                    for dx in range(-2, 3):
+                        self.set(cx + dx, cy + dy, max(abs(dx), abs(dy)) != 1)
+        # reserve the format areas, drawn with the mask
+        self.draw_format(0, 0)
+        if self.version >= 7:
+            rem = self.version
+            for _ in range(12):
+                rem = (rem << 1) ^ ((rem >> 11) * 0x1F25)
+            bits = self.version << 12 | rem
+            for i in range(18):
+                dark = (bits >> i) & 1
+                a, b = size - 11 + i % 3, i // 3
+                self.set(a, b, dark)
+                self.set(b, a, dark)
+
+    def draw_format(self, ec_format, mask):
+        data = ec_format << 3 | mask
+        rem = data
+        for _ in range(10):
+            rem = (rem << 1) ^ ((rem >> 9) * 0x537)
+        bits = (data << 10 | rem) ^ 0x5412
+        size = self.size
+        for i in range(6):
+            self.set(8, i, (bits >> i) & 1)
+        self.set(8, 7, (bits >> 6) & 1)
+        self.set(8, 8, (bits >> 7) & 1)
+        self.set(7, 8, (bits >> 8) & 1)
+        for i in range(9, 15):
+            self.set(14 - i, 8, (bits >> i) & 1)
+        for i in range(8):
+            self.set(size - 1 - i, 8, (bits >> i) & 1)
+        for i in range(8, 15):
+            self.set(8, size - 15 + i, (bits >> i) & 1)
+        self.set(8, size - 8, True)
+
+    def draw_codewords(self, codewords):
+        size = self.size
+        total = len(codewords) * 8
+        i = 0
+        right = size - 1
+        while right >= 1:
+            if right == 6:
+                right = 5
+            upward = (right + 1) & 2 == 0
+            for vert in range(size):
+                y = size - 1 - vert if upward else vert
+                row = self.modules[y]
+                function = self.function[y]
+                for x in (right, right - 1):
+                    if not function[x] and i < total:
+                        row[x] = (codewords[i >> 3] >> (7 - (i & 7))) & 1
+                        i += 1
+            right -= 2
+        self.data = [~_to_int(row) for row in self.function]
+
+    def masked(self, mask):
+        """Returns the rows with mask applied to all non-function modules, as bytes and as ints"""
+        size = self.size
+        values = [_to_int(row) ^ (pattern & data)
+                  for row, pattern, data in zip(self.modules, _mask_pattern(mask, size), self.data)]
+        return [_to_row(value, size) for value in values], values
+
+
+_MASKS = (
+    lambda x, y: (x + y) % 2 == 0,
+    lambda x, y: y % 2 == 0,
+    lambda x, y: x % 3 == 0,
+    lambda x, y: (x + y) % 3 == 0,
+    lambda x, y: (x // 3 + y // 2) % 2 == 0,
+    lambda x, y: x * y % 2 + x * y % 3 == 0,
+    lambda x, y: (x * y % 2 + x * y % 3) % 2 == 0,
+    lambda x, y: ((x + y) % 2 + x * y % 3) % 2 == 0,
+)
+
+_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+_MODULES = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def _to_int(row):
+    """Row of modules (0/1 bytes) as int, leftmost module is the most significant bit"""
+    return int(bytes(row).translate(_DIGITS), 2)
+
+
+def _to_row(value, size):
+    return format(value, "0{0}b".format(size)).encode("ascii").translate(_MODULES)
+
+
+@lru_cache(maxsize=None)
+def _mask_pattern(mask, size):
+    """Rows (as ints) of the modules mask flips (ignoring function patterns)"""
+    condition = _MASKS[mask]
+    return tuple(_to_int(bytes(1 if condition(x, y) else 0 for x in range(size))) for y in range(size))
+
+
+_RUNS = re.compile(b"\x00{5,}|\x01{5,}")
+_FINDER_LIKE = (b"\x01\x00\x01\x01\x01\x00\x01\x00\x00\x00\x00", b"\x00\x00\x00\x00\x01\x00\x01\x01\x01\x00\x01")
+
+
+def _penalty(rows, values):
+    """Penalty score of a masked symbol given as rows of bytes and of ints (lower is better)"""
+    size = len(rows)
+    joined = b"".join(rows)
+    # rows and columns, separated so runs and patterns don't continue on the next line
+    lines = b"\x02".join(rows + [joined[x::size] for x in range(size)])
+    # runs of 5 or more modules of the same color
+    score = sum(run.end() - run.start() - 2 for run in _RUNS.finditer(lines))
+    for pattern in _FINDER_LIKE:
+        score += 40 * lines.count(pattern)
+    # 2 x 2 blocks of the same color: the module equals its right and lower neighbour and
+    # the lower one its right neighbour
+    mask = (1 << (size - 1)) - 1
+    for a, b in zip(values, values[1:]):
+        same = ~((a ^ (a >> 1)) | (b ^ (b >> 1)) | ((a ^ b) >> 1)) & mask
+        score += 3 * bin(same).count("1")
+    dark = joined.count(1)
+    total = size * size
+    score += ((abs(dark * 20 - total * 10) + total - 1) // total - 1) * 10
+    return score
+
+
+def _version_for(mode, count, bits, ec):
+    for version in range(1, 41):
+        count_bits = _COUNT_BITS[mode][0 if version <= 9 else 1 if version <= 26 else 2]
+        if count >= 1 << count_bits:
+            continue
+        if 4 + count_bits + bits.length <= _data_codewords(version, ec) * 8:
+            return version, count_bits
+    raise ValueError("data too long for a QR code")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def matrix(data, ec=QR_EC_M, mask=None):
+    """Returns the module rows (tuple of bytes, 1 = dark) of the smallest QR code holding data
+    data is a str (numeric / alphanumeric mode if possible, else UTF-8) or bytes
+    mask 0..7 forces a mask pattern, by default the one with the lowest penalty is used"""
+    if ec not in _EC_INDEX:
+        raise ValueError("ec must be one of the QR_EC_* constants")
+    mode, count, bits = _segment(data)
+    version, count_bits = _version_for(mode, count, bits, ec)
+
+    capacity = _data_codewords(version, ec) * 8
+    buffer = _Bits()
+    buffer.append(mode, 4)
+    buffer.append(count, count_bits)
+    buffer.append(bits.value, bits.length)
+    buffer.append(0, min(4, capacity - buffer.length))
+    buffer.append(0, -buffer.length % 8)
+    value = buffer.value.to_bytes(buffer.length // 8, "big")
+    pad = (capacity - buffer.length) // 8
+    codewords = list(value) + [0xEC, 0x11] * (pad // 2) + [0xEC] * (pad % 2)
+
+    m = _Matrix(version)
+    m.draw_function_patterns()
+    m.draw_codewords(_codewords(codewords, version, ec))
+    best = None
+    for candidate in range(8) if mask is None else (mask,):
+        m.draw_format(_EC_FORMAT[ec], candidate)
+        rows, values = m.masked(candidate)
+        score = _penalty(rows, values) if mask is None else 0
+        if best is None or score < best[0]:
+            best = (score, rows)
+    return tuple(bytes(row) for row in best[1])
+
+
+@lru_cache(maxsize=16)
+def _expansion(scale):
+    """Maps 8 modules (one byte, MSB left) to their 8 * scale dots as int"""
+    table = []
+    for value in range(256):
+        dots = 0
+        for bit in range(7, -1, -1):
+            module = (value >> bit) & 1
+            dots = (dots << scale) | (((1 << scale) - 1) if module else 0)
+        table.append(dots)
+    return table
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def raster(data, scale=4, ec=QR_EC_M, center=True, width=PRINTER_WIDTH, quiet_zone=QUIET_ZONE):
+    """Returns (xL, xH, yL, yH, d) of the QR code for `print_raster_bit_image`
+    Each module is scale x scale dots, quiet_zone modules of white surround the symbol."""
+    rows = matrix(data, ec)
+    count = len(rows)
+    dots = (count + 2 * quiet_zone) * scale
+    if dots > width:
+        raise ValueError("QR code of {0} dots doesn't fit into {1} dots, use a smaller scale".format(dots, width))
+    line_bytes = width // 8 if center else -(-dots // 8)
+    left = (line_bytes * 8 - dots) // 2 if center else 0
+    # symbol rows are padded to whole bytes of modules on the right before the expansion
+    padding = -count % 8
+    groups = (count + padding) // 8
+    shift = line_bytes * 8 - left - (quiet_zone + count) * scale
+    table = _expansion(scale)
+    blank = bytes(line_bytes) * (quiet_zone * scale)
+    parts = [blank]
+    for row in rows:
+        modules = int(row.translate(_DIGITS), 2) << padding
+        expanded = 0
+        for i in range(groups - 1, -1, -1):
+            expanded = (expanded << (8 * scale)) | table[(modules >> (8 * i)) & 0xFF]
+        parts.append(((expanded >> padding * scale) << shift).to_bytes(line_bytes, "big") * scale)
+    parts.append(blank)
+    return (line_bytes % 256, line_bytes // 256, dots % 256, dots // 256, b"".join(parts))
+
+
+def native_commands(data, scale=4, ec=QR_EC_M):
+    """Returns the GS ( k commands which store and print data as QR code (model 2) on printers
+    with QR support in the firmware, scale is the module size in dots (1..16)"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    n = len(data) + 3
+    return b"".join((
+        bytes((0x1D, 0x28, 0x6B, 4, 0, 49, 65, 50, 0)),
+        bytes((0x1D, 0x28, 0x6B, 3, 0, 49, 67, scale)),
+        bytes((0x1D, 0x28, 0x6B, 3, 0, 49, 69, ec)),
+        bytes((0x1D, 0x28, 0x6B, n % 256, n // 256, 49, 80, 48)) + data,
+        bytes((0x1D, 0x28, 0x6B, 3, 0, 49, 81, 48)),
+    ))
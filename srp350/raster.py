@@ -0,0 +1,157 @@
+"""Vectorized rasterization of PIL images for `print_raster_bit_image`
+
+Alpha compositing onto white, greyscale conversion, dithering and bit packing are done with
+NumPy on the whole pixel array. The result has the same layout as
+`SRP350.generate_image_data`: [xL, xH, yL, yH, d] with d being bytes.
+
+Error diffusion (Floyd-Steinberg) is inherently serial, for it the composited NumPy array
+is handed to PIL's C implementation instead of a Python loop.
+
+`bands` splits such raster data for `SRP350.print_raster_bands`: runs of blank rows become
+paper feeds, the remaining rows are grouped into bands cropped to their inked columns.
+"""
+
+from collections import namedtuple
+
+from PIL import Image, ImageOps
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PRINTER_WIDTH = 512
+
+DITHER_THRESHOLD = 0
+DITHER_BAYER_4X4 = 1
+DITHER_BAYER_8X8 = 2
+DITHER_FLOYD_STEINBERG = 3
+
+# rows per GS v 0 band, firmware limits yH to 0..8 (2303 rows)
+DEFAULT_BAND_ROWS = 256
+# shorter runs of blank rows stay in their band, a new band costs a GS v 0 and GS L header
+MIN_BLANK_ROWS = 4
+
+# top row, left byte, width in bytes, rows and the cropped rows of a band
+Band = namedtuple("Band", "top left width rows data")
+
+
+def _bayer(n):
+    """Returns the n x n Bayer threshold matrix (n is a power of 2) scaled to 0..255"""
+    m = np.zeros((1, 1), dtype=np.int32)
+    while m.shape[0] < n:
+        m = np.block([[4 * m, 4 * m + 2], [4 * m + 3, 4 * m + 1]])
+    return (((m * 2 + 1) * 255) // (2 * n * n)).astype(np.uint8)
+
+
+def fit_width(image, width=PRINTER_WIDTH):
+    """Scales image down (keeping the aspect ratio) if it's wider than width"""
+    if image.size[0] > width:
+        height = int(image.size[1] / (image.size[0] / width))
+        image = image.resize((width, height), Image.LANCZOS)
+    return image
+
+
+def ink(image):
+    """Returns the ink density (0 = white, 255 = black) of image as uint8 array
+    Transparent pixels are composited onto white paper."""
+    if np is None:
+        raise ImportError("numpy is required for the vectorized rasterizer")
+    if "A" not in image.getbands() and "transparency" not in image.info:
+        return 255 - np.asarray(image.convert("L"), dtype=np.uint8)
+    rgba = np.asarray(image.convert("RGBA"), dtype=np.uint32)
+    # same weights as PIL's "L" conversion
+    luma = (rgba[..., 0] * 299 + rgba[..., 1] * 587 + rgba[..., 2] * 114 + 500) // 1000
+    return ((255 - luma) * rgba[..., 3] // 255).astype(np.uint8)
+
+
+def dither(density, mode=DITHER_FLOYD_STEINBERG):
+    """Converts an ink density array into a boolean array (True = black dot)"""
+    if mode == DITHER_THRESHOLD:
+        return density >= 128
+    if mode in (DITHER_BAYER_4X4, DITHER_BAYER_8X8):
+        matrix = _bayer(4 if mode == DITHER_BAYER_4X4 else 8)
+        h, w = density.shape
+        n = matrix.shape[0]
+        tiled = np.tile(matrix, (-(-h // n), -(-w // n)))[:h, :w]
+        return density > tiled
+    if mode == DITHER_FLOYD_STEINBERG:
+        return np.asarray(Image.fromarray(density, "L").convert("1"), dtype=bool)
+    raise ValueError("unknown dither mode {0}".format(mode))
+
+
+def bitmap(image, dither_mode=None):
+    """Returns image as pil image in mode "1" where set pixels are black dots
+    Without dither_mode PIL's conversion chain (with Floyd-Steinberg dithering) is used."""
+    if dither_mode is not None:
+        return Image.fromarray(dither(ink(image), dither_mode))
+    img_original = image.convert("RGBA")
+    im = Image.new("RGB", img_original.size, (255, 255, 255))
+    im.paste(img_original, mask=img_original.split()[3])
+    # Convert down to greyscale
+    im = im.convert("L")
+    # Invert: Only works on 'L' images
+    im = ImageOps.invert(im)
+    # Pure black and white
+    return im.convert("1")
+
+
+def pack(bits, center=True, width=PRINTER_WIDTH):
+    """Packs a boolean array into raster bytes, returns [xL, xH, yL, yH, d]"""
+    height, w = bits.shape
+    if center and w < width:
+        left = (width - w) // 2
+        bits = np.pad(bits, ((0, 0), (left, width - w - left)))
+    x = -(-bits.shape[1] // 8)
+    d = np.packbits(bits, axis=1).tobytes()
+    return [x % 256, x // 256, height % 256, height // 256, d]
+
+
+def rasterize(image, center=True, dither_mode=DITHER_FLOYD_STEINBERG, width=PRINTER_WIDTH):
+    """generates data for `print_raster_bit_image` from a pil image object"""
+    image = fit_width(image, width)
+    return pack(dither(ink(image), dither_mode), center=center, width=width)
+
+
+def bands(xL, xH, yL, yH, d, max_rows=DEFAULT_BAND_ROWS, min_blank=MIN_BLANK_ROWS):
+    """Splits the raster data of `print_raster_bit_image` into a list of `Band`
+    Runs of at least min_blank blank rows are left out (the caller feeds over them), a band
+    has at most max_rows rows and is cropped to the bytes its rows have ink in."""
+    width = xL + xH * 256
+    height = yL + yH * 256
+    view = memoryview(d)
+    result = []
+    top = None
+    left = right = 0
+    blank = 0
+
+    def close(bottom):
+        rows = view[top * width:bottom * width]
+        if left == 0 and right == width:
+            data = bytes(rows)
+        else:
+            data = b"".join(rows[i:i + width][left:right] for i in range(0, len(rows), width))
+        result.append(Band(top, left, right - left, bottom - top, data))
+
+    for y in range(height):
+        row = bytes(view[y * width:(y + 1) * width])
+        start = width - len(row.lstrip(b"\0"))
+        if start == width:
+            blank += 1
+            if top is not None and blank == min_blank:
+                close(y + 1 - blank)
+                top = None
+            continue
+        end = len(row.rstrip(b"\0"))
+        if top is not None and y + 1 - top > max_rows:
+            # the rows between the band's end and y are blank
+            close(min(y, top + max_rows))
+            top = None
+        if top is None:
+            top, left, right = y, start, end
+        else:
+            left, right = min(left, start), max(right, end)
+        blank = 0
+    if top is not None:
+        close(height - blank)
+    return result
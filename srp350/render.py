@@ -0,0 +1,499 @@
+"""Offline renderer for decoded ESC/POS streams
+
+`Renderer` draws the commands of `srp350.decoder` onto a pil image at 180 DPI (512 dots wide),
+so receipts can be compared against golden images without a printer.
+Supported are fonts A (12 x 24) and B (9 x 17), character size, emphasized/double-strike,
+underline, inverse, justification, line spacing, code pages and international character sets,
+tabs, left margin, absolute/relative positions, feeds, cuts, raster (GS v 0), column (ESC *),
+downloaded and NV bit images, barcodes, QR codes (GS ( k) and page mode.
+Glyphs are drawn with PIL's default font, so text matches the layout but not the exact shapes
+of the printer's fonts.
+
+    image = render(printer.data)
+    image.save("receipt.png")
+"""
+
+from PIL import Image, ImageDraw, ImageFont
+
+from . import qr
+from . import barcode
+from .decoder import decode, barcode_data
+from .encoding import CODECS, INTERNATIONAL_CHARSETS, _INTERNATIONAL_CODES
+from .state import print_mode, digit
+
+PAPER_WIDTH = 512
+DPI = 180
+
+FONTS = {0: (12, 24), 1: (9, 17)}
+DEFAULT_LINE_SPACING = 30
+TAB_WIDTH = 8
+
+_INVERT = bytes(255 - i for i in range(256))
+_QR_SHADES = bytes.maketrans(b"\x00\x01", b"\xff\x00")
+
+
+def bitmap_from_rows(width_bytes, height, data):
+    """Returns an "L" image (black = 0) of row-major bit image data (1 = black dot)"""
+    im = Image.frombytes("1", (width_bytes * 8, height), bytes(data).translate(_INVERT))
+    return im.convert("L")
+
+
+def bitmap_from_columns(width, height_bytes, data):
+    """Returns an "L" image of column-major bit image data (each column top to bottom, MSB first)"""
+    im = Image.frombytes("1", (height_bytes * 8, width), bytes(data).translate(_INVERT))
+    return im.transpose(Image.TRANSPOSE).convert("L")
+
+
+class _Glyphs(object):
+    """Renders and caches character bitmaps"""
+
+    def __init__(self):
+        self._fonts = {}
+        self._cache = {}
+
+    def _font(self, height):
+        font = self._fonts.get(height)
+        if font is None:
+            try:
+                font = ImageFont.load_default(size=height)
+            except TypeError:
+                font = ImageFont.load_default()
+            self._fonts[height] = font
+        return font
+
+    def get(self, char, font, bold, wmul, hmul):
+        key = (char, font, bold, wmul, hmul)
+        glyph = self._cache.get(key)
+        if glyph is None:
+            w, h = FONTS[font]
+            im = Image.new("L", (w, h), 255)
+            if char.strip():
+                draw = ImageDraw.Draw(im)
+                f = self._font(int(h * 0.8))
+                draw.text((w / 2, h * 0.8), char, font=f, fill=0, anchor="ms")
+                if bold:
+                    draw.text((w / 2 + 1, h * 0.8), char, font=f, fill=0, anchor="ms")
+            if wmul > 1 or hmul > 1:
+                im = im.resize((w * wmul, h * hmul), Image.NEAREST)
+            glyph = self._cache[key] = im
+        return glyph
+
+
+class Renderer(object):
+
+    def __init__(self, width=PAPER_WIDTH, barcode_renderer=None):
+        """width is the paper width in dots
+        barcode_renderer(system, data, module_width, height) may return an "L" image of the bars,
+        by default they are drawn with `srp350.barcode`"""
+        self.width = width
+        self.barcode_renderer = barcode_renderer
+        self.glyphs = _Glyphs()
+        self._cells = {}
+        self.canvas = Image.new("L", (width, 1024), 255)
+        self.y = 0
+        self.nv_images = {}
+        self.downloaded = None
+        self.reset()
+
+    def reset(self):
+        """ESC @"""
+        self.font = 0
+        self.bold = False
+        self.underline = 0
+        self.inverse = False
+        self.wmul = 1
+        self.hmul = 1
+        self.justification = 0
+        self.left_margin = 0
+        self.line_spacing = DEFAULT_LINE_SPACING
+        self.right_spacing = 0
+        self.codepage = 0
+        self.charset = 0
+        self.hri_position = 0
+        self.hri_font = 0
+        self.barcode_height = 162
+        self.barcode_width = 3
+        self.qr_size = 3
+        self.qr_ec = qr.QR_EC_L
+        self.qr_data = b""
+        self.page = None
+        self.line = []
+        self.x = 0
+        self._decode_cache = {}
+
+    # output
+
+    def _ensure(self, height):
+        if height > self.canvas.size[1]:
+            canvas = Image.new("L", (self.width, max(height, self.canvas.size[1] * 2)), 255)
+            canvas.paste(self.canvas, (0, 0))
+            self.canvas = canvas
+
+    def image(self):
+        """Returns the rendered paper as "1" image"""
+        self.flush_line()
+        return self.canvas.crop((0, 0, self.width, max(1, self.y))).convert("1")
+
+    # lines
+
+    def _place(self, im, advance=None):
+        """Adds a bitmap at the current x position of the line"""
+        self.line.append((self.x, im))
+        self.x += im.size[0] if advance is None else advance
+
+    def flush_line(self, feed=True):
+        """Prints the current line and feeds by the line spacing (at least the line height)"""
+        if not self.line and not feed:
+            return
+        height = max([im.size[1] for _, im in self.line] or [0])
+        width = max([x + im.size[0] for x, im in self.line] or [0])
+        area_width = self.page["canvas"].size[0] if self.page else self.width
+        # GS L applies in standard mode only
+        shift = 0 if self.page else min(self.left_margin, self.width)
+        area_width -= shift
+        if self.justification == 1:
+            shift += max(0, (area_width - width) // 2)
+        elif self.justification == 2:
+            shift += max(0, area_width - width)
+        if self.page is not None:
+            target = self.page["canvas"]
+            base = max(self.page["y"], height)
+            self.page["y"] = base
+        else:
+            target = None
+            base = self.y + height
+            self._ensure(base + max(self.line_spacing, height))
+        for x, im in self.line:
+            pos = (x + shift, base - im.size[1])
+            (target or self.canvas).paste(im, pos)
+        self.line = []
+        self.x = 0
+        if feed:
+            self.feed(max(self.line_spacing, height) if self.page is None else self.line_spacing)
+        elif self.page is None:
+            self.y = base
+
+    def feed(self, dots):
+        if self.page is not None:
+            self.page["y"] += dots
+        else:
+            self._ensure(self.y + dots)
+            self.y += dots
+
+    # text
+
+    def _decode_text(self, data):
+        key = (self.codepage, self.charset)
+        table = self._decode_cache.get(key)
+        if table is None:
+            codec = CODECS.get(self.codepage, "cp437")
+            table = [bytes((b,)).decode(codec, errors="replace") for b in range(256)]
+            if self.charset:
+                for code, char in zip(_INTERNATIONAL_CODES, INTERNATIONAL_CHARSETS.get(self.charset, "")):
+                    table[code] = char
+            table = self._decode_cache[key] = table
+        return [table[b] for b in data]
+
+    def _cell(self, char):
+        """Returns the bitmap of char in the current style, including spacing, underline and inverse"""
+        key = (char, self.font, self.bold, self.wmul, self.hmul, self.underline, self.inverse, self.right_spacing)
+        cell = self._cells.get(key)
+        if cell is None:
+            w, h = FONTS[self.font]
+            glyph = self.glyphs.get(char, self.font, self.bold, self.wmul, self.hmul)
+            advance = (w + self.right_spacing) * self.wmul
+            cell = Image.new("L", (advance, h * self.hmul), 255)
+            cell.paste(glyph, (0, 0))
+            if self.underline:
+                ImageDraw.Draw(cell).rectangle(
+                    (0, h * self.hmul - self.underline, advance - 1, h * self.hmul - 1), fill=0)
+            if self.inverse:
+                cell = Image.eval(cell, lambda v: 255 - v)
+            self._cells[key] = cell
+        return cell
+
+    def text(self, data):
+        limit = self.page["canvas"].size[0] if self.page else self.width
+        for char in self._decode_text(data):
+            cell = self._cell(char)
+            if self.x + cell.size[0] > limit:
+                self.flush_line()
+            self._place(cell)
+
+    def tab(self):
+        w = FONTS[self.font][0] * self.wmul
+        step = TAB_WIDTH * FONTS[0][0]
+        self.x = (self.x // step + 1) * step
+        if self.x + w > self.width:
+            self.flush_line()
+
+    # graphics
+
+    def raster(self, m, width_bytes, height, data):
+        self.flush_line(feed=False)
+        im = bitmap_from_rows(width_bytes, height, data)
+        wmul = 2 if m in (1, 3, 49, 51) else 1
+        hmul = 2 if m in (2, 3, 50, 51) else 1
+        if wmul > 1 or hmul > 1:
+            im = im.resize((im.size[0] * wmul, im.size[1] * hmul), Image.NEAREST)
+        self._place(im)
+        self.flush_line(feed=False)
+
+    def column_image(self, m, width, data):
+        dots = 3 if m in (32, 33) else 1
+        im = bitmap_from_columns(width, dots, data)
+        if m in (0, 32):
+            im = im.resize((width * 2, im.size[1]), Image.NEAREST)
+        if m in (0, 1):
+            # 8-dot modes have a vertical density of 60 DPI
+            im = im.resize((im.size[0], 24), Image.NEAREST)
+        self._place(im)
+
+    def column_bitmap(self, x, y, data, m):
+        """Prints a downloaded or NV image (x, y in units of 8 dots) in the mode m"""
+        im = bitmap_from_columns(x * 8, y, data)
+        wmul = 2 if m in (1, 3, 49, 51) else 1
+        hmul = 2 if m in (2, 3, 50, 51) else 1
+        if wmul > 1 or hmul > 1:
+            im = im.resize((im.size[0] * wmul, im.size[1] * hmul), Image.NEAREST)
+        return im
+
+    def barcode(self, system, data):
+        self.flush_line(feed=False)
+        text = data.decode("ascii", errors="replace")
+        bars = None
+        if self.barcode_renderer is not None:
+            bars = self.barcode_renderer(system, text, self.barcode_width, self.barcode_height)
+        if bars is None:
+            try:
+                code = barcode.from_native(system, data)
+            except (ValueError, UnicodeDecodeError):
+                code = None
+            if code is not None and code.modules:
+                line = Image.frombytes("L", (len(code.modules), 1), code.modules.translate(_QR_SHADES))
+                bars = line.resize((len(code.modules) * self.barcode_width, self.barcode_height), Image.NEAREST)
+                # with check digits
+                text = code.hri or text
+        if bars is None:
+            # invalid data: hatched placeholder with the estimated width
+            width = min(self.width, (len(text) * 11 + 35) * self.barcode_width)
+            bars = Image.new("L", (width, self.barcode_height), 255)
+            draw = ImageDraw.Draw(bars)
+            for x in range(0, width, 2 * self.barcode_width):
+                draw.rectangle((x, 0, x + self.barcode_width - 1, self.barcode_height - 1), fill=0)
+        if self.hri_position in (1, 3):
+            self._hri(text)
+        self._place(bars)
+        self.flush_line(feed=False)
+        if self.hri_position in (2, 3):
+            self._hri(text)
+
+    def symbol(self, data):
+        """GS ( k: 2D symbol functions, QR codes (cn 49) are drawn with `srp350.qr`"""
+        if len(data) < 2 or data[0] != 49:
+            return
+        fn = data[1]
+        if fn == 67:
+            self.qr_size = data[2]
+        elif fn == 69:
+            self.qr_ec = data[2]
+        elif fn == 80:
+            self.qr_data = bytes(data[3:])
+        elif fn == 81 and self.qr_data:
+            rows = qr.matrix(self.qr_data, self.qr_ec)
+            im = Image.frombytes("L", (len(rows), len(rows)), b"".join(rows).translate(_QR_SHADES))
+            self.flush_line(feed=False)
+            self._place(im.resize((len(rows) * self.qr_size,) * 2, Image.NEAREST))
+            self.flush_line(feed=False)
+
+    def _hri(self, text):
+        font, bold, wmul, hmul = self.font, self.bold, self.wmul, self.hmul
+        self.font, self.bold, self.wmul, self.hmul = self.hri_font, False, 1, 1
+        self.text(text.encode("ascii", errors="replace"))
+        self.flush_line(feed=False)
+        self.font, self.bold, self.wmul, self.hmul = font, bold, wmul, hmul
+
+    def cut(self):
+        self.flush_line(feed=False)
+        self._ensure(self.y + 12)
+        draw = ImageDraw.Draw(self.canvas)
+        for x in range(0, self.width, 16):
+            draw.line((x, self.y + 6, x + 7, self.y + 6), fill=0)
+        self.y += 12
+
+    # page mode
+
+    def page_mode(self):
+        self.flush_line(feed=False)
+        self.page = {"x": 0, "y": 0, "width": self.width, "height": 1662, "direction": 0, "blocks": [],
+                     "canvas": Image.new("L", (self.width, 1662), 255)}
+
+    def page_area(self, x, y, width, height):
+        self.flush_line(feed=False)
+        self._store_area()
+        self.page.update(x=x, y=0, area_y=y, width=width, height=height)
+        self._new_area()
+
+    def page_direction(self, direction):
+        self.flush_line(feed=False)
+        self._store_area()
+        self.page["direction"] = direction
+        self.page["y"] = 0
+        self._new_area()
+
+    def _new_area(self):
+        width, height = max(1, self.page["width"]), max(1, self.page["height"])
+        if self.page["direction"] in (1, 3):
+            # the area is printed rotated, text runs along its height
+            width, height = height, width
+        self.page["canvas"] = Image.new("L", (width, height), 255)
+
+    def _store_area(self):
+        page = self.page
+        canvas = page["canvas"]
+        if Image.eval(canvas, lambda v: 255 - v).getbbox() is None:
+            return
+        rotation = {0: None, 1: Image.ROTATE_90, 2: Image.ROTATE_180, 3: Image.ROTATE_270}[page["direction"]]
+        if rotation is not None:
+            canvas = canvas.transpose(rotation)
+        page["blocks"].append((page["x"], page.get("area_y", 0), canvas))
+
+    def print_page(self, end_page_mode):
+        self.flush_line(feed=False)
+        self._store_area()
+        page = self.page
+        height = max([y + im.size[1] for _, y, im in page["blocks"]] or [0])
+        self._ensure(self.y + height)
+        for x, y, im in page["blocks"]:
+            mask = Image.eval(im, lambda v: 255 - v)
+            self.canvas.paste(0, (x, self.y + y), mask)
+        self.y += height
+        page["blocks"] = []
+        page["canvas"] = Image.new("L", page["canvas"].size, 255)
+        page["y"] = 0
+        if end_page_mode:
+            self.page = None
+
+    # commands
+
+    def render(self, commands):
+        """Draws decoded commands (see `srp350.decoder.decode`) and returns the image"""
+        for command in commands:
+            self.command(command)
+        return self.image()
+
+    def command(self, c):
+        m = c.mnemonic
+        a = c.args
+        if m == "TEXT":
+            self.text(c.data)
+        elif m in ("LF", "CR"):
+            if m == "LF":
+                self.flush_line()
+        elif m == "HT":
+            self.tab()
+        elif m == "ESC @":
+            self.flush_line(feed=False)
+            self.reset()
+        elif m == "ESC !":
+            mode = print_mode(a[0])
+            self.font = mode["font"]
+            self.bold = bool(mode["emphasize"])
+            self.underline = mode["underline"]
+            self.wmul = (mode["size"] >> 4) + 1
+            self.hmul = (mode["size"] & 0x0F) + 1
+        elif m == "GS !":
+            self.wmul = ((a[0] >> 4) & 0x07) + 1
+            self.hmul = (a[0] & 0x07) + 1
+        elif m == "ESC M":
+            self.font = a[0] & 1
+        elif m in ("ESC E", "ESC G"):
+            self.bold = bool(a[0] & 1)
+        elif m == "ESC -":
+            self.underline = digit(a[0])
+        elif m == "GS B":
+            self.inverse = bool(a[0] & 1)
+        elif m == "ESC a":
+            self.justification = digit(a[0])
+        elif m == "ESC 2":
+            self.line_spacing = DEFAULT_LINE_SPACING
+        elif m == "ESC 3":
+            self.line_spacing = a[0]
+        elif m == "ESC SP":
+            self.right_spacing = a[0]
+        elif m == "ESC R":
+            self.charset = a[0]
+        elif m == "ESC t":
+            self.codepage = a[0]
+        elif m == "ESC $":
+            self.x = a[0] + a[1] * 256
+        elif m == "GS L":
+            self.left_margin = a[0] + a[1] * 256
+        elif m == "ESC \\":
+            offset = a[0] + a[1] * 256
+            self.x = max(0, self.x + (offset - 65536 if offset >= 32768 else offset))
+        elif m == "ESC J":
+            self.flush_line(feed=False)
+            self.feed(a[0])
+        elif m == "ESC d":
+            self.flush_line()
+            self.feed(self.line_spacing * max(0, a[0] - 1))
+        elif m == "GS v 0":
+            self.raster(a[0], a[1] + a[2] * 256, a[3] + a[4] * 256, c.data)
+        elif m == "ESC *":
+            self.column_image(a[0], a[1] + a[2] * 256, c.data)
+        elif m == "GS *":
+            self.downloaded = (a[0], a[1], c.data)
+        elif m == "GS /" and self.downloaded is not None:
+            self._place(self.column_bitmap(self.downloaded[0], self.downloaded[1], self.downloaded[2], a[0]))
+        elif m == "FS q":
+            self.nv_images = {}
+            pos = 0
+            for n in range(1, a[0] + 1):
+                d = c.data
+                x, y = d[pos] + d[pos + 1] * 256, d[pos + 2] + d[pos + 3] * 256
+                self.nv_images[n] = (x, y, d[pos + 4:pos + 4 + x * y * 8])
+                pos += 4 + x * y * 8
+        elif m == "FS p" and a[0] in self.nv_images:
+            self.flush_line(feed=False)
+            x, y, d = self.nv_images[a[0]]
+            self._place(self.column_bitmap(x, y, d, a[1]))
+            self.flush_line(feed=False)
+        elif m == "GS H":
+            self.hri_position = digit(a[0])
+        elif m == "GS f":
+            self.hri_font = a[0] & 1
+        elif m == "GS h":
+            self.barcode_height = a[0]
+        elif m == "GS w":
+            self.barcode_width = a[0]
+        elif m == "GS k":
+            self.barcode(a[0], barcode_data(c))
+        elif m == "GS V":
+            self.cut()
+        elif m == "GS (k":
+            self.symbol(c.data)
+        elif m == "ESC L":
+            self.page_mode()
+        elif m == "ESC W" and self.page is not None:
+            self.page_area(a[0] + a[1] * 256, a[2] + a[3] * 256, a[4] + a[5] * 256, a[6] + a[7] * 256)
+        elif m == "ESC T" and self.page is not None:
+            self.page_direction(digit(a[0]))
+        elif m == "GS $" and self.page is not None:
+            self.flush_line(feed=False)
+            self.page["y"] = a[0] + a[1] * 256
+        elif m == "ESC FF" and self.page is not None:
+            self.print_page(False)
+        elif m == "FF" and self.page is not None:
+            self.print_page(True)
+        elif m == "ESC S" and self.page is not None:
+            self.page = None
+        elif m == "CAN" and self.page is not None:
+            self.line = []
+            self.page["canvas"] = Image.new("L", self.page["canvas"].size, 255)
+
+
+def render(data, **kwargs):
+    """Renders an ESC/POS byte stream (or a list of decoded commands) to a "1" pil image"""
+    commands = decode(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+    return Renderer(**kwargs).render(commands)
@@ -0,0 +1,322 @@
+"""Multi-printer job spooler
+
+Complete jobs (the buffer a `SRP350` builds) are queued per device and written by a bounded
+pool of worker threads. At most one worker writes to a device at a time, so jobs never
+interleave. Within a device queue jobs are ordered by priority (higher first), then FIFO.
+
+    spooler = Spooler(max_workers=4)
+    builder = SRP350(None)
+    builder.println("Hello")
+    builder.cut_paper(CUT_MODE_FEED_AND_CUT, 40)
+    job = spooler.submit("/dev/usb/lp0", builder)
+    job.wait()
+
+With status_interval the spooler keeps a `StatusMonitor` per opened device. Jobs aren't
+written to a printer which reports paper out, cover open or an error: they move to another
+ready port of their port list, or fail with `PrinterNotReady` at once. Jobs for a printer
+which doesn't answer status queries (e.g. busy) move if another port is ready.
+
+    job = spooler.submit(["/dev/usb/lp0", "/dev/usb/lp1"], builder)
+
+`Job.estimate` and `queue_latency` predict print times (see `srp350.estimate`), e.g. to send a
+job to the printer which finishes it first:
+
+    port = min(ports, key=lambda port: spooler.queue_latency(port))
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import SRP350
+from .estimate import estimate, DEFAULT_SPEED
+from .status import StatusMonitor, PrinterNotReady
+
+JOB_QUEUED = 0
+JOB_PRINTING = 1
+JOB_DONE = 2
+JOB_FAILED = 3
+JOB_CANCELLED = 4
+
+
+class Job(object):
+
+    def __init__(self, job_id, ports, data, priority):
+        self.id = job_id
+        self.ports = ports
+        self.port = ports[0]
+        self.data = data
+        self.priority = priority
+        self.state = JOB_QUEUED
+        self.error = None
+
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self._estimate = None
+
+        self._done = threading.Event()
+        # reentrant: cancel finishes the job while holding it
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return "<Job {0} {1} state={2} {3} bytes>".format(self.id, self.port, self.state, len(self.data))
+
+    def cancel(self):
+        """Cancels the job if it's still queued, returns True on success"""
+        with self._lock:
+            if self.state != JOB_QUEUED:
+                return False
+            self._finish(JOB_CANCELLED)
+            return True
+
+    def done(self):
+        return self._done.is_set()
+
+    def estimate(self, speed=DEFAULT_SPEED, baudrate=None):
+        """Returns the `srp350.estimate.Estimate` of the job (computed once per speed and baudrate)"""
+        if self._estimate is None or self._estimate[0] != (speed, baudrate):
+            self._estimate = ((speed, baudrate), estimate(self.data, speed, baudrate))
+        return self._estimate[1]
+
+    def wait(self, timeout=None):
+        """Waits until the job is finished, raises the write error of a failed job
+        Returns False on timeout."""
+        if not self._done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self.state != JOB_QUEUED:
+                return False
+            self.state = JOB_PRINTING
+            self.started = time.monotonic()
+            return True
+
+    def _requeue(self):
+        with self._lock:
+            self.state = JOB_QUEUED
+            self.started = None
+
+    def _finish(self, state, error=None):
+        with self._lock:
+            self.state = state
+            self.error = error
+            self.finished = time.monotonic()
+            self.data = b"" if state != JOB_FAILED else self.data
+        self._done.set()
+
+
+class _Device(object):
+
+    def __init__(self, port):
+        self.port = port
+        self.queue = []
+        self.active = False
+        self.printer = None
+        self.monitor = None
+        # the job being written
+        self.current = None
+
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.jobs_cancelled = 0
+        self.jobs_rerouted = 0
+        self.bytes_written = 0
+        self.busy_time = 0.0
+
+
+class Spooler(object):
+
+    def __init__(self, max_workers=4, printer_factory=SRP350, status_interval=None, status_timeout=0.5):
+        """max_workers bounds the number of devices written concurrently
+        printer_factory(port) creates the `SRP350` used to write to a device
+        status_interval enables status monitoring: seconds between status refreshes of each
+        opened device, status_timeout is the time to wait for a status byte"""
+        self.printer_factory = printer_factory
+        self.status_interval = status_interval
+        self.status_timeout = status_timeout
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="srp350-spooler")
+        self._devices = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._closed = False
+
+    def submit(self, port, data, priority=0):
+        """Queues a job for the printer at port and returns its `Job`
+        port may be a list of ports, the job goes to the ready one with the shortest queue
+        data is a bytes-like object or a `SRP350` whose buffer is detached."""
+        if isinstance(data, SRP350):
+            data = data.detach()
+        ports = list(port) if isinstance(port, (list, tuple)) else [port]
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("spooler is shut down")
+            job = Job(next(self._ids), ports, data, priority)
+            self._enqueue(job, self._route(ports))
+        return job
+
+    def _ready(self, port):
+        """Returns False if the cached status of port says it can't print (unknown is ready)"""
+        device = self._devices.get(port)
+        monitor = device.monitor if device is not None else None
+        return monitor is None or monitor.updated is None or (monitor.responding and not monitor.offline())
+
+    def _route(self, ports):
+        ready = [port for port in ports if self._ready(port)]
+        if not ready:
+            return ports[0]
+        return min(ready, key=lambda port: len(self._devices[port].queue) if port in self._devices else 0)
+
+    def _enqueue(self, job, port):
+        job.port = port
+        device = self._devices.get(port)
+        if self._closed and (device is None or not device.active):
+            # a job moved during shutdown: no worker can be started for it
+            job._finish(JOB_FAILED, RuntimeError("spooler is shut down"))
+            return
+        if device is None:
+            device = self._devices[port] = _Device(port)
+        heapq.heappush(device.queue, (-job.priority, job.id, job))
+        if not device.active:
+            device.active = True
+            self._executor.submit(self._drain, device)
+
+    def queue_depth(self, port):
+        """Number of queued (not cancelled) jobs for port"""
+        with self._lock:
+            device = self._devices.get(port)
+            if device is None:
+                return 0
+            return sum(1 for _, _, job in device.queue if job.state == JOB_QUEUED)
+
+    def queue_latency(self, port, speed=DEFAULT_SPEED, baudrate=None):
+        """Estimated seconds until port has printed its queued jobs (the job being written
+        counts in full)"""
+        with self._lock:
+            device = self._devices.get(port)
+            if device is None:
+                return 0.0
+            jobs = [job for _, _, job in device.queue if job.state == JOB_QUEUED]
+            if device.current is not None and device.current.state == JOB_PRINTING:
+                jobs.append(device.current)
+        return sum((job.estimate(speed, baudrate).duration for job in jobs), 0.0)
+
+    def _next_job(self, device):
+        with self._lock:
+            while device.queue:
+                _, _, job = heapq.heappop(device.queue)
+                if job._start():
+                    device.current = job
+                    return job
+                device.jobs_cancelled += 1
+            device.active = False
+            device.current = None
+            return None
+
+    def _drain(self, device):
+        while True:
+            job = self._next_job(device)
+            if job is None:
+                return
+            try:
+                if device.printer is None:
+                    device.printer = self.printer_factory(device.port)
+                    if self.status_interval is not None:
+                        device.monitor = StatusMonitor(device.printer, self.status_interval, self.status_timeout)
+                        device.monitor.start()
+                if device.monitor is not None and not device.monitor.ready():
+                    if self._reroute(device, job):
+                        continue
+                    if device.monitor.offline():
+                        raise PrinterNotReady(device.port, device.monitor.conditions)
+                device.printer.data = job.data
+                device.printer.send(block=True)
+            except Exception as e:
+                if not isinstance(e, PrinterNotReady):
+                    # drop the printer, a new one is opened for the next job
+                    self._close_printer(device)
+                device.jobs_failed += 1
+                device.busy_time += time.monotonic() - job.started
+                job._finish(JOB_FAILED, e)
+                continue
+            device.jobs_done += 1
+            device.bytes_written += len(job.data)
+            device.busy_time += time.monotonic() - job.started
+            job._finish(JOB_DONE)
+
+    def _reroute(self, device, job):
+        """Moves job to another ready port of its port list, returns False if there is none"""
+        with self._lock:
+            ports = [port for port in job.ports if port != device.port and self._ready(port)]
+            if not ports:
+                return False
+            device.jobs_rerouted += 1
+            job._requeue()
+            self._enqueue(job, self._route(ports))
+            return True
+
+    def _close_printer(self, device):
+        monitor, device.monitor = device.monitor, None
+        if monitor is not None:
+            monitor.stop()
+        printer, device.printer = device.printer, None
+        if printer is not None:
+            try:
+                printer.close()
+            except OSError:
+                pass
+
+    def metrics(self):
+        """Returns throughput and queue metrics per device and in total"""
+        elapsed = time.monotonic() - self._started
+        devices = {}
+        with self._lock:
+            for port, device in self._devices.items():
+                devices[port] = {
+                    "queue_depth": sum(1 for _, _, job in device.queue if job.state == JOB_QUEUED),
+                    "active": device.active,
+                    "jobs_done": device.jobs_done,
+                    "jobs_failed": device.jobs_failed,
+                    "jobs_cancelled": device.jobs_cancelled,
+                    "jobs_rerouted": device.jobs_rerouted,
+                    "status": device.monitor.conditions if device.monitor is not None else None,
+                    "bytes_written": device.bytes_written,
+                    "busy_time": device.busy_time,
+                    "bytes_per_second": device.bytes_written / device.busy_time if device.busy_time else 0.0,
+                }
+        total_bytes = sum(d["bytes_written"] for d in devices.values())
+        return {
+            "devices": devices,
+            "queue_depth": sum(d["queue_depth"] for d in devices.values()),
+            "jobs_done": sum(d["jobs_done"] for d in devices.values()),
+            "jobs_failed": sum(d["jobs_failed"] for d in devices.values()),
+            "bytes_written": total_bytes,
+            "bytes_per_second": total_bytes / elapsed if elapsed else 0.0,
+        }
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """Stops accepting jobs, optionally cancels queued ones and closes all devices"""
+        with self._lock:
+            self._closed = True
+            if cancel_pending:
+                for device in self._devices.values():
+                    for _, _, job in device.queue:
+                        job.cancel()
+        self._executor.shutdown(wait=wait)
+        if wait:
+            for device in self._devices.values():
+                self._close_printer(device)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
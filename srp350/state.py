@@ -0,0 +1,128 @@
+"""Printer state model
+
+`PrinterState` keeps the value of every print setting (font, size, emphasis, underline,
+justification, line spacing, charset, code page, ...) as last sent to the printer.
+When the optimizer of `SRP350` is enabled, setting commands only update the desired state;
+right before the next content command (text, images, feeds, ...) the commands for the
+settings which actually differ from the printer's state are emitted. That drops no-op
+commands (emphasize_mode(1) while already emphasized) and superseded ones
+(emphasize_mode(1) directly followed by emphasize_mode(0)). When two or more of font,
+emphasis, size and underline change and ESC ! can express them, they are sent as one ESC !.
+"""
+
+# settings after ESC @ (initialize_printer), None for line_spacing means default line spacing (ESC 2)
+DEFAULTS = {
+    "font": 0,
+    "emphasize": 0,
+    "double_strike": 0,
+    "underline": 0,
+    "size": 0,
+    "inverse": 0,
+    "justification": 0,
+    "line_spacing": None,
+    "charset": 0,
+    "codepage": 0,
+    "right_spacing": 0,
+    "rotation": 0,
+    "smoothing": 0,
+    "hri_position": 0,
+    "hri_font": 0,
+    "barcode_height": 162,
+    "barcode_width": 3,
+}
+
+# command which sets a setting to the given value
+COMMANDS = {
+    "font": lambda v: bytes((0x1B, 0x4D, v)),
+    "emphasize": lambda v: bytes((0x1B, 0x45, v)),
+    "double_strike": lambda v: bytes((0x1B, 0x47, v)),
+    "underline": lambda v: bytes((0x1B, 0x2D, v)),
+    "size": lambda v: bytes((0x1D, 0x21, v)),
+    "inverse": lambda v: bytes((0x1D, 0x42, v)),
+    "justification": lambda v: bytes((0x1B, 0x61, v)),
+    "line_spacing": lambda v: bytes((0x1B, 0x32)) if v is None else bytes((0x1B, 0x33, v)),
+    "charset": lambda v: bytes((0x1B, 0x52, v)),
+    "codepage": lambda v: bytes((0x1B, 0x74, v)),
+    "right_spacing": lambda v: bytes((0x1B, 0x20, v)),
+    "rotation": lambda v: bytes((0x1B, 0x56, v)),
+    "smoothing": lambda v: bytes((0x1D, 0x62, v)),
+    "hri_position": lambda v: bytes((0x1D, 0x48, v)),
+    "hri_font": lambda v: bytes((0x1D, 0x66, v)),
+    "barcode_height": lambda v: bytes((0x1D, 0x68, v)),
+    "barcode_width": lambda v: bytes((0x1D, 0x77, v)),
+}
+
+
+def digit(n):
+    """Maps the ASCII digit parameters ('0' = 48, '1' = 49, ...) used by some commands to 0, 1, ..."""
+    return n - 48 if n >= 48 else n
+
+
+def print_mode(n):
+    """Returns the settings selected by ESC ! n"""
+    return {
+        "font": n & 1,
+        "emphasize": (n >> 3) & 1,
+        "size": ((n >> 4) & 1) | (((n >> 5) & 1) << 4),
+        "underline": 1 if n & 0x80 else 0,
+    }
+
+
+# the settings ESC ! n sets at once
+PRINT_MODE_KEYS = ("font", "emphasize", "size", "underline")
+
+
+def print_mode_byte(values):
+    """Returns n of the ESC ! n selecting values (font, emphasize, size and underline), None if
+    ESC ! can't express them (larger sizes, 2 dot underline, unknown values)"""
+    font, emphasize, size, underline = (values.get(key) for key in PRINT_MODE_KEYS)
+    if font not in (0, 1) or emphasize not in (0, 1) or underline not in (0, 1) or size not in (0x00, 0x01, 0x10, 0x11):
+        return None
+    return font | emphasize << 3 | (size & 1) << 4 | (size >> 4) << 5 | underline << 7
+
+
+class PrinterState(object):
+
+    def __init__(self):
+        # settings as sent to the printer, missing keys are unknown
+        self.applied = {}
+        # settings which are requested but not sent yet
+        self.pending = {}
+
+    def get(self, key):
+        """Returns the current value of a setting (None if unknown)"""
+        if key in self.pending:
+            return self.pending[key]
+        return self.applied.get(key)
+
+    def apply(self, values):
+        """Records settings which were sent to the printer"""
+        self.applied.update(values)
+
+    def set(self, values):
+        """Requests settings, they are sent by the next `flush`"""
+        self.pending.update(values)
+
+    def reset(self):
+        """The printer was initialized, all settings are back to their defaults"""
+        self.applied = dict(DEFAULTS)
+        self.pending = {}
+
+    def flush(self):
+        """Returns the commands for all pending settings which differ from the printer's state"""
+        out = b""
+        applied = self.applied
+        changed = {key: value for key, value in self.pending.items() if key not in applied or applied[key] != value}
+        self.pending = {}
+        # one ESC ! is shorter than two or more of the separate commands
+        if sum(1 for key in PRINT_MODE_KEYS if key in changed) > 1:
+            n = print_mode_byte({key: changed.get(key, applied.get(key)) for key in PRINT_MODE_KEYS})
+            if n is not None:
+                out += bytes((0x1B, 0x21, n))
+                for key in PRINT_MODE_KEYS:
+                    if key in changed:
+                        applied[key] = changed.pop(key)
+        for key, value in changed.items():
+            out += COMMANDS[key](value)
+            applied[key] = value
+        return out
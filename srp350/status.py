@@ -0,0 +1,189 @@
+"""Real-time status bytes (DLE EOT n)
+
+The printer answers DLE EOT n with one status byte. Bits 1 and 4 are always set and bits 0
+and 7 cleared, the other bits depend on n. `encode` builds the byte from conditions (used by
+the emulator), `decode` turns a byte back into conditions. `StatusMonitor` queries the
+printer out-of-band and caches its conditions.
+
+Conditions:
+* paper_out: paper end detected, printing stopped
+* paper_near_end: paper roll near end sensor
+* cover_open: cover open
+* offline: printer offline (also implied by paper_out, cover_open and errors)
+* feed_button: paper feed button pressed
+* cutter_error: autocutter error
+* unrecoverable_error: unrecoverable error
+* auto_recoverable_error: auto-recoverable error (e.g. head temperature)
+"""
+
+import threading
+import time
+
+STATUS_PRINTER = 1
+STATUS_OFFLINE = 2
+STATUS_ERROR = 3
+STATUS_PAPER = 4
+
+FIXED_BITS = 0x12
+FIXED_MASK = 0x93
+
+# n: ((condition, bits), ...)
+BITS = {
+    STATUS_PRINTER: (("offline", 0x08),),
+    STATUS_OFFLINE: (("cover_open", 0x04), ("feed_button", 0x08), ("paper_out", 0x20), ("error", 0x40)),
+    STATUS_ERROR: (("cutter_error", 0x08), ("unrecoverable_error", 0x20), ("auto_recoverable_error", 0x40)),
+    STATUS_PAPER: (("paper_near_end", 0x0C), ("paper_out", 0x60)),
+}
+
+CONDITIONS = ("paper_out", "paper_near_end", "cover_open", "offline", "feed_button",
+              "cutter_error", "unrecoverable_error", "auto_recoverable_error")
+
+ERRORS = ("cutter_error", "unrecoverable_error", "auto_recoverable_error")
+
+
+def is_offline(conditions):
+    """Returns True if the conditions take the printer offline"""
+    return any(conditions.get(c) for c in ("offline", "paper_out", "cover_open") + ERRORS)
+
+
+def encode(n, conditions):
+    """Returns the status byte for DLE EOT n of the conditions dict"""
+    if n not in BITS:
+        raise ValueError("DLE EOT n must be 1..4, not {0}".format(n))
+    derived = dict(conditions)
+    derived["offline"] = is_offline(conditions)
+    derived["error"] = any(conditions.get(c) for c in ERRORS)
+    value = FIXED_BITS
+    for condition, bits in BITS[n]:
+        if derived.get(condition):
+            value |= bits
+    return value
+
+
+def decode(n, value):
+    """Returns the conditions (dict condition: bool) reported by the status byte of DLE EOT n
+    Raises ValueError if value isn't a status byte."""
+    if n not in BITS:
+        raise ValueError("DLE EOT n must be 1..4, not {0}".format(n))
+    if value & FIXED_MASK != FIXED_BITS:
+        raise ValueError("0x{0:02x} is not a status byte".format(value))
+    # multi-bit fields (paper sensors) count as set if any of their bits is set
+    return {condition: bool(value & bits) for condition, bits in BITS[n]}
+
+
+class PrinterNotReady(IOError):
+    """Raised instead of writing to a printer whose status reports it can't print"""
+
+    def __init__(self, port, conditions):
+        if conditions is None:
+            reason = "no status reply"
+        else:
+            reason = ", ".join(c for c in CONDITIONS if conditions.get(c)) or "offline"
+        IOError.__init__(self, "printer {0} is not ready ({1})".format(port, reason))
+        self.port = port
+        self.conditions = conditions
+
+
+class StatusMonitor(object):
+    """Keeps a cached view of the printer conditions, refreshed by a background thread
+
+    Status replies queue behind data the printer hasn't accepted yet, so a busy printer may
+    not answer in time. An unanswered refresh keeps the last conditions and clears responding.
+
+        monitor = StatusMonitor(printer, interval=1.0)
+        monitor.start()
+        ...
+        if not monitor.ready():
+            print(monitor.conditions)
+    """
+
+    def __init__(self, printer, interval=1.0, timeout=0.5, callback=None):
+        """printer is an `SRP350` with a device
+        interval is the time in seconds between refreshes of the background thread
+        timeout is the time in seconds to wait for each status byte
+        callback(monitor) is called after every refresh which changed the conditions"""
+        self.printer = printer
+        self.interval = interval
+        self.timeout = timeout
+        self.callback = callback
+
+        # dict condition: bool, None until the printer answered
+        self.conditions = None
+        self.responding = False
+        self.updated = None
+        # consecutive refreshes without answer
+        self.failures = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Queries all status bytes, updates and returns the conditions (None if the printer
+        didn't answer)"""
+        conditions = {}
+        try:
+            for n in (STATUS_PRINTER, STATUS_OFFLINE, STATUS_ERROR, STATUS_PAPER):
+                conditions.update(self.printer.query_status(n, self.timeout))
+        except (TimeoutError, ValueError):
+            # no or garbled reply
+            self.responding = False
+            self.failures += 1
+            self.updated = time.monotonic()
+            return None
+        conditions = {c: conditions.get(c, False) for c in CONDITIONS}
+        changed = conditions != self.conditions
+        self.conditions = conditions
+        self.responding = True
+        self.failures = 0
+        self.updated = time.monotonic()
+        if changed and self.callback is not None:
+            self.callback(self)
+        return conditions
+
+    def age(self):
+        """Seconds since the last refresh (None before the first one)"""
+        return None if self.updated is None else time.monotonic() - self.updated
+
+    def _update(self, max_age):
+        if self.updated is None or (max_age is not None and self.age() > max_age):
+            self.refresh()
+
+    def ready(self, max_age=None):
+        """Returns True if the printer answered and its conditions allow printing
+        The status is refreshed first if there was no refresh yet or it's older than max_age
+        seconds."""
+        self._update(max_age)
+        return self.responding and not is_offline(self.conditions)
+
+    def offline(self, max_age=None):
+        """Returns True if the last known conditions say the printer can't print"""
+        self._update(max_age)
+        return self.conditions is not None and is_offline(self.conditions)
+
+    def check(self, max_age=None):
+        """Raises `PrinterNotReady` if the printer isn't ready"""
+        if not self.ready(max_age):
+            raise PrinterNotReady(self.printer.port, self.conditions if self.responding else None)
+
+    def start(self):
+        """Starts refreshing in the background"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="srp350-status", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except OSError:
+                # device gone
+                self.responding = False
+                self.failures += 1
+            self._stop.wait(self.interval)
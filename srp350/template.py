@@ -0,0 +1,132 @@
+"""Receipt templates compiled into pre-encoded byte segments
+
+A `Template` records the static parts of a receipt using the normal `SRP350` command methods
+and marks the variable parts with typed fields. `compile` returns a `CompiledTemplate` whose
+`render` only encodes the field values and splices them between the precompiled segments,
+so the output is byte for byte the same as calling the commands directly.
+
+    t = Template()
+    t.initialize_printer()
+    t.emphasize_mode(1)
+    t.print("Table ")
+    t.field("table", int)
+    t.println("")
+    t.emphasize_mode(0)
+    t.print("Total: ")
+    t.field("total", float, fmt=".2f", width=10, align=">")
+    t.println("")
+    receipt = t.compile()
+
+    printer.data += receipt.render(table=4, total=12.5)
+
+Fields of kind bytes are spliced in unchanged, e.g. the rendered lines of another template.
+"""
+
+from . import SRP350
+from .encoding import get_encoder
+
+
+class Field(object):
+
+    def __init__(self, name, kind=str, fmt="", width=None, align="<", encoding=None, encoder=None):
+        """encoding is a python codec name, without it the text is encoded by encoder (an
+        `srp350.encoding.Encoder`, default: code page PC437)"""
+        self.name = name
+        self.kind = kind
+        self.fmt = fmt
+        self.width = width
+        self.align = align
+        self.encoding = encoding
+        self.encoder = encoder or get_encoder()
+        self._pad = None if width is None else "{0}{1}".format(align, width)
+
+    def encode(self, value):
+        """Returns the encoded bytes for value"""
+        if type(value) is not self.kind and not isinstance(value, self.kind):
+            # ints are accepted where floats are expected
+            if not (self.kind is float and isinstance(value, int)):
+                raise TypeError("field {0!r} expects {1}, got {2}".format(
+                    self.name, self.kind.__name__, type(value).__name__))
+        if self.kind is bytes:
+            return value
+        text = format(value, self.fmt)
+        if self._pad is not None:
+            text = format(text, self._pad)[:self.width]
+        if self.encoding is not None:
+            return text.encode(self.encoding)
+        return self.encoder.encode(text)
+
+
+class CompiledTemplate(object):
+
+    def __init__(self, segments, fields, state=None):
+        """segments has one element more than fields, field i goes between segment i and i + 1
+        state are the settings the template changes (as in `srp350.state`)"""
+        self.segments = segments
+        self.fields = fields
+        self.state = state or {}
+        self.names = [field.name for field in fields]
+        # (field, segment after it), empty segments are skipped when rendering
+        self._steps = [(field, segments[i + 1]) for i, field in enumerate(fields)]
+
+    def _parts(self, values):
+        parts = [self.segments[0]]
+        append = parts.append
+        try:
+            for field, segment in self._steps:
+                append(field.encode(values[field.name]))
+                if segment:
+                    append(segment)
+        except KeyError:
+            missing = set(self.names) - set(values)
+            if not missing:
+                raise
+            raise KeyError("missing values for fields: {0}".format(", ".join(sorted(missing))))
+        return parts
+
+    def render(self, **values):
+        """Returns the receipt bytes with all fields filled in"""
+        return b"".join(self._parts(values))
+
+    def render_into(self, printer, **values):
+        """Appends the receipt to the buffer of printer
+        Settings the optimizer of printer holds back are sent before it, the settings the template
+        changes are recorded in printer.state afterwards."""
+        parts = self._parts(values)
+        printer._handle_payload(parts[0], *parts[1:])
+        printer.state.apply(self.state)
+
+
+class Template(object):
+
+    def __init__(self, encoding=None, encoding_errors="transliterate"):
+        """Field values are encoded like `SRP350.print` does: for the code page and international
+        character set selected where the field is, unknown characters handled as
+        encoding_errors says ("strict", "replace" or "transliterate"). With encoding (a python
+        codec name) that codec is used instead.
+        All `SRP350` command methods can be called on the template to record static parts."""
+        self.encoding = encoding
+        self.printer = SRP350(None, encoding_errors=encoding_errors)
+        self._segments = []
+        self._fields = []
+
+    def __getattr__(self, name):
+        if name == "printer":
+            raise AttributeError(name)
+        return getattr(self.printer, name)
+
+    def field(self, name, kind=str, fmt="", width=None, align="<"):
+        """Inserts a hole for the value called name
+        The value must be an instance of kind, it's formatted with fmt (see `format`), padded or
+        truncated to width characters using align ("<", ">" or "^") and encoded."""
+        if kind is bytes and (fmt or width is not None):
+            raise ValueError("bytes fields are inserted unchanged, fmt and width are not supported")
+        self._segments.append(bytes(self.printer.detach()))
+        state = self.printer.state
+        encoder = get_encoder(state.get("codepage") or 0, state.get("charset") or 0, self.printer.encoding_errors)
+        self._fields.append(Field(name, kind, fmt, width, align, self.encoding, encoder))
+
+    def compile(self):
+        """Returns the `CompiledTemplate` of everything recorded so far"""
+        segments = self._segments + [bytes(self.printer.data)]
+        return CompiledTemplate(segments, list(self._fields), dict(self.printer.state.applied))
@@ -0,0 +1,120 @@
+"""Command tracer
+
+`Tracer` records every command handled by `SRP350` (method name, payload, timestamp) into a
+ring buffer. Recording only appends a tuple of the payloads (bytes are kept by reference,
+mutable buffers and views are copied so the trace doesn't change or pin their source), the
+formatting happens when a trace is dumped as hex, JSON lines or decoded listing.
+
+    tracer = Tracer(size=10000)
+    printer = SRP350("/dev/usb/lp0", tracer=tracer)
+    ...
+    with open("receipt.trace", "w") as f:
+        tracer.dump_jsonl(f)
+"""
+
+import itertools
+import json
+import sys
+import time
+from collections import deque
+
+from .commands import lookup
+
+DEFAULT_SIZE = 4096
+
+
+def hexdump(data, width=63):
+    """Formats data as lines of width hex bytes"""
+    data = bytes(data)
+    return "\n".join(data[i:i + width].hex(" ") for i in range(0, len(data), width))
+
+
+class Record(object):
+
+    __slots__ = ("seq", "time", "method", "parts")
+
+    def __init__(self, seq, timestamp, method, parts):
+        self.seq = seq
+        self.time = timestamp
+        self.method = method
+        self.parts = parts
+
+    @property
+    def length(self):
+        return sum(len(part) for part in self.parts)
+
+    def head(self, limit=None):
+        """Returns the first limit bytes of the command (all with limit=None)"""
+        data = b"".join(bytes(part) for part in self.parts)
+        return data if limit is None else data[:limit]
+
+    def decode(self):
+        """Returns (mnemonic, arguments) of the command, ("TEXT", text) for printable data"""
+        first = bytes(self.parts[0][:3])
+        entry = lookup(first)
+        if entry is None:
+            return "TEXT", bytes(self.head(256)).decode("cp437", errors="replace")
+        prefix, mnemonic, _, nargs = entry
+        header = self.parts[0]
+        args = list(header[len(prefix):len(prefix) + nargs])
+        if len(header) < len(prefix) + nargs and len(self.parts) > 1:
+            args = list(self.head(len(prefix) + nargs)[len(prefix):])
+        return mnemonic, args
+
+    def as_dict(self, limit=64):
+        mnemonic, args = self.decode()
+        return {
+            "seq": self.seq,
+            "time": self.time,
+            "method": self.method,
+            "opcode": mnemonic,
+            "args": args,
+            "length": self.length,
+            "hex": self.head(limit).hex(),
+        }
+
+
+class Tracer(object):
+
+    def __init__(self, size=DEFAULT_SIZE):
+        """size is the number of commands kept, older ones are dropped"""
+        self.records = deque(maxlen=size)
+        self.enabled = True
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.records)
+
+    def record(self, method, parts):
+        """Records a command, parts are the payload and data buffers as handed to the printer buffer"""
+        if self.enabled:
+            parts = tuple(part if type(part) is bytes else bytes(part) for part in parts)
+            self.records.append(Record(next(self._seq), time.time(), method, parts))
+
+    def clear(self):
+        self.records.clear()
+
+    def dump_hex(self, file=sys.stdout, limit=None):
+        """Writes each command as hex dump (at most limit bytes per command)"""
+        for r in list(self.records):
+            file.write("#{0} {1:.6f} {2} ({3} bytes)\n".format(r.seq, r.time, r.method, r.length))
+            file.write(hexdump(r.head(limit)) + "\n")
+
+    def dump_jsonl(self, file=sys.stdout, limit=64):
+        """Writes one JSON object per command (hex limited to limit bytes)"""
+        for r in list(self.records):
+            file.write(json.dumps(r.as_dict(limit)) + "\n")
+
+    def dump_listing(self, file=sys.stdout):
+        """Writes a decoded listing: time, opcode with arguments, length and method"""
+        start = self.records[0].time if self.records else 0
+        for r in list(self.records):
+            mnemonic, args = r.decode()
+            if mnemonic == "TEXT":
+                text = repr(args)
+                if len(text) > 40:
+                    text = text[:37] + "..."
+                desc = "TEXT " + text
+            else:
+                desc = " ".join([mnemonic] + [str(a) for a in args])
+            file.write("{0:>10.6f} {1:<44} {2:>7} {3}\n".format(r.time - start, desc, r.length, r.method))
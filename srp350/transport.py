@@ -0,0 +1,271 @@
+"""Chunked writer for the printer device file
+
+Writes a buffer in chunks of `chunk_size` bytes, retries short writes and waits (poll) until
+the device accepts more data. A progress callback is called after every chunk with
+(bytes_written, bytes_total).
+Buffers can also be submitted to a background thread, so the next receipt can be composed
+while the previous one is still streaming out. Writes never overlap: a buffer is written
+completely before the next one (of any thread) starts.
+Real-time commands (DLE EOT, DLE ENQ) are written with `query` between two chunks, bypassing
+the queued buffers, and their reply is read back from the device.
+"""
+
+import os
+import select
+import threading
+import time
+from collections import deque
+
+DEFAULT_CHUNK_SIZE = 4096
+# buffers a streaming producer may queue ahead of the writer
+DEFAULT_MAX_PENDING = 4
+
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+
+class Transport(object):
+
+    def __init__(self, device, chunk_size=DEFAULT_CHUNK_SIZE, timeout=None, progress=None):
+        """device is an open file descriptor
+        timeout is the maximum time in seconds to wait for the device to accept data (None = forever)"""
+        self.device = device
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.progress = progress
+
+        # held while a chunk is written, so other writers (e.g. real-time status queries)
+        # never end up in the middle of a command
+        self.lock = threading.Lock()
+        # held while a whole buffer is written, the buffers of two writers never interleave
+        self._write_lock = threading.Lock()
+
+        # used by writers only (under _write_lock)
+        self._poll = select.poll()
+        self._poll.register(device, select.POLLOUT)
+        # used by queries only, poll objects can't be shared between threads
+        self._query_poll = select.poll()
+        self._query_poll.register(device, select.POLLOUT)
+        self._read_poll = select.poll()
+        self._read_poll.register(device, select.POLLIN)
+        # serializes queries, so each one reads its own reply
+        self._query_lock = threading.Lock()
+
+        self._queue = deque()
+        self._queue_cond = threading.Condition()
+        self._thread = None
+        self._error = None
+        self._closed = False
+        # numbers of the buffers submitted, written and dropped after a write error
+        self._submitted = 0
+        self._written = 0
+        self._failed = 0
+        self._failure = None
+
+    def _wait_writable(self):
+        timeout = None if self.timeout is None else int(self.timeout * 1000)
+        for fd, event in self._poll.poll(timeout):
+            if event & (select.POLLERR | select.POLLHUP | select.POLLNVAL):
+                raise IOError("device {0} is not writable (poll event {1:#x})".format(fd, event))
+            return
+        raise TimeoutError("device did not accept data within {0}s".format(self.timeout))
+
+    def write(self, data, progress=None):
+        """Writes all of data (bytes-like) to the device, returns the number of written bytes"""
+        progress = progress or self.progress
+        view = memoryview(data).cast("B")
+        try:
+            with self._write_lock:
+                return self._write(view, progress)
+        finally:
+            # an exported view would keep a bytearray buffer from being resized
+            view.release()
+
+    def _write(self, view, progress):
+        total = len(view)
+        written = 0
+        while written < total:
+            self._wait_writable()
+            with self.lock:
+                try:
+                    n = os.write(self.device, view[written:written + self.chunk_size])
+                except BlockingIOError:
+                    continue
+            written += n
+            if progress is not None:
+                progress(written, total)
+        return written
+
+    def writev(self, buffers, completed=None):
+        """Writes the buffers with as few os.writev calls as possible (at most IOV_MAX buffers
+        per call), completed(index) is called as soon as buffers[index] is completely written
+        Returns the number of system calls."""
+        views = [memoryview(b).cast("B") for b in buffers]
+        try:
+            with self._write_lock:
+                return self._writev(views, completed)
+        finally:
+            for view in views:
+                if view is not None:
+                    view.release()
+
+    def _writev(self, views, completed):
+        first = 0
+        calls = 0
+        while first < len(views):
+            self._wait_writable()
+            with self.lock:
+                try:
+                    n = os.writev(self.device, views[first:first + IOV_MAX])
+                except BlockingIOError:
+                    continue
+            calls += 1
+            # drop the written buffers, keep the unwritten rest of a partially written one
+            while first < len(views) and n >= len(views[first]):
+                n -= len(views[first])
+                views[first] = None
+                if completed is not None:
+                    completed(first)
+                first += 1
+            if n:
+                views[first] = views[first][n:]
+        return calls
+
+    def query(self, payload, reply=1, timeout=1.0):
+        """Writes a real-time command between two chunks and returns the reply (reply bytes)
+        With reply=0 nothing is read. Raises TimeoutError if the device doesn't accept the
+        command or doesn't answer within timeout seconds."""
+        deadline = time.monotonic() + timeout
+        with self._query_lock:
+            # drop stale replies of earlier queries which timed out
+            while self._read_poll.poll(0):
+                if not os.read(self.device, 64):
+                    break
+            # the lock is held by a write blocked on a busy device: give up after timeout as well
+            written = 0
+            while written < len(payload):
+                remaining = deadline - time.monotonic()
+                if (remaining <= 0 or not self._query_poll.poll(int(remaining * 1000)) or
+                        not self.lock.acquire(timeout=max(0, deadline - time.monotonic()))):
+                    raise TimeoutError("device did not accept the query within {0}s".format(timeout))
+                try:
+                    written += os.write(self.device, payload[written:])
+                except BlockingIOError:
+                    # writable according to poll, but full again: poll once more
+                    continue
+                finally:
+                    self.lock.release()
+            data = b""
+            while len(data) < reply:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._read_poll.poll(int(remaining * 1000)):
+                    raise TimeoutError("device did not answer within {0}s".format(timeout))
+                chunk = os.read(self.device, reply - len(data))
+                if not chunk:
+                    raise IOError("device closed while waiting for the reply")
+                data += chunk
+            return data
+
+    def submit(self, data, progress=None):
+        """Queues data for writing in the background thread and returns immediately
+        Returns the number of the buffer for `wait`. Errors of the background thread are raised
+        by the next call of submit/flush"""
+        self._raise_error()
+        with self._queue_cond:
+            if self._closed:
+                raise IOError("transport is closed")
+            self._queue.append((data, progress))
+            self._submitted += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, daemon=True)
+                self._thread.start()
+            self._queue_cond.notify_all()
+            return self._submitted
+
+    def wait(self, n, timeout=None):
+        """Waits until the submitted buffer n (as returned by `submit`) and all buffers before
+        it are written, returns False on timeout
+        Raises the error of the write which failed it (the buffers queued behind a failed one
+        are dropped)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue_cond:
+            while self._written < n and self._failed < n:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue_cond.wait(remaining)
+            if self._written >= n:
+                return True
+            # reported here, not again by the next submit/flush
+            if self._error is self._failure:
+                self._error = None
+            raise self._failure
+
+    def pending(self):
+        """Number of buffers which are queued but not completely written"""
+        with self._queue_cond:
+            return len(self._queue)
+
+    def wait_pending(self, n, timeout=None):
+        """Waits until at most n submitted buffers are not completely written (back pressure for
+        producers), returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue_cond:
+            while len(self._queue) > n and self._error is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue_cond.wait(remaining)
+        self._raise_error()
+        return True
+
+    def flush(self, timeout=None):
+        """Waits until all submitted buffers are written, returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue_cond:
+            while self._queue and self._error is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue_cond.wait(remaining)
+        self._raise_error()
+        return True
+
+    def close(self):
+        """Writes the remaining queued buffers and stops the background thread"""
+        with self._queue_cond:
+            self._closed = True
+            self._queue_cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _writer(self):
+        while True:
+            with self._queue_cond:
+                while not self._queue and not self._closed:
+                    self._queue_cond.wait()
+                if not self._queue:
+                    return
+                data, progress = self._queue[0]
+            try:
+                self.write(data, progress)
+            except Exception as e:
+                with self._queue_cond:
+                    self._error = self._failure = e
+                    self._failed = self._submitted
+                    self._queue.clear()
+                    self._queue_cond.notify_all()
+                continue
+            with self._queue_cond:
+                self._queue.popleft()
+                self._written += 1
+                self._queue_cond.notify_all()
@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350 import barcode
+
+
+class BarcodeTest(unittest.TestCase):
+
+    def test_ean13_check_digit(self):
+        code = barcode.encode(barcode.BARCODE_EAN13, "438886056738")
+        self.assertEqual(code.hri, "4388860567380")
+        self.assertEqual(code.native, b"438886056738")
+        self.assertEqual(len(code.modules), 95)
+        barcode.encode(barcode.BARCODE_EAN13, "4388860567380")
+        with self.assertRaises(ValueError):
+            barcode.encode(barcode.BARCODE_EAN13, "4388860567386")
+
+    def test_code39_native_without_delimiters(self):
+        plain = barcode.encode(barcode.BARCODE_CODE39, "ab-12")
+        wrapped = barcode.encode(barcode.BARCODE_CODE39, "*AB-12*")
+        self.assertEqual(plain, wrapped)
+        self.assertEqual(plain.native, b"AB-12")
+        self.assertEqual(plain.hri, "*AB-12*")
+        # 7 characters of 9 elements (3 wide) with narrow gaps between them
+        self.assertEqual(len(plain.modules), 7 * (6 + 3 * barcode.WIDE) + 6)
+        with self.assertRaises(ValueError):
+            barcode.encode(barcode.BARCODE_CODE39, "A*B")
+
+    def test_print_barcode(self):
+        printer = srp350.SRP350(None)
+        printer.print_barcode(None, srp350.BARCODE_SYSTEM_B_CODE39, "*AB-12*")
+        printer.print_barcode(None, srp350.BARCODE_SYSTEM_A_CODE39, "AB-12")
+        self.assertEqual(bytes(printer.data), b"\x1dkE\x05AB-12\x1dk\x04AB-12\x00")
+        with self.assertRaises(ValueError):
+            printer.print_barcode(None, srp350.BARCODE_SYSTEM_B_EAN13, "4388860567386")
+        self.assertEqual(bytes(printer.data), b"\x1dkE\x05AB-12\x1dk\x04AB-12\x00")
+
+    def test_code128_digits_packed(self):
+        code = barcode.encode(barcode.BARCODE_CODE128, "ORDER 1234567890")
+        self.assertEqual(code.native, b"{AORDER {C" + bytes((12, 34, 56, 78, 90)))
+        self.assertEqual(barcode.from_native(barcode.BARCODE_CODE128, code.native), code)
+
+    def test_native_round_trip(self):
+        for system, data in ((barcode.BARCODE_UPC_A, "03600029145"), (barcode.BARCODE_EAN8, "9638507"),
+                             (barcode.BARCODE_CODE39, "SRP-350"), (barcode.BARCODE_ITF, "123456"),
+                             (barcode.BARCODE_CODABAR, "A1234B"), (barcode.BARCODE_CODE93, "TEST93")):
+            code = barcode.encode(system, data)
+            self.assertEqual(barcode.from_native(system, code.native), code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from test_transport import Pipe
+
+
+class BatchTest(unittest.TestCase):
+
+    def test_jobs_coalesce(self):
+        pipe = Pipe()
+        printer = srp350.SRP350(None, device=pipe.write_fd, batch_max_bytes=64 * 1024, batch_max_linger=0.5)
+        jobs = []
+        for i in range(10):
+            printer.println("ticket {0}".format(i))
+            jobs.append(printer.send())
+        self.assertTrue(printer.flush())
+        self.assertTrue(all(job.done() and job.error is None for job in jobs))
+        stats = printer.batcher.stats()
+        self.assertEqual(stats["jobs"], 10)
+        self.assertEqual(stats["batches"], 1)
+        printer.close()
+        self.assertEqual(pipe.received(), b"".join(b"ticket %d\n" % i for i in range(10)))
+
+    def test_batches_split_at_max_bytes(self):
+        pipe = Pipe()
+        printer = srp350.SRP350(None, device=pipe.write_fd, batch_max_bytes=1000, batch_max_linger=0.5)
+        for i in range(10):
+            printer.data += bytes([0x30 + i]) * 400
+            printer.send()
+        printer.close()
+        self.assertGreaterEqual(printer.batcher.stats()["batches"], 4)
+        self.assertEqual(pipe.received(), b"".join(bytes([0x30 + i]) * 400 for i in range(10)))
+
+    def test_error_raised_by_flush_and_close(self):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(write_fd, False)
+        os.close(read_fd)
+        printer = srp350.SRP350(None, device=write_fd, timeout=1, batch_max_bytes=1024)
+        printer.println("lost")
+        job = printer.send()
+        with self.assertRaises(OSError):
+            printer.flush()
+        self.assertIsInstance(job.error, OSError)
+        printer.println("lost too")
+        printer.send()
+        with self.assertRaises(OSError):
+            printer.close()
+        os.close(write_fd)
+
+    def test_block(self):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(write_fd, False)
+        os.close(read_fd)
+        printer = srp350.SRP350(None, device=write_fd, timeout=1, batch_max_bytes=1024)
+        printer.println("lost")
+        with self.assertRaises(OSError):
+            printer.send(block=True)
+        os.close(write_fd)
+
+
+if __name__ == "__main__":
+    unittest.main()
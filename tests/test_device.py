@@ -0,0 +1,111 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from srp350.device import DeviceManager
+
+
+class Fifo(object):
+    """A named pipe standing in for the device node, a thread collects what's written"""
+
+    def __init__(self, path):
+        self.path = path
+        os.mkfifo(path)
+        # opened read-write, so the reader never sees end of file between writers
+        self.fd = os.open(path, os.O_RDWR)
+        self.data = bytearray()
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        while True:
+            self.data += os.read(self.fd, 65536)
+            if self.data.endswith(b"\x00end"):
+                del self.data[-4:]
+                break
+
+    def received(self):
+        with open(self.path, "wb", buffering=0) as f:
+            f.write(b"\x00end")
+        self.thread.join()
+        os.close(self.fd)
+        return bytes(self.data)
+
+
+class DeviceManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.port = os.path.join(self.dir, "lp0")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_jobs_share_descriptor(self):
+        fifo = Fifo(self.port)
+        with DeviceManager() as manager:
+            for i in range(3):
+                with manager.printer(self.port) as printer:
+                    printer.println("job {0}".format(i))
+            stats = manager.stats()[self.port]
+        self.assertEqual((stats["jobs"], stats["opened"]), (3, 1))
+        self.assertEqual(fifo.received(), b"job 0\njob 1\njob 2\n")
+
+    def test_threads_dont_interleave(self):
+        fifo = Fifo(self.port)
+        manager = DeviceManager()
+
+        def job(i):
+            with manager.printer(self.port) as printer:
+                for _ in range(50):
+                    printer.print(chr(0x41 + i) * 100)
+                    printer.send(block=False)
+
+        threads = [threading.Thread(target=job, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        manager.close()
+        data = fifo.received()
+        self.assertEqual(len(data), 8 * 50 * 100)
+        # every job is one run of its letter
+        runs = [data[i:i + 5000] for i in range(0, len(data), 5000)]
+        self.assertTrue(all(len(set(run)) == 1 for run in runs))
+
+    def test_replaced_node_reopened(self):
+        fifo = Fifo(self.port)
+        manager = DeviceManager()
+        with manager.printer(self.port) as printer:
+            printer.println("first")
+        self.assertEqual(fifo.received(), b"first\n")
+        os.remove(self.port)
+        fifo = Fifo(self.port)
+        with manager.printer(self.port) as printer:
+            printer.println("second")
+        manager.close()
+        self.assertEqual(manager.stats()[self.port]["opened"], 2)
+        self.assertEqual(fifo.received(), b"second\n")
+
+    def test_lock_timeout(self):
+        fifo = Fifo(self.port)
+        # another manager stands in for another process: its descriptor has its own flock
+        other = DeviceManager(lock_timeout=0.05)
+        manager = DeviceManager()
+        with manager.printer(self.port):
+            with self.assertRaises(TimeoutError):
+                other.acquire(self.port)
+        other.acquire(self.port)
+        other.release(self.port)
+        other.close()
+        manager.close()
+        fifo.received()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.emulator import Emulator
+
+
+class EmulatorTest(unittest.TestCase):
+
+    def test_prints_stream(self):
+        with Emulator(speed=None) as emulator:
+            printer = srp350.SRP350(emulator.path)
+            printer.initialize_printer()
+            for i in range(20):
+                printer.println("line {0}".format(i))
+            printer.cut_paper(srp350.CUT_MODE_FEED_AND_CUT, 40)
+            size = len(printer.data)
+            printer.send()
+            printer.close()
+            self.assertTrue(emulator.wait_idle(5))
+            stats = emulator.stats()
+        self.assertEqual(stats["bytes"], size)
+        self.assertGreater(stats["dot_lines"], 0)
+
+    def test_backpressure(self):
+        # 1000 mm/s with a small buffer: the writer has to wait for the printer
+        with Emulator(speed=1000, buffer_size=256) as emulator:
+            printer = srp350.SRP350(emulator.path, timeout=5)
+            for i in range(200):
+                printer.println("x" * 40)
+            printer.send()
+            printer.close()
+            self.assertTrue(emulator.wait_idle(10))
+            self.assertGreaterEqual(emulator.stats()["busy_time"], 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.encoding import get_encoder, native_table, CODEPAGE_PC437, CODEPAGE_KATAKANA, \
+    CODEPAGE_WPC1252, CODEPAGE_PC866, CODECS
+
+
+class EncodingTest(unittest.TestCase):
+
+    def test_matches_codecs(self):
+        text = "".join(chr(i) for i in range(0x20, 0x7F)) + "äöüßéèàçñÆøå£¥"
+        for codepage, codec in CODECS.items():
+            encoder = get_encoder(codepage, errors="replace")
+            expected = text.encode(codec, errors="replace")
+            self.assertEqual(encoder.encode(text), expected, codec)
+
+    def test_fallbacks(self):
+        self.assertEqual(get_encoder(errors="transliterate").encode("5€ “ok” Łódź"), b'5EUR "ok" L\xa2dz')
+        self.assertEqual(get_encoder(errors="replace").encode("5€"), b"5?")
+        with self.assertRaises(UnicodeEncodeError):
+            get_encoder(errors="strict").encode("5€")
+
+    def test_codepage_without_codec(self):
+        table = native_table(CODEPAGE_KATAKANA)
+        self.assertEqual(table[ord("A")], ord("A"))
+        self.assertEqual(get_encoder(CODEPAGE_KATAKANA, errors="replace").encode("Aé"), b"A?")
+
+    def test_switch_only_when_shorter(self):
+        encoder = get_encoder(CODEPAGE_PC437, errors="transliterate")
+        # one byte replacements are shorter than ESC t there and back
+        self.assertEqual(encoder.segments("aЖbЖcЖd"), [(CODEPAGE_PC437, b"a?b?c?d")])
+        # EUR four times: ESC t and four bytes are shorter
+        self.assertEqual(encoder.segments("€€€€ total"), [(CODEPAGE_WPC1252, b"\x80\x80\x80\x80 total")])
+        strict = get_encoder(CODEPAGE_PC437, errors="strict")
+        self.assertEqual(strict.segments("aЖb"), [(CODEPAGE_PC437, b"a"), (CODEPAGE_PC866, b"\x86b")])
+
+    def test_print(self):
+        printer = srp350.SRP350(None)
+        printer.print("Grüße €")
+        self.assertEqual(bytes(printer.data), b"Gr\x81\xe1e EUR")
+        printer = srp350.SRP350(None, encoding_errors="strict", auto_codepage=True)
+        printer.print("ok Ж")
+        self.assertEqual(bytes(printer.data), b"ok \x1bt\x11\x86")
+        self.assertEqual(printer.state.get("codepage"), CODEPAGE_PC866)
+
+
+if __name__ == "__main__":
+    unittest.main()
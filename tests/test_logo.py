@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.logo import LogoRegistry, NV_MAX_IMAGES
+from test_transport import Pipe
+
+
+class LogoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manifest = os.path.join(tempfile.mkdtemp(), "logos.json")
+
+    def tearDown(self):
+        if os.path.exists(self.manifest):
+            os.remove(self.manifest)
+        os.rmdir(os.path.dirname(self.manifest))
+
+    def test_upload_leaves_buffer_alone(self):
+        pipe = Pipe()
+        printer = srp350.SRP350("lp0", device=pipe.write_fd)
+        logos = LogoRegistry(printer, self.manifest)
+        logos.add("shop", Image.new("L", (64, 32), 0))
+        printer.data += b"receipt"
+        printer.send(block=False)
+        printer.println("being built")
+        self.assertEqual(logos.print_logo("shop"), b"\x1cp\x01\x00")
+        self.assertEqual(bytes(printer.data), b"being built\n\x1cp\x01\x00")
+        # resident now: nothing is uploaded again
+        self.assertFalse(logos.upload())
+        printer.close()
+        received = pipe.received()
+        self.assertTrue(received.startswith(b"receipt\x1cq\x01"))
+        # FS q n, then xL xH yL yH and the 64 x 32 dots of the image
+        self.assertEqual(len(received), len(b"receipt") + 3 + 4 + 64 * 32 // 8)
+
+    def test_upload_timeout(self):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(write_fd, False)
+        printer = srp350.SRP350("lp0", device=write_fd)
+        logos = LogoRegistry(printer, self.manifest)
+        logos.add("shop", Image.new("L", (64, 32), 0))
+        # nobody reads: the queued buffer stays unwritten
+        printer.data += b"x" * (1 << 20)
+        printer.send(block=False)
+        with self.assertRaises(TimeoutError):
+            logos.upload(timeout=0.05)
+        self.assertFalse(os.path.exists(self.manifest))
+        os.close(read_fd)
+        with self.assertRaises(OSError):
+            printer.close()
+        os.close(write_fd)
+
+    def test_too_many_logos(self):
+        logos = LogoRegistry(srp350.SRP350(None))
+        image = Image.new("L", (8, 8), 0)
+        for i in range(NV_MAX_IMAGES):
+            logos.add(str(i), image)
+        with self.assertRaises(ValueError):
+            logos.add("one more", image)
+        self.assertNotIn("one more", logos._logos)
+        # replacing a registered logo is still possible
+        self.assertEqual(logos.add("0", Image.new("L", (8, 8), 255)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
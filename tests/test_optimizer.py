@@ -0,0 +1,108 @@
+import os
+import sys
+import unittest
+
+from PIL import Image, ImageChops
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.render import render
+
+
+def styled_receipt(printer):
+    printer.initialize_printer()
+    printer.select_justification(srp350.JUSTIFICATION_CENTER)
+    printer.select_print_mode(printer.gen_print_mode(0, 1, 1, 1, 0))
+    printer.println("SUPERMARKET")
+    printer.select_print_mode(0)
+    printer.select_justification(srp350.JUSTIFICATION_LEFT)
+    for i in range(12):
+        printer.emphasize_mode(i % 2)
+        printer.underline_mode(i % 3 == 0)
+        printer.emphasize_mode(i % 2)
+        printer.print("Item {0}".format(i))
+        printer.underline_mode(0)
+        printer.println("{0:>20.2f}".format(i * 1.25))
+    printer.select_character_font(srp350.CHAR_FONT_B)
+    printer.emphasize_mode(1)
+    printer.println("font B emphasized")
+    printer.select_character_size(printer.gen_character_size(2, 2))
+    printer.select_character_font(srp350.CHAR_FONT_A)
+    printer.println("TOTAL")
+    printer.select_character_size(printer.gen_character_size(0, 0))
+    printer.emphasize_mode(0)
+    printer.set_line_spacing(40)
+    printer.set_line_spacing(50)
+    printer.println("line spacing")
+    printer.select_default_line_spacing()
+    printer.set_barcode_height(60)
+    printer.select_hri_printing_position(srp350.HRI_POS_BELOW)
+    printer.print_barcode(None, srp350.BARCODE_SYSTEM_B_CODE128, "ORDER-0001")
+    printer.print_image(Image.new("L", (64, 48), 0))
+    printer.cut_paper(srp350.CUT_MODE_FEED_AND_CUT, 40)
+
+
+def toggles(printer):
+    printer.initialize_printer()
+    for i in range(16):
+        printer.emphasize_mode(1)
+        printer.print("{0:X} ".format(i))
+        printer.emphasize_mode(0)
+        for j in range(16):
+            printer.underline_mode(j & 1)
+            printer.print(chr(0x41 + j))
+        printer.underline_mode(0)
+        printer.line_feed()
+
+
+class OptimizerTest(unittest.TestCase):
+
+    def build(self, job, optimize):
+        printer = srp350.SRP350(None, optimize=optimize)
+        job(printer)
+        return bytes(printer.detach())
+
+    def assertSameOutput(self, job):
+        plain = self.build(job, False)
+        optimized = self.build(job, True)
+        self.assertLessEqual(len(optimized), len(plain))
+        a = render(plain).convert("L")
+        b = render(optimized).convert("L")
+        self.assertEqual(a.size, b.size)
+        self.assertIsNone(ImageChops.difference(a, b).getbbox())
+
+    def test_styled_receipt(self):
+        self.assertSameOutput(styled_receipt)
+
+    def test_toggles(self):
+        self.assertSameOutput(toggles)
+
+    def test_print_mode_merged(self):
+        printer = srp350.SRP350(None, optimize=True)
+        printer.initialize_printer()
+        printer.emphasize_mode(1)
+        printer.underline_mode(1)
+        printer.select_character_font(1)
+        printer.print("x")
+        self.assertEqual(bytes(printer.data), b"\x1b@\x1b!\x89x")
+
+    def test_large_size_not_merged(self):
+        printer = srp350.SRP350(None, optimize=True)
+        printer.initialize_printer()
+        printer.emphasize_mode(1)
+        printer.select_character_size(0x22)
+        printer.print("x")
+        self.assertEqual(bytes(printer.data), b"\x1b@\x1bE\x01\x1d!\x22x")
+
+    def test_print_mode_merged_from_unknown_state(self):
+        printer = srp350.SRP350(None, optimize=True)
+        printer.select_print_mode(0)
+        printer.emphasize_mode(1)
+        printer.underline_mode(1)
+        printer.print("x")
+        self.assertEqual(bytes(printer.data), b"\x1b!\x88x")
+
+
+if __name__ == "__main__":
+    unittest.main()
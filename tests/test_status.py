@@ -0,0 +1,54 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350 import status
+from srp350.emulator import Emulator
+from srp350.status import StatusMonitor
+
+
+class StatusTest(unittest.TestCase):
+
+    def test_encode_decode(self):
+        conditions = dict.fromkeys(status.CONDITIONS, False)
+        for n in status.BITS:
+            self.assertEqual(status.encode(n, conditions), status.FIXED_BITS)
+        conditions["paper_out"] = True
+        self.assertEqual(status.decode(status.STATUS_PAPER, status.encode(status.STATUS_PAPER, conditions)),
+                         {"paper_near_end": False, "paper_out": True})
+        self.assertTrue(status.decode(status.STATUS_PRINTER, status.encode(status.STATUS_PRINTER, conditions))["offline"])
+        with self.assertRaises(ValueError):
+            status.decode(status.STATUS_PRINTER, 0xFF)
+
+    def test_query_status(self):
+        with Emulator(speed=None) as emulator:
+            printer = srp350.SRP350(emulator.path)
+            self.assertFalse(printer.query_status(status.STATUS_OFFLINE)["paper_out"])
+            emulator.set_conditions(paper_out=True, cover_open=True)
+            offline = printer.query_status(status.STATUS_OFFLINE)
+            self.assertTrue(offline["paper_out"] and offline["cover_open"])
+            self.assertTrue(printer.query_status(status.STATUS_PRINTER)["offline"])
+            self.assertEqual(emulator.stats()["status_queries"], 3)
+            printer.close()
+
+    def test_monitor(self):
+        changes = []
+        with Emulator(speed=None) as emulator:
+            printer = srp350.SRP350(emulator.path)
+            monitor = StatusMonitor(printer, timeout=1.0, callback=changes.append)
+            monitor.refresh()
+            self.assertTrue(monitor.ready())
+            emulator.set_conditions(cover_open=True)
+            monitor.refresh()
+            self.assertTrue(monitor.offline())
+            with self.assertRaises(status.PrinterNotReady):
+                monitor.check()
+            self.assertEqual(len(changes), 2)
+            printer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
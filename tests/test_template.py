@@ -0,0 +1,78 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.template import Template
+from srp350.trace import Tracer
+
+
+def receipt(printer, table, total, name):
+    printer.select_justification(srp350.JUSTIFICATION_CENTER)
+    printer.select_print_mode(printer.gen_print_mode(0, 1, 1, 1, 0))
+    printer.print("Table ")
+    printer.print(str(table))
+    printer.println("")
+    printer.select_print_mode(0)
+    printer.select_justification(srp350.JUSTIFICATION_LEFT)
+    printer.select_character_code_table(16)
+    printer.print("Total: ")
+    printer.print("{0:>10.2f}".format(total))
+    printer.println(" " + name)
+
+
+def compile_receipt():
+    t = Template()
+    t.select_justification(srp350.JUSTIFICATION_CENTER)
+    t.select_print_mode(t.gen_print_mode(0, 1, 1, 1, 0))
+    t.print("Table ")
+    t.field("table", int)
+    t.println("")
+    t.select_print_mode(0)
+    t.select_justification(srp350.JUSTIFICATION_LEFT)
+    t.select_character_code_table(16)
+    t.print("Total: ")
+    t.field("total", float, fmt=".2f", width=10, align=">")
+    t.print(" ")
+    t.field("name", str)
+    t.println("")
+    return t.compile()
+
+
+class TemplateTest(unittest.TestCase):
+
+    def test_render_matches_commands(self):
+        for name in ("Crème brûlée", "Ærø", "plain"):
+            printer = srp350.SRP350(None)
+            receipt(printer, 12, 31.5, name)
+            self.assertEqual(compile_receipt().render(table=12, total=31.5, name=name), bytes(printer.data))
+
+    def test_field_types(self):
+        compiled = compile_receipt()
+        with self.assertRaises(TypeError):
+            compiled.render(table="12", total=1.0, name="x")
+        with self.assertRaises(KeyError):
+            compiled.render(table=12, name="x")
+        compiled.render(table=12, total=1, name="x")
+
+    def test_render_into_optimized(self):
+        compiled = compile_receipt()
+        tracer = Tracer()
+        printer = srp350.SRP350(None, optimize=True, tracer=tracer)
+        printer.emphasize_mode(1)
+        compiled.render_into(printer, table=3, total=2.0, name="x")
+        # the setting held back by the optimizer goes before the template
+        self.assertEqual(bytes(printer.data), b"\x1bE\x01" + compiled.render(table=3, total=2.0, name="x"))
+        self.assertEqual([r.method for r in tracer.records], ["optimizer", "render_into"])
+        # the template left print mode 0 and code page 16 (WPC1252) selected
+        printer.data = bytearray()
+        printer.emphasize_mode(0)
+        printer.select_character_code_table(16)
+        printer.print("\xe9")
+        self.assertEqual(bytes(printer.data), b"\xe9")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.trace import Tracer
+
+
+class TracerTest(unittest.TestCase):
+
+    def test_records_copy_buffers(self):
+        tracer = Tracer()
+        printer = srp350.SRP350(None, tracer=tracer)
+        raster = bytearray(b"\xff" * 64)
+        printer.print_raster_bit_image(0, 8, 0, 8, 0, memoryview(raster)[:64])
+        raster[:] = b"\x00" * 64
+        # a view kept by the tracer would block resizing
+        raster += b"\x00"
+        self.assertEqual(tracer.records[-1].head()[-64:], b"\xff" * 64)
+        self.assertEqual(tracer.records[-1].method, "print_raster_bit_image")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import srp350
+from srp350.transport import Transport
+
+
+class Pipe(object):
+    """A non-blocking pipe standing in for the device, a thread collects what's written"""
+
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.write_fd, False)
+        self.data = bytearray()
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        while True:
+            chunk = os.read(self.read_fd, 65536)
+            if not chunk:
+                break
+            self.data += chunk
+
+    def received(self):
+        """Closes the write end, returns everything written"""
+        os.close(self.write_fd)
+        self.thread.join()
+        os.close(self.read_fd)
+        return bytes(self.data)
+
+
+class TransportTest(unittest.TestCase):
+
+    def test_write(self):
+        pipe = Pipe()
+        transport = Transport(pipe.write_fd, chunk_size=1000)
+        progress = []
+        data = bytes(range(256)) * 1000
+        self.assertEqual(transport.write(bytearray(data), lambda n, total: progress.append(n)), len(data))
+        self.assertEqual(progress[-1], len(data))
+        self.assertEqual(pipe.received(), data)
+
+    def test_writev(self):
+        pipe = Pipe()
+        transport = Transport(pipe.write_fd)
+        buffers = [bytes([i]) * (i * 1000) for i in range(1, 20)]
+        completed = []
+        transport.writev(buffers, completed.append)
+        self.assertEqual(completed, list(range(len(buffers))))
+        self.assertEqual(pipe.received(), b"".join(buffers))
+
+    def test_mixed_sends(self):
+        pipe = Pipe()
+        printer = srp350.SRP350(None, device=pipe.write_fd)
+        expected = []
+        for i in range(20):
+            # large enough to fill the pipe while the next send starts
+            data = bytes([0x41 + i]) * 100000
+            printer.data += data
+            expected.append(data)
+            printer.send(block=i % 3 == 2)
+        printer.close()
+        self.assertEqual(pipe.received(), b"".join(expected))
+
+    def test_background_error(self):
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(write_fd, False)
+        os.close(read_fd)
+        printer = srp350.SRP350(None, device=write_fd, timeout=1)
+        printer.data += b"x" * 100000
+        printer.send(block=False)
+        printer.data += b"y"
+        with self.assertRaises(OSError):
+            printer.send()
+        os.close(write_fd)
+
+
+if __name__ == "__main__":
+    unittest.main()